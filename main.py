@@ -9,9 +9,10 @@ from dotenv import load_dotenv
 from PySide6.QtWidgets import QApplication, QMessageBox, QDialog
 from PySide6.QtGui import QIcon
 from PySide6.QtCore import Qt
-from models.models import get_db_connection, test_connection, check_tables_exist
+from models.models import get_db_connection, test_connection, check_tables_exist, close_connection_pool
 from ui.main_window import MainWindow
 from ui.login_form import LoginForm
+from services.reference_cache import preload_reference_data
 import traceback
 
 
@@ -182,6 +183,7 @@ class CBCentraApplication:
                     self.db_connection.close()
                 except:
                     pass
+            close_connection_pool()
                 
     def show_login_form(self):
         """Show login form modally"""
@@ -214,6 +216,9 @@ class CBCentraApplication:
             self.login_form.close()
             self.login_form = None
             
+            # Load lookup tables once; forms read them from the shared cache
+            preload_reference_data()
+            
             # Create and show main window
             self.main_window = MainWindow(
                 config=self.app_config,
@@ -0,0 +1,307 @@
+# models/connection_pool.py
+"""
+Bounded, health-checked MySQL connection pool.
+
+Connections handed out by the pool are wrapped in PooledConnection; calling
+close() on the wrapper returns the physical connection to the pool instead of
+tearing down the TCP/auth session, so existing `conn = get_db_connection() ...
+conn.close()` code keeps working unchanged.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+
+
+class PoolExhaustedError(Error):
+    """Raised when no connection becomes available within the wait timeout"""
+
+
+class PooledConnection:
+    """
+    Thin proxy around a mysql.connector connection.
+    close() hands the connection back to the pool; everything else is delegated.
+    """
+
+    def __init__(self, pool, raw_conn):
+        self._pool = pool
+        self._conn = raw_conn
+        self._checked_out_at = time.monotonic()
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise Error(f"Connection already returned to pool (accessing '{name}')")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        # Properties such as `autocommit` must reach the real connection
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def is_connected(self):
+        """False once the connection has been released back to the pool"""
+        if self._conn is None:
+            return False
+        return self._conn.is_connected()
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool._release(conn)
+
+    # Allow `with get_db_connection() as conn:`
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __del__(self):
+        # Leaked wrappers (forms that never call close) still give the slot back
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of mysql.connector connections.
+
+    - pool_size bounds the number of physical connections (idle + in use)
+    - borrowers wait up to `timeout` seconds when the pool is exhausted,
+      except overflow borrowers (connections a form keeps for its lifetime),
+      which get a connection of their own beyond pool_size at once; it is
+      closed rather than kept idle when they give it back
+    - idle connections are pinged on borrow (reconnecting transparently) once
+      they have been idle longer than `ping_interval` seconds
+    - connections older than `recycle` seconds are replaced
+    """
+
+    def __init__(self, config, pool_size=16, timeout=10.0, ping_interval=1.0, recycle=3600,
+                 session_sql=None):
+        self.config = dict(config)
+        self.session_sql = session_sql  # run on every new (or reconnected) session
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.recycle = recycle
+
+        self._lock = threading.Condition(threading.Lock())
+        self._idle = []          # list of (raw_conn, created_at, released_at)
+        self._created_at = {}    # id(raw_conn) -> creation time
+        self._in_use = 0
+        self._closed = False
+        self._local = threading.local()
+
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'borrowed': 0,
+            'reconnects': 0,
+            'ping_failures': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'overflow': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Physical connection management
+    # ------------------------------------------------------------------
+    def _open(self):
+        """Open a new physical connection (called without holding the lock)"""
+        conn = mysql.connector.connect(**self.config)
+        if not conn.is_connected():
+            raise Error("Failed to establish connection")
+        self._prepare_session(conn)
+        with self._lock:
+            self._stats['created'] += 1
+            self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _prepare_session(self, conn):
+        if self.session_sql:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.session_sql)
+            finally:
+                cursor.close()
+
+    def _discard(self, conn):
+        """Close a physical connection and forget about it"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats['closed'] += 1
+            self._created_at.pop(id(conn), None)
+
+    def _is_healthy(self, conn, created_at, released_at):
+        """Ping-on-borrow with transparent reconnect; False means discard it"""
+        now = time.monotonic()
+        if self.recycle and now - created_at > self.recycle:
+            return False
+        if now - released_at < self.ping_interval:
+            return True
+        try:
+            conn.ping(reconnect=True, attempts=2, delay=0)
+            # A reconnect starts a new session without our session settings
+            self._prepare_session(conn)
+            return conn.is_connected()
+        except Error:
+            with self._lock:
+                self._stats['ping_failures'] += 1
+            return False
+
+    # ------------------------------------------------------------------
+    # Borrow / release
+    # ------------------------------------------------------------------
+    def _acquire_raw(self, overflow=False):
+        start = time.monotonic()
+        waited = False
+
+        with self._lock:
+            if self._closed:
+                raise Error("Connection pool is closed")
+
+            if overflow and not self._idle and self._in_use >= self.pool_size:
+                self._stats['overflow'] += 1
+            while not overflow and not self._idle and self._in_use >= self.pool_size:
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolExhaustedError(
+                        f"No database connection available after {self.timeout}s "
+                        f"({self._in_use}/{self.pool_size} in use)"
+                    )
+                waited = True
+                self._lock.wait(remaining)
+
+            self._in_use += 1
+            self._stats['borrowed'] += 1
+            if waited:
+                elapsed = time.monotonic() - start
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += elapsed
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], elapsed)
+            idle_entry = self._idle.pop() if self._idle else None
+
+        if idle_entry is None:
+            try:
+                return self._open()
+            except Exception:
+                self._give_back_slot()
+                raise
+
+        conn, created_at, released_at = idle_entry
+        if self._is_healthy(conn, created_at, released_at):
+            return conn
+
+        # Stale connection: drop it and try to replace it within the same slot
+        self._discard(conn)
+        try:
+            conn = self._open()
+            with self._lock:
+                self._stats['reconnects'] += 1
+            return conn
+        except Exception:
+            self._give_back_slot()
+            raise
+
+    def _give_back_slot(self):
+        with self._lock:
+            self._in_use -= 1
+            self._lock.notify()
+
+    def _release(self, conn):
+        """Called by PooledConnection.close()"""
+        reusable = not self._closed
+        if reusable:
+            try:
+                # Discard any uncommitted work, exactly as a real close() would
+                if conn.is_connected() and conn.in_transaction:
+                    conn.rollback()
+                default_autocommit = self.config.get('autocommit', False)
+                if conn.is_connected() and conn.autocommit != default_autocommit:
+                    conn.autocommit = default_autocommit
+                reusable = conn.is_connected()
+            except Error:
+                reusable = False
+
+        with self._lock:
+            # Connections beyond pool_size (overflow) are not kept
+            reusable = reusable and self._in_use + len(self._idle) <= self.pool_size
+        if not reusable:
+            self._discard(conn)
+            self._give_back_slot()
+            return
+
+        with self._lock:
+            created_at = self._created_at.get(id(conn), time.monotonic())
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._in_use -= 1
+            self._lock.notify()
+
+    def get_connection(self, overflow=False):
+        """
+        Borrow a connection; close() on the returned object releases it.
+        With overflow, never wait: open an extra connection if none is free.
+        """
+        return PooledConnection(self, self._acquire_raw(overflow))
+
+    @contextmanager
+    def connection(self):
+        """
+        Per-thread checkout context manager.
+        Nested `with pool.connection()` blocks on the same thread share one
+        connection; it is released when the outermost block exits.
+        """
+        holder = getattr(self._local, 'holder', None)
+        if holder is not None and holder[0].is_connected():
+            holder[1] += 1
+            try:
+                yield holder[0]
+            finally:
+                holder[1] -= 1
+            return
+
+        conn = self.get_connection()
+        self._local.holder = [conn, 1]
+        try:
+            yield conn
+        finally:
+            self._local.holder = None
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Metrics / lifecycle
+    # ------------------------------------------------------------------
+    def stats(self):
+        """Snapshot of pool metrics"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['in_use'] = self._in_use
+            snapshot['idle'] = len(self._idle)
+            snapshot['pool_size'] = self.pool_size
+        waits = snapshot['waits']
+        snapshot['wait_time_avg'] = snapshot['wait_time_total'] / waits if waits else 0.0
+        return snapshot
+
+    def close_all(self):
+        """Close idle connections and refuse further borrows"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+        for conn, _, _ in idle:
+            self._discard(conn)
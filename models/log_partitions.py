@@ -0,0 +1,184 @@
+# models/log_partitions.py
+"""
+Monthly RANGE partitioning of the log tables.
+
+audit_log and login_logs only ever grow and are trimmed a month at a time,
+so each is partitioned by month on its timestamp column: p202501 holds
+January 2025 and pmax catches anything past the last prepared month.
+Removing a month is then a DROP PARTITION (a metadata change) instead of a
+row-by-row DELETE. MySQL does not allow foreign keys on partitioned tables
+and needs the partitioning column in every unique key, so converting a
+table drops its foreign keys and widens the primary key to (id, <column>).
+
+Converting an existing table copies it, so it only happens when asked for:
+on a fresh schema (initialize_tables) or when an administrator runs
+`python -m services.log_retention`. All partition changes hold the
+server-wide LOG_MAINTENANCE_LOCK, so two clients never alter or purge the
+log tables at the same time.
+"""
+import os
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from mysql.connector import Error
+
+# table -> timestamp column it is partitioned on
+PARTITIONED_LOG_TABLES = {
+    'audit_log': 'created_at',
+    'login_logs': 'login_time',
+}
+
+# Empty monthly partitions kept ready ahead of the current month
+LOG_PARTITION_MONTHS_AHEAD = int(os.getenv('LOG_PARTITION_MONTHS_AHEAD', '3'))
+
+# MySQL named lock (GET_LOCK) held while partitions are changed or dropped
+LOG_MAINTENANCE_LOCK = 'cbcentra_log_maintenance'
+
+
+@contextmanager
+def log_maintenance_lock(conn, timeout=0):
+    """Hold LOG_MAINTENANCE_LOCK on conn's session; raises Error if another client holds it"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOG_MAINTENANCE_LOCK, timeout))
+        if cursor.fetchone()[0] != 1:
+            raise Error(msg="Log maintenance is already running on another client")
+    finally:
+        cursor.close()
+    try:
+        yield
+    finally:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOG_MAINTENANCE_LOCK,))
+            cursor.fetchone()
+        except Error as e:
+            # The lock goes with the session once the connection is closed
+            print(f"⚠️ Could not release {LOG_MAINTENANCE_LOCK}: {e}")
+        finally:
+            cursor.close()
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def partition_month(name):
+    """Month held by a partition named pYYYYMM (None for pmax and others)"""
+    if len(name) == 7 and name[0] == 'p' and name[1:].isdigit():
+        return date(int(name[1:5]), int(name[5:]), 1)
+    return None
+
+
+def _partition_definition(month):
+    bound = add_months(month, 1)
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (UNIX_TIMESTAMP('{bound:%Y-%m-%d} 00:00:00'))"
+
+
+def _partition_names(cursor, table_name):
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table_name,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def log_partitions(cursor, table_name):
+    """Monthly partitions as {month: partition name}, or None if the table is not partitioned"""
+    names = _partition_names(cursor, table_name)
+    if not names:
+        return None
+    return {partition_month(name): name for name in names if partition_month(name)}
+
+
+def _months_until(first, last):
+    months = []
+    while first <= last:
+        months.append(first)
+        first = add_months(first, 1)
+    return months
+
+
+def partition_log_table(cursor, table_name, column, months_ahead=LOG_PARTITION_MONTHS_AHEAD):
+    """Convert a log table to monthly partitions (one-off; MySQL copies the table)"""
+    cursor.execute(f"SELECT MIN({column}) FROM {table_name}")
+    oldest = cursor.fetchone()[0]
+    this_month = month_start(datetime.now())
+    months = _months_until(month_start(oldest) if oldest else this_month,
+                           add_months(this_month, months_ahead))
+
+    cursor.execute("""
+        SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+    """, (table_name,))
+    for (constraint_name,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {table_name} DROP FOREIGN KEY {constraint_name}")
+
+    # The partitioning column becomes part of the primary key, so it cannot be NULL
+    cursor.execute(f"UPDATE {table_name} SET {column} = CURRENT_TIMESTAMP WHERE {column} IS NULL")
+    definitions = ",\n".join([_partition_definition(month) for month in months] +
+                             ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+    cursor.execute(f"""
+        ALTER TABLE {table_name}
+            MODIFY {column} TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, {column})
+        PARTITION BY RANGE (UNIX_TIMESTAMP({column})) (
+            {definitions}
+        )
+    """)
+    return len(months)
+
+
+def add_log_partitions(cursor, table_name, months_ahead=LOG_PARTITION_MONTHS_AHEAD):
+    """Split pmax so monthly partitions exist up to months_ahead; returns how many were added"""
+    names = _partition_names(cursor, table_name)
+    months = [partition_month(name) for name in names if partition_month(name)]
+    if 'pmax' not in names or not months:
+        return 0
+    new_months = _months_until(add_months(max(months), 1),
+                               add_months(month_start(datetime.now()), months_ahead))
+    if not new_months:
+        return 0
+    definitions = ",\n".join([_partition_definition(month) for month in new_months] +
+                             ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+    # pmax is normally empty, so this only rewrites metadata
+    cursor.execute(f"ALTER TABLE {table_name} REORGANIZE PARTITION pmax INTO ({definitions})")
+    return len(new_months)
+
+
+def drop_log_partitions(cursor, table_name, names):
+    if names:
+        cursor.execute(f"ALTER TABLE {table_name} DROP PARTITION {', '.join(names)}")
+
+
+def ensure_log_partitions(cursor, months_ahead=LOG_PARTITION_MONTHS_AHEAD, convert=False):
+    """
+    Keep months_ahead months ready on the partitioned log tables; with
+    convert, also partition those that are not yet. Call it while holding
+    log_maintenance_lock.
+    """
+    for table_name, column in PARTITIONED_LOG_TABLES.items():
+        try:
+            if log_partitions(cursor, table_name) is None:
+                if not convert:
+                    continue
+                count = partition_log_table(cursor, table_name, column, months_ahead)
+                print(f"✅ Partitioned {table_name} by month ({count} partitions)")
+            else:
+                count = add_log_partitions(cursor, table_name, months_ahead)
+                if count:
+                    print(f"✅ Added {count} monthly partition(s) to {table_name}")
+        except Error as e:
+            # Retention falls back to batched deletes on an unpartitioned table
+            print(f"⚠️ Could not partition {table_name}: {e}")
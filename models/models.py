@@ -1,12 +1,27 @@
 # models/models.py
 import os
+import threading
+from contextlib import contextmanager
 import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
+from models.connection_pool import ConnectionPool
 
 # Load environment variables
 load_dotenv()
 
+# Tables whose changes are published through the table_versions change feed
+CHANGE_FEED_TABLES = [
+    'schools', 'academic_years', 'terms', 'departments', 'classes',
+    'teachers', 'students', 'parents', 'student_parent', 'student_class_assignments',
+    'books', 'borrowing_records', 'users'
+]
+
+# Run on every pooled connection. The change-feed triggers skip writes made
+# with it: the audit sink bumps the version for this application's writes
+# (and knows them as its own), so triggers only count writes from elsewhere
+CHANGE_FEED_SESSION_SQL = "SET @change_feed_client = 1"
+
 def get_db_config():
     """Get DB configuration from environment variables"""
     return {
@@ -20,22 +35,65 @@ def get_db_config():
         'use_unicode': True
     }
 
+_connection_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool_config():
+    """Get connection pool settings from environment variables"""
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '32')),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        'ping_interval': float(os.getenv('DB_POOL_PING_INTERVAL', '1')),
+        'recycle': int(os.getenv('DB_POOL_RECYCLE', '3600'))
+    }
+
+def get_connection_pool():
+    """Get (lazily creating) the application-wide connection pool"""
+    global _connection_pool
+    if _connection_pool is None:
+        with _pool_lock:
+            if _connection_pool is None:
+                _connection_pool = ConnectionPool(get_db_config(), session_sql=CHANGE_FEED_SESSION_SQL,
+                                                  **get_pool_config())
+    return _connection_pool
+
 def get_db_connection():
-    """Get database connection WITHOUT automatic initialization"""
+    """
+    Borrow a connection from the shared pool.
+    Calling close() on it returns it to the pool rather than disconnecting.
+    Forms and dialogs hold these for their lifetime, so this never waits for
+    a free slot: past DB_POOL_SIZE it opens an overflow connection. Short
+    work on worker threads uses db_connection(), which the cap does bound.
+    """
     try:
-        config = get_db_config()
-        conn = mysql.connector.connect(**config)
-        
-        if conn.is_connected():
-            print(f"✅ Connected to database: {config['database']}")
-            return conn
-        else:
-            raise Error("Failed to establish connection")
-            
+        return get_connection_pool().get_connection(overflow=True)
     except Error as e:
         print(f"❌ Database connection error: {e}")
         raise
 
+@contextmanager
+def db_connection():
+    """
+    Per-thread checkout: `with db_connection() as conn:` borrows a pooled
+    connection and returns it on exit. Nested blocks on one thread share it.
+    """
+    with get_connection_pool().connection() as conn:
+        yield conn
+
+def get_pool_stats():
+    """Return connection pool metrics (created/closed, in use, wait times...)"""
+    if _connection_pool is None:
+        return {}
+    return _connection_pool.stats()
+
+def close_connection_pool():
+    """Close all pooled connections - call on application shutdown"""
+    global _connection_pool
+    with _pool_lock:
+        pool, _connection_pool = _connection_pool, None
+    if pool is not None:
+        pool.close_all()
+
 def create_database_if_not_exists():
     """Create database if it doesn't exist"""
     try:
@@ -1303,16 +1361,110 @@ def initialize_tables(conn, force=False):
                 message_id INT NOT NULL,
                 content_id VARCHAR(255),
                 filename VARCHAR(255) NOT NULL,
+                sha256 CHAR(64),
                 file_data LONGBLOB,
                 file_size INT,
                 content_type VARCHAR(100),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (message_id) REFERENCES email_messages(id),
                 INDEX idx_message_id (message_id),
-                INDEX idx_content_id (content_id)
+                INDEX idx_content_id (content_id),
+                INDEX idx_sha256 (sha256)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         ''')
         
+        # Incoming mail sync position per mailbox (services/email_notification_service.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_sync_state (
+                account VARCHAR(255) NOT NULL,
+                mailbox VARCHAR(100) NOT NULL,
+                uid_validity BIGINT NOT NULL,
+                last_uid BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (account, mailbox)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        ''')
+        
+        # Outgoing mail queue (services/email_outbox.py): one row per recipient
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id INT PRIMARY KEY AUTO_INCREMENT,
+                batch_id CHAR(32) NOT NULL,
+                to_email VARCHAR(255) NOT NULL,
+                subject VARCHAR(500) NOT NULL,
+                body MEDIUMTEXT NOT NULL,
+                is_html BOOLEAN DEFAULT TRUE,
+                attachments JSON,
+                reply_to VARCHAR(255),
+                in_reply_to VARCHAR(255),
+                origin_host VARCHAR(255),
+                status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                attempts INT NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                claim_token CHAR(32),
+                claimed_at DATETIME,
+                sent_at DATETIME,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_outbox_due (status, next_attempt_at),
+                INDEX idx_outbox_batch (batch_id, status),
+                INDEX idx_outbox_claim (claim_token)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        ''')
+
+        # Batches whose completion has been reported (batch_finished fires once)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_outbox_batches (
+                batch_id CHAR(32) PRIMARY KEY,
+                finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        ''')
+
+        # Daily audit counts (services/audit_summary.py), filled on demand per day
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS audit_daily_counts (
+                day DATE NOT NULL,
+                action VARCHAR(100) NOT NULL,
+                table_name VARCHAR(100) NOT NULL DEFAULT '',
+                user_id INT NOT NULL DEFAULT 0,
+                total INT UNSIGNED NOT NULL,
+                PRIMARY KEY (day, action, table_name, user_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS audit_rollup_days (
+                day DATE PRIMARY KEY
+            ) ENGINE=InnoDB
+        ''')
+
+        # Change feed (services/change_feed.py): one version counter per table,
+        # bumped by triggers so clients poll a handful of rows instead of the data
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS table_versions (
+                table_name VARCHAR(64) PRIMARY KEY,
+                version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        ''')
+
+        for table_name in CHANGE_FEED_TABLES:
+            for event, suffix in (("INSERT", "ai"), ("UPDATE", "au"), ("DELETE", "ad")):
+                trigger_name = f"trg_{table_name}_{suffix}_version"
+                try:
+                    # Replaced so an older trigger without the client check is upgraded
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+                    cursor.execute(f'''
+                        CREATE TRIGGER {trigger_name} AFTER {event} ON {table_name}
+                        FOR EACH ROW
+                        INSERT INTO table_versions (table_name, version)
+                        SELECT '{table_name}', 1 FROM DUAL WHERE @change_feed_client IS NULL
+                        ON DUPLICATE KEY UPDATE version = version + 1
+                    ''')
+                except Error as e:
+                    # e.g. no TRIGGER privilege: audited writes still bump versions
+                    print(f"⚠️ Change-feed trigger {trigger_name} not created: {e}")
+                    break
+
         #print("Creating additional indexes for performance optimization...")
         
         # Additional performance indexes - only create if they don't exist
@@ -1320,7 +1472,17 @@ def initialize_tables(conn, force=False):
             ("idx_student_school_active", "students", "school_id, is_active"),
             ("idx_teacher_school_active", "teachers", "school_id, is_active"),
             ("idx_user_role_active", "users", "role, is_active"),
-            ("idx_settings_school_key", "system_settings", "school_id, setting_key")
+            ("idx_settings_school_key", "system_settings", "school_id, setting_key"),
+            # Keyset pagination of the people lists: ORDER BY surname, first_name, id
+            ("idx_students_active_name", "students", "is_active, surname, first_name, id"),
+            ("idx_parents_active_name", "parents", "is_active, surname, first_name, id"),
+            ("idx_teachers_name", "teachers", "surname, first_name, id"),
+            # Covers the audit summary GROUP BY over a date range
+            ("idx_audit_summary", "audit_log", "created_at, action, table_name, user_id"),
+            # Log browsers filter on resolved user ids, newest first
+            ("idx_audit_user_time", "audit_log", "user_id, created_at"),
+            # Email recipients: current members of the selected classes
+            ("idx_sca_class_current", "student_class_assignments", "class_id, is_current, student_id")
         ]
         
         for index_name, table_name, columns in indexes_to_create:
@@ -1333,6 +1495,63 @@ def initialize_tables(conn, force=False):
                 else:
                     print(f"⚠️ Error creating index {index_name}: {e}")
 
+        # FULLTEXT indexes for people search (services/people_search.py).
+        # The ngram parser matches substrings of names, reg numbers and phones;
+        # servers without it fall back to the in-process trigram index.
+        fulltext_indexes = [
+            ("ft_students_search", "students", "first_name, surname, full_name, regNo, email"),
+            ("ft_parents_search", "parents", "first_name, surname, full_name, phone, email"),
+            ("ft_teachers_search", "teachers",
+             "first_name, surname, full_name, teacher_id_code, email, phone_contact_1")
+        ]
+
+        # An ngram token containing a stopword ("an", "de", "la", ...) is never
+        # indexed, so names like Anna or Delacroix would not be found. Each
+        # index keeps the stopword setting it was created with.
+        try:
+            cursor.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+            stopwords_disabled = True
+        except Error as e:
+            stopwords_disabled = False
+            print(f"⚠️ Could not disable fulltext stopwords, people search will use trigram fallback: {e}")
+
+        for index_name, table_name, columns in fulltext_indexes if stopwords_disabled else []:
+            try:
+                cursor.execute(
+                    f"CREATE FULLTEXT INDEX {index_name} ON {table_name}({columns}) WITH PARSER ngram"
+                )
+                print(f"✅ Created fulltext index: {index_name}")
+            except Error as e:
+                if "Duplicate key name" in str(e) or "already exists" in str(e):
+                    print(f"ℹ️ Index {index_name} already exists")
+                else:
+                    print(f"⚠️ Fulltext index {index_name} not created, search will use trigram fallback: {e}")
+
+        if stopwords_disabled:
+            cursor.execute("SET SESSION innodb_ft_enable_stopword = ON")
+
+        # Monthly partitions for the log tables (retention drops whole months);
+        # a new schema's log tables are empty, so converting them is instant
+        from models.log_partitions import ensure_log_partitions, log_maintenance_lock
+        try:
+            with log_maintenance_lock(conn):
+                ensure_log_partitions(cursor, convert=True)
+        except Error as e:
+            print(f"⚠️ Log tables not partitioned: {e}")
+
+        # Description search index; MySQL refuses FULLTEXT on a partitioned
+        # table, in which case the audit browser searches with LIKE
+        try:
+            cursor.execute(
+                "CREATE FULLTEXT INDEX ft_audit_description ON audit_log(description) WITH PARSER ngram"
+            )
+            print("✅ Created fulltext index: ft_audit_description")
+        except Error as e:
+            if "Duplicate key name" in str(e):
+                print("ℹ️ Index ft_audit_description already exists")
+            else:
+                print(f"ℹ️ Fulltext index ft_audit_description not created, description search uses LIKE: {e}")
+
         print("Database schema creation completed successfully!")
 
         # Re-enable foreign key checks
@@ -0,0 +1,210 @@
+# services/attachment_store.py
+"""
+Content-addressed storage for received email attachments.
+
+Attachment bytes live on disk under ATTACHMENT_STORE_DIR, named by their
+SHA-256 (ab/abcdef...). Every client reads and writes the same files, so
+ATTACHMENT_STORE_DIR names an existing shared folder (a network share all
+workstations mount). The same PDF sent to a hundred conversations is stored
+once, and email_attachments keeps only metadata and the sha256, so
+conversation loads and database backups no longer carry the blobs. Files
+are written to a temporary name and renamed, so a stored hash always points
+at complete content.
+
+Until the store is configured and the table has a sha256 column,
+attachments keep going into the file_data LONGBLOB column as before, and
+those rows stay readable. An administrator moves to the store once with
+
+    python -m services.attachment_store
+
+which adds the sha256 column, moves the blobs into the store one row at a
+time and then drops file_data. Any legacy row opened after the column
+exists is moved on the spot.
+"""
+import base64
+import hashlib
+import os
+import tempfile
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_STORE_DIR = os.getenv('ATTACHMENT_STORE_DIR', '')
+
+
+class AttachmentStoreError(Exception):
+    """The shared attachment store is not configured or not reachable"""
+
+
+def store_configured():
+    """True if ATTACHMENT_STORE_DIR names an existing folder"""
+    return bool(ATTACHMENT_STORE_DIR) and os.path.isdir(ATTACHMENT_STORE_DIR)
+
+
+def store_dir():
+    """The configured shared store folder; raises AttachmentStoreError if there is none"""
+    if not ATTACHMENT_STORE_DIR:
+        raise AttachmentStoreError("ATTACHMENT_STORE_DIR is not set; point it at a folder shared by all clients")
+    if not os.path.isdir(ATTACHMENT_STORE_DIR):
+        raise AttachmentStoreError(f"Attachment store {ATTACHMENT_STORE_DIR} does not exist or is not mounted")
+    return ATTACHMENT_STORE_DIR
+
+
+def attachment_path(sha256):
+    return os.path.join(store_dir(), sha256[:2], sha256)
+
+
+def put_bytes(data):
+    """Store data (if not already stored) and return its SHA-256"""
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = attachment_path(sha256)
+    if os.path.exists(path):
+        return sha256
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return sha256
+
+
+def _columns(cursor):
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'email_attachments'
+    """)
+    return {row[0] for row in cursor.fetchall()}
+
+
+def ensure_attachment_columns(cursor):
+    """Add the sha256 column to an email_attachments table from before the store"""
+    columns = _columns(cursor)
+    if 'sha256' not in columns:
+        cursor.execute("ALTER TABLE email_attachments ADD COLUMN sha256 CHAR(64) NULL AFTER filename, "
+                       "ADD INDEX idx_sha256 (sha256)")
+        print("✅ Added email_attachments.sha256")
+        columns.add('sha256')
+    return columns
+
+
+def save_attachment(cursor, message_id, content_id, filename, data, size, content_type):
+    """
+    Insert an email_attachments row for data: into the store when it is set
+    up, otherwise into file_data. Not committed; returns the row id.
+    """
+    columns = _columns(cursor)
+    if 'sha256' in columns and (store_configured() or 'file_data' not in columns):
+        cursor.execute("""
+            INSERT INTO email_attachments
+            (message_id, content_id, filename, sha256, file_size, content_type)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (message_id, content_id, filename, put_bytes(data), size, content_type))
+    else:
+        cursor.execute("""
+            INSERT INTO email_attachments
+            (message_id, content_id, filename, file_data, file_size, content_type)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (message_id, content_id, filename, data, size, content_type))
+    return cursor.lastrowid
+
+
+def _legacy_bytes(cursor, attachment_id):
+    """A row's file_data as bytes (None if it has none)"""
+    cursor.execute("SELECT file_data FROM email_attachments WHERE id = %s", (attachment_id,))
+    row = cursor.fetchone()
+    if not row or row[0] is None:
+        return None
+    data = row[0]
+    if isinstance(data, str):
+        # Some early rows were stored base64-encoded
+        data = base64.b64decode(data)
+    return bytes(data)
+
+
+def _legacy_copy(filename, data):
+    """Write a legacy blob to a temporary file (callers copy it where it is needed)"""
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(filename or '')[1])
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _migrate_row(conn, cursor, attachment_id):
+    """Move one legacy blob into the store; returns its sha256 (None if it has no data)"""
+    data = _legacy_bytes(cursor, attachment_id)
+    if data is None:
+        return None
+    sha256 = put_bytes(data)
+    cursor.execute("UPDATE email_attachments SET sha256 = %s, file_data = NULL WHERE id = %s",
+                   (sha256, attachment_id))
+    conn.commit()
+    return sha256
+
+
+def migrate_attachment_blobs(conn):
+    """Move every legacy file_data blob into the store, then drop the column (admin step)"""
+    store_dir()
+    cursor = conn.cursor()
+    try:
+        if 'file_data' not in ensure_attachment_columns(cursor):
+            return 0
+        cursor.execute("SELECT id FROM email_attachments WHERE sha256 IS NULL AND file_data IS NOT NULL")
+        ids = [row[0] for row in cursor.fetchall()]
+        for attachment_id in ids:
+            # One blob in memory at a time
+            _migrate_row(conn, cursor, attachment_id)
+        cursor.execute("SELECT COUNT(*) FROM email_attachments WHERE sha256 IS NULL AND file_data IS NOT NULL")
+        if cursor.fetchone()[0] == 0:
+            # Rebuilds the table without the blobs, returning their space
+            cursor.execute("ALTER TABLE email_attachments DROP COLUMN file_data")
+        logger.info(f"Moved {len(ids)} email attachment(s) into {store_dir()}")
+        return len(ids)
+    finally:
+        cursor.close()
+
+
+def resolve_attachment(conn, attachment_id):
+    """
+    (filename, path of the bytes) for an attachment, or None if it has no
+    content. A row still in file_data is moved into the store if there is
+    one, and otherwise copied to a temporary file.
+    """
+    cursor = conn.cursor()
+    try:
+        columns = _columns(cursor)
+        sha256_column = "sha256" if 'sha256' in columns else "NULL"
+        cursor.execute(f"SELECT filename, {sha256_column} FROM email_attachments WHERE id = %s",
+                       (attachment_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        filename, sha256 = row
+        if sha256 is None:
+            if 'file_data' not in columns:
+                return None
+            if 'sha256' in columns and store_configured():
+                sha256 = _migrate_row(conn, cursor, attachment_id)
+            else:
+                data = _legacy_bytes(cursor, attachment_id)
+                return (filename, _legacy_copy(filename, data)) if data is not None else None
+        if sha256 is None:
+            return None
+        path = attachment_path(sha256)
+        return (filename, path) if os.path.exists(path) else None
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    from models.models import db_connection
+
+    with db_connection() as conn:
+        count = migrate_attachment_blobs(conn)
+    print(f"✅ Moved {count} email attachment(s) into {store_dir()}")
@@ -0,0 +1,64 @@
+# services/audit_diff.py
+"""
+Field-level change capture for the audit log.
+
+Updates are audited with only the fields that changed: diff_values() compares
+the row as it was (usually the record the form loaded, so no extra SELECT is
+needed; snapshot_row() reads it otherwise) with the values being written,
+and to_json() stores the two sides as compact JSON in audit_log.old_values /
+new_values.
+"""
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+
+def normalize_value(value):
+    """Comparable, JSON-friendly form of a column or widget value"""
+    if value is None or value == "":
+        # Forms show NULL as an empty field and save it back as ""
+        return None
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    return value
+
+
+def diff_values(old, new):
+    """
+    Compare the keys of new against old.
+    Returns (old_changed, new_changed): dicts holding only the changed keys.
+    """
+    old_changed, new_changed = {}, {}
+    for key, value in new.items():
+        before = normalize_value(old.get(key))
+        after = normalize_value(value)
+        if before != after:
+            old_changed[key] = before
+            new_changed[key] = after
+    return old_changed, new_changed
+
+
+def to_json(values):
+    """Compact JSON for an audit column (None when there is nothing to store)"""
+    if not values:
+        return None
+    return json.dumps({key: normalize_value(value) for key, value in values.items()},
+                      separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def snapshot_row(cursor, table_name, record_id, columns):
+    """Read the current values of columns for one row (None if it does not exist)"""
+    columns = list(columns)
+    cursor.execute(f"SELECT {', '.join(columns)} FROM {table_name} WHERE id = %s", (record_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return dict(row) if isinstance(row, dict) else dict(zip(columns, row))
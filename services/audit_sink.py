@@ -0,0 +1,222 @@
+# services/audit_sink.py
+"""
+Buffered, asynchronous audit log writer.
+
+AuditBaseForm.log_audit_action only queues an event here; a background
+thread writes queued events to audit_log with one multi-row INSERT (and one
+commit) every AUDIT_FLUSH_EVENTS events or AUDIT_FLUSH_MS milliseconds,
+whichever comes first. The same transaction bumps the change-feed versions
+of the tables involved. If the database cannot be reached the batch is
+appended to a local spill file (JSON lines) and replayed by the next
+successful flush. flush()/shutdown() drain the queue on exit.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import logging
+from datetime import date, datetime
+
+from PySide6.QtCore import QObject, Signal
+from mysql.connector import errors as mysql_errors
+
+from models.models import db_connection
+from services.change_feed import record_table_change
+from services.audit_summary import forget_rollup_days
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AUDIT_FLUSH_EVENTS = int(os.getenv('AUDIT_FLUSH_EVENTS', '50'))
+AUDIT_FLUSH_MS = int(os.getenv('AUDIT_FLUSH_MS', '500'))
+AUDIT_SPILL_FILE = os.getenv('AUDIT_SPILL_FILE', os.path.join('logs', 'audit_spill.jsonl'))
+
+AUDIT_COLUMNS = ('user_id', 'action', 'table_name', 'record_id', 'description', 'ip_address',
+                 'old_values', 'new_values', 'created_at')
+
+# Errors caused by the rows themselves rather than by the connection
+_ROW_ERRORS = (mysql_errors.IntegrityError, mysql_errors.DataError, mysql_errors.ProgrammingError)
+
+_INSERT_AUDIT = f"""
+    INSERT INTO audit_log ({', '.join(AUDIT_COLUMNS)})
+    VALUES ({', '.join(['%s'] * len(AUDIT_COLUMNS))})
+"""
+
+
+class AuditSink(QObject):
+    """Queues audit events and writes them in batches on a worker thread"""
+    # table -> change-feed version written by a flush (delivered to the GUI thread)
+    versions_recorded = Signal(object)
+
+    def __init__(self, flush_events=AUDIT_FLUSH_EVENTS, flush_ms=AUDIT_FLUSH_MS,
+                 spill_file=AUDIT_SPILL_FILE, parent=None):
+        super().__init__(parent)
+        self.flush_events = max(1, flush_events)
+        self.flush_interval = max(0.05, flush_ms / 1000)
+        self.spill_file = spill_file
+        self._queue = queue.Queue()
+        self._flush_lock = threading.Lock()  # one writer at a time (worker or flush())
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+            self._thread.start()
+
+    def log(self, user_id, action, table_name, record_id, description, ip_address,
+            old_values=None, new_values=None):
+        """Queue one audit event (timestamped now, not when it is written)"""
+        self._queue.put((user_id, action, table_name, record_id, description, ip_address,
+                         old_values, new_values, datetime.now().replace(microsecond=0)))
+        if self._thread is None:
+            self.start()
+
+    def flush(self):
+        """Write everything queued so far (blocking)"""
+        self._write(self._drain())
+
+    def shutdown(self, timeout=5):
+        """Stop the worker and flush what is left"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _drain(self, first=None):
+        events = [] if first is None else [first]
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # Gather a batch: up to flush_events, or whatever arrives within the interval
+            events = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(events) < self.flush_events and not self._stopping.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    events.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(events)
+
+    def _write(self, events):
+        with self._flush_lock:
+            spilled = self._read_spill()
+            batch = spilled + events
+            if not batch:
+                return
+            try:
+                versions = {}
+                with db_connection() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        try:
+                            # executemany turns this into a single multi-row INSERT
+                            cursor.executemany(_INSERT_AUDIT, batch)
+                        except _ROW_ERRORS as e:
+                            # A bad row must not hold back the batch (or the spill file forever)
+                            conn.rollback()
+                            logger.warning(f"Audit batch rejected ({e}); writing rows one by one")
+                            self._insert_rows(cursor, batch)
+                        # Daily counts already rolled up for these days are now short
+                        today = date.today()
+                        forget_rollup_days(cursor, sorted({event[-1].date() for event in batch
+                                                           if event[-1].date() < today}))
+                        for table_name in {event[2] for event in events if event[2]}:
+                            version = record_table_change(cursor, table_name)
+                            if version is not None:
+                                versions[table_name] = version
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                    finally:
+                        cursor.close()
+            except Exception as e:
+                logger.warning(f"Audit log unavailable, spilling {len(events)} event(s) to {self.spill_file}: {e}")
+                self._spill(events)
+                return
+            if spilled:
+                self._clear_spill()
+                logger.info(f"Replayed {len(spilled)} spilled audit event(s)")
+            if versions:
+                self.versions_recorded.emit(versions)
+
+    @staticmethod
+    def _insert_rows(cursor, batch):
+        for event in batch:
+            try:
+                cursor.execute(_INSERT_AUDIT, event)
+            except _ROW_ERRORS as e:
+                logger.error(f"Dropping audit event {event[1]} on {event[2]}: {e}")
+
+    # Spill file: one JSON array per event, in AUDIT_COLUMNS order
+    def _spill(self, events):
+        try:
+            directory = os.path.dirname(self.spill_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.spill_file, 'a', encoding='utf-8') as f:
+                for event in events:
+                    f.write(json.dumps(list(event[:-1]) + [event[-1].isoformat(sep=' ')]) + "\n")
+        except OSError as e:
+            logger.error(f"Could not write audit spill file, {len(events)} event(s) lost: {e}")
+
+    def _read_spill(self):
+        if not os.path.exists(self.spill_file):
+            return []
+        events = []
+        try:
+            with open(self.spill_file, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        values = json.loads(line)
+                        values[-1] = datetime.fromisoformat(values[-1])
+                        if len(values) < len(AUDIT_COLUMNS):
+                            # Spilled before old/new values were recorded
+                            values[-1:-1] = [None] * (len(AUDIT_COLUMNS) - len(values))
+                    except (ValueError, TypeError, IndexError):
+                        # e.g. a line cut short by a crash while spilling
+                        logger.warning(f"Skipping unreadable audit spill line: {line[:80]}")
+                        continue
+                    events.append(tuple(values))
+        except OSError as e:
+            logger.error(f"Could not read audit spill file {self.spill_file}: {e}")
+            return []
+        return events
+
+    def _clear_spill(self):
+        try:
+            os.remove(self.spill_file)
+        except OSError as e:
+            logger.error(f"Could not remove replayed audit spill file: {e}")
+
+
+_audit_sink = None
+
+
+def get_audit_sink():
+    """Shared AuditSink (create it from the GUI thread)"""
+    global _audit_sink
+    if _audit_sink is None:
+        _audit_sink = AuditSink()
+        _audit_sink.start()
+    return _audit_sink
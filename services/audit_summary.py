@@ -0,0 +1,180 @@
+# services/audit_summary.py
+"""
+Audit log statistics computed by the database.
+
+summarize_audit_log() counts actions per action type, table, user and day
+over the whole filtered range with GROUP BY queries, instead of counting
+the page of rows a form happened to load. Whole past days are answered from
+audit_daily_counts, a daily rollup filled on demand from audit_log (one
+GROUP BY per missing span of days, remembered in audit_rollup_days). Only
+today, or a filter on the description text, reads audit_log itself, through
+the idx_audit_summary covering index. The audit sink forgets the rollup of
+any past day it writes events for (e.g. when replaying its spill file).
+"""
+import logging
+from datetime import date, datetime, timedelta
+
+from mysql.connector import errors as mysql_errors
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Users listed in the summary (busiest first)
+SUMMARY_TOP_USERS = 10
+
+_RAW_GROUPS = """
+    SELECT DATE(created_at) AS day, action, COALESCE(table_name, '') AS table_name,
+           COALESCE(user_id, 0) AS user_id, COUNT(*) AS total
+    FROM audit_log
+    WHERE created_at >= %s AND created_at < %s{conditions}
+    GROUP BY DATE(created_at), action, COALESCE(table_name, ''), COALESCE(user_id, 0)
+"""
+
+_ROLLUP_GROUPS = """
+    SELECT day, action, table_name, user_id, total
+    FROM audit_daily_counts
+    WHERE day >= %s AND day < %s{conditions}
+"""
+
+
+def forget_rollup_days(cursor, days):
+    """Mark days for recount (call in the transaction that adds their events)"""
+    if not days:
+        return
+    try:
+        cursor.execute(
+            f"DELETE FROM audit_rollup_days WHERE day IN ({', '.join(['%s'] * len(days))})",
+            tuple(days)
+        )
+    except mysql_errors.ProgrammingError:
+        pass  # No rollup tables on this database
+
+
+def _spans(days):
+    """Group sorted days into contiguous [start, end) spans"""
+    spans = []
+    for day in days:
+        if spans and spans[-1][1] == day:
+            spans[-1][1] = day + timedelta(days=1)
+        else:
+            spans.append([day, day + timedelta(days=1)])
+    return spans
+
+
+def ensure_rollup(conn, start, end):
+    """
+    Fill audit_daily_counts for the days in [start, end) that are missing.
+    Returns False if the rollup tables are not available.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MIN(created_at) FROM audit_log")
+        oldest = cursor.fetchone()[0]
+        if oldest is not None:
+            # Earlier days have no rows left to count (kept rollups still answer them)
+            start = max(start, oldest.date())
+        if start >= end:
+            return True
+        cursor.execute("SELECT day FROM audit_rollup_days WHERE day >= %s AND day < %s", (start, end))
+        done = {row[0] for row in cursor.fetchall()}
+        missing = [start + timedelta(days=i) for i in range((end - start).days)
+                   if start + timedelta(days=i) not in done]
+        for span_start, span_end in _spans(missing):
+            cursor.execute("DELETE FROM audit_daily_counts WHERE day >= %s AND day < %s", (span_start, span_end))
+            # Another client may be rolling up the same days: the later count wins
+            cursor.execute(
+                "INSERT INTO audit_daily_counts (day, action, table_name, user_id, total) "
+                + _RAW_GROUPS.format(conditions="")
+                + " ON DUPLICATE KEY UPDATE total = VALUES(total)",
+                (span_start, span_end)
+            )
+        if missing:
+            cursor.executemany("INSERT IGNORE INTO audit_rollup_days (day) VALUES (%s)",
+                               [(day,) for day in missing])
+            conn.commit()
+            logger.info(f"Rolled up {len(missing)} day(s) of audit log")
+        return True
+    except mysql_errors.ProgrammingError as e:
+        conn.rollback()
+        logger.warning(f"Audit rollup unavailable, counting audit_log directly: {e}")
+        return False
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _conditions(filters, include_description):
+    sql, params = "", []
+    if filters.get('action'):
+        sql += " AND action = %s"
+        params.append(filters['action'])
+    if filters.get('table_name'):
+        sql += " AND table_name = %s"
+        params.append(filters['table_name'])
+    if filters.get('username'):
+        sql += " AND user_id IN (SELECT id FROM users WHERE username LIKE %s)"
+        params.append(f"%{filters['username']}%")
+    if include_description and filters.get('description'):
+        sql += " AND description LIKE %s"
+        params.append(f"%{filters['description']}%")
+    return sql, params
+
+
+def _grouped_source(conn, filters):
+    """SQL and params producing (day, action, table_name, user_id, total) groups"""
+    start, end = filters['from_date'], filters['to_date']
+    today = date.today()
+    conditions, params = _conditions(filters, include_description=True)
+    raw_range = (datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time()))
+    # The description is not in the rollup; past days otherwise are
+    if filters.get('description') or start >= today or not ensure_rollup(conn, start, min(end, today)):
+        return _RAW_GROUPS.format(conditions=conditions), list(raw_range) + params
+
+    rollup_conditions, rollup_params = _conditions(filters, include_description=False)
+    sql = _ROLLUP_GROUPS.format(conditions=rollup_conditions)
+    params = [start, min(end, today)] + rollup_params
+    if end > today:
+        sql += " UNION ALL " + _RAW_GROUPS.format(conditions=rollup_conditions)
+        params += [datetime.combine(today, datetime.min.time()), raw_range[1]] + rollup_params
+    return sql, params
+
+
+def summarize_audit_log(conn, filters):
+    """
+    Counts for audit_log rows matching filters: from_date, to_date (dates,
+    to_date exclusive) and optional action, table_name, username (substring)
+    and description (substring).
+    Returns a dict: total, by_action, by_table, by_user, by_day (lists of (name, count)).
+    """
+    source, params = _grouped_source(conn, filters)
+    cursor = conn.cursor()
+    try:
+        # Group once, then break the (small) grouped set down four ways
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_audit_summary")
+        cursor.execute(f"CREATE TEMPORARY TABLE tmp_audit_summary AS {source}", tuple(params))
+        summary = {}
+        for name, query in (
+            ('by_action', "SELECT action, SUM(total) FROM tmp_audit_summary GROUP BY action ORDER BY 2 DESC"),
+            ('by_table', "SELECT table_name, SUM(total) FROM tmp_audit_summary GROUP BY table_name ORDER BY 2 DESC"),
+            ('by_user', f"""
+                SELECT COALESCE(u.username, 'System'), SUM(s.total)
+                FROM tmp_audit_summary s
+                LEFT JOIN users u ON u.id = s.user_id
+                GROUP BY s.user_id, u.username
+                ORDER BY 2 DESC
+                LIMIT {SUMMARY_TOP_USERS}
+            """),
+            ('by_day', "SELECT day, SUM(total) FROM tmp_audit_summary GROUP BY day ORDER BY day"),
+        ):
+            cursor.execute(query)
+            summary[name] = [(key, int(count)) for key, count in cursor.fetchall()]
+        summary['total'] = sum(count for _, count in summary['by_action'])
+        return summary
+    finally:
+        try:
+            cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_audit_summary")
+        finally:
+            cursor.close()
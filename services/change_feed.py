@@ -0,0 +1,200 @@
+# services/change_feed.py
+"""
+Table change feed and in-app signal bus.
+
+table_versions holds one counter per table. This application's audited
+writes bump it through record_table_change() in the audit sink, once per
+table per batch. The triggers from models.initialize_tables bump it only for
+writes from outside the application: every pooled connection sets
+@change_feed_client, which the triggers check.
+A single ChangeFeed polls those few rows for the whole application and tells
+subscribed forms which tables changed, so forms refresh only what they show
+instead of each running its own polling query. Changes made in this process
+are published immediately, without waiting for the next poll.
+
+Versions this process wrote itself (reported by the audit sink) are counted
+off when a poll sees a table move: only bumps beyond our own are news, so
+another workstation's change is never swallowed and our own is not echoed.
+While a local change's bump is still waiting in the audit sink, a poll
+leaves that table for the next one.
+"""
+import os
+import time
+import logging
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from services.query_executor import get_query_executor
+from services.reference_cache import invalidate_reference_data
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between polls of table_versions
+CHANGE_FEED_INTERVAL = int(os.getenv('CHANGE_FEED_INTERVAL', '5'))
+# How long a poll waits for the audit sink to write a local change's version
+CHANGE_FEED_PENDING_SECONDS = 10
+
+
+def record_table_change(cursor, table_name):
+    """
+    Bump table_name's version in the caller's transaction.
+    Returns the new version, or None if it could not be recorded.
+    """
+    try:
+        # LAST_INSERT_ID(expr) hands the new counter back through lastrowid
+        cursor.execute("""
+            INSERT INTO table_versions (table_name, version) VALUES (%s, LAST_INSERT_ID(1))
+            ON DUPLICATE KEY UPDATE version = LAST_INSERT_ID(version + 1)
+        """, (table_name,))
+        return cursor.lastrowid
+    except Exception as e:
+        logger.warning(f"Could not record change to {table_name}: {e}")
+        return None
+
+
+class _Subscription:
+    __slots__ = ('tables', 'callback', 'owner')
+
+    def __init__(self, tables, callback, owner):
+        self.tables = tables
+        self.callback = callback
+        self.owner = owner
+
+
+class ChangeFeed(QObject):
+    """Polls table_versions and publishes changed tables to subscribers"""
+    tables_changed = Signal(object)  # set of table names
+
+    def __init__(self, interval=CHANGE_FEED_INTERVAL, parent=None):
+        super().__init__(parent)
+        self.versions = None  # table -> highest version seen by a poll
+        self._own_versions = {}  # table -> versions this process wrote, not yet seen by a poll
+        self._pending = {}  # table -> deadline for the sink to write a local change's version
+        self._subscriptions = []
+        self._polling = False
+        self.timer = QTimer(self)
+        self.timer.setInterval(max(1, interval) * 1000)
+        self.timer.timeout.connect(self.poll)
+
+    def start(self):
+        self.poll()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def subscribe(self, tables, callback, owner=None):
+        """
+        Call callback(changed_tables) when any of tables changes.
+        With an owner QObject the subscription ends when the owner is
+        destroyed, and changes the owner itself published are not echoed back.
+        """
+        subscription = _Subscription(frozenset(tables), callback, owner)
+        self._subscriptions.append(subscription)
+        if owner is not None:
+            owner.destroyed.connect(lambda *args: self.unsubscribe(subscription))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    def notify_local_change(self, table_name, version=None, source=None):
+        """Publish a change made by this process (version from record_table_change, if known)"""
+        if version is not None:
+            self._note_own_version(table_name, version)
+        else:
+            # The audit sink writes the bump shortly; note_versions() reports it
+            self._pending[table_name] = time.monotonic() + CHANGE_FEED_PENDING_SECONDS
+        self._publish({table_name}, source)
+
+    def note_versions(self, versions):
+        """Versions written by this process elsewhere (e.g. the audit sink): not news"""
+        for table_name, version in versions.items():
+            self._note_own_version(table_name, version)
+            self._pending.pop(table_name, None)
+
+    def _note_own_version(self, table_name, version):
+        if self.versions is not None and version <= self.versions.get(table_name, 0):
+            return  # A poll has already accounted for it
+        self._own_versions.setdefault(table_name, set()).add(version)
+
+    def poll(self):
+        if self._polling:
+            return
+        self._polling = True
+        get_query_executor().submit_call(
+            self._read_versions, key='change_feed.poll',
+            on_result=self._on_versions,
+            on_error=lambda error: logger.warning(f"Change feed poll failed: {error}"),
+            on_finished=self._poll_finished
+        )
+
+    def _poll_finished(self):
+        self._polling = False
+
+    @staticmethod
+    def _read_versions(connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT table_name, version FROM table_versions")
+            return dict(cursor.fetchall())
+        finally:
+            cursor.close()
+
+    def _on_versions(self, versions):
+        if self.versions is None:
+            self.versions = dict(versions)
+            for table_name in list(self._own_versions):
+                self._forget_own_versions(table_name, self.versions.get(table_name, 0))
+            return
+        now = time.monotonic()
+        changed = set()
+        for table_name, version in versions.items():
+            known = self.versions.get(table_name, 0)
+            if version <= known:
+                continue  # Unchanged, or a stale poll: versions never move backwards
+            if self._pending.get(table_name, 0) > now:
+                continue  # Our own bump is not written yet; decide on a later poll
+            self._pending.pop(table_name, None)
+            own = sum(1 for own_version in self._own_versions.get(table_name, ())
+                      if known < own_version <= version)
+            if version - known > own:
+                changed.add(table_name)
+            self.versions[table_name] = version
+            self._forget_own_versions(table_name, version)
+        if changed:
+            self._publish(changed)
+
+    def _forget_own_versions(self, table_name, seen_version):
+        remaining = {v for v in self._own_versions.get(table_name, ()) if v > seen_version}
+        if remaining:
+            self._own_versions[table_name] = remaining
+        else:
+            self._own_versions.pop(table_name, None)
+
+    def _publish(self, changed, source=None):
+        invalidate_reference_data(*changed)
+        self.tables_changed.emit(changed)
+        for subscription in list(self._subscriptions):
+            if source is not None and subscription.owner is source:
+                continue
+            hit = changed & subscription.tables
+            if hit:
+                try:
+                    subscription.callback(hit)
+                except Exception as e:
+                    logger.error(f"Change feed subscriber failed: {e}")
+
+
+_change_feed = None
+
+
+def get_change_feed():
+    """Shared ChangeFeed (create it from the GUI thread)"""
+    global _change_feed
+    if _change_feed is None:
+        _change_feed = ChangeFeed()
+    return _change_feed
@@ -1,22 +1,46 @@
 # services/email_notification_service.py
+"""
+Incoming mail watcher for replies to school emails.
+
+One IMAP session stays open and waits in IDLE, so new mail is seen within
+seconds; servers without IDLE are polled every email_config.check_interval
+minutes. Each sync asks only for UIDs above the last one processed (kept in
+email_sync_state with the mailbox's UIDVALIDITY), reads just their headers,
+and downloads the full message only for mail that concerns the school.
+"""
 import imaplib
 import email
+import select
 import time
 import re
 import json
 import base64
 import os
-from threading import Thread
+from threading import Thread, Event
 from datetime import datetime, timedelta
 from email.header import decode_header
 import quopri
 from PySide6.QtCore import QObject, Signal, QTimer
 import logging
 
+from models.models import db_connection as models_db_connection
+from services.attachment_store import resolve_attachment, save_attachment
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+IMAP_MAILBOX = 'INBOX'
+IMAP_USE_IDLE = os.getenv('IMAP_USE_IDLE', 'True').lower() == 'true'
+IMAP_IDLE_SECONDS = int(os.getenv('IMAP_IDLE_SECONDS', '540'))
+IMAP_TIMEOUT_SECONDS = 60
+IMAP_RETRY_SECONDS = 30
+IMAP_MAX_RETRY_SECONDS = 600
+IMAP_FETCH_BATCH = 100
+# Syncs that retry a message which could not be saved before it is skipped
+IMAP_SAVE_ATTEMPTS = 5
+IMAP_HEADER_FIELDS = 'SUBJECT FROM DATE MESSAGE-ID IN-REPLY-TO REFERENCES'
+
 class EmailNotificationService(QObject):
     # Signals for UI updates
     new_notification = Signal(dict)
@@ -29,7 +53,9 @@ class EmailNotificationService(QObject):
         self.email_service = email_service
         self.running = False
         self.thread = None
-        self.check_interval = 60  # 1 minute
+        self._stop_event = Event()
+        self._failed_uids = {}  # uid -> failed save attempts
+        self.check_interval = 600  # Seconds between looks at an unconfigured account
         
     def start(self):
         """Start the email monitoring service"""
@@ -43,6 +69,7 @@ class EmailNotificationService(QObject):
             return
             
         self.running = True
+        self._stop_event.clear()
         self.thread = Thread(target=self._monitor_emails, daemon=True)
         self.thread.start()
         print("✅ Email notification service started")
@@ -53,6 +80,7 @@ class EmailNotificationService(QObject):
             return
             
         self.running = False
+        self._stop_event.set()
         print("Stopping email notification service...")
         
         if self.thread and self.thread.is_alive():
@@ -65,99 +93,276 @@ class EmailNotificationService(QObject):
                 print("✅ Email notification service stopped gracefully")
             
     def _monitor_emails(self):
-        """Main monitoring loop"""
+        """
+        Main monitoring loop: one IMAP session kept open, waiting in IDLE for
+        new mail (or polling every check_interval if the server has no IDLE),
+        reconnecting with backoff when the connection drops
+        """
+        retry_delay = IMAP_RETRY_SECONDS
         while self.running:
+            mail = None
             try:
-                self._check_incoming_emails()
-                time.sleep(self.check_interval)
-            except Exception as e:
-                print(f"Email monitoring error: {e}")
-                time.sleep(60)
-                
-    def _check_incoming_emails(self):
-        """Check for new incoming emails with Gmail-specific handling"""
-        try:
-            config = self.email_service.get_email_config()
-            
-            # Extract credentials
-            if isinstance(config, tuple):
-                email_address = config[1] if len(config) > 1 else None
-                email_password = config[2] if len(config) > 2 else None
-            elif isinstance(config, dict):
-                email_address = config.get('email_address')
-                email_password = config.get('email_password')
-            else:
-                print("Email not configured")
-                return
+                settings = self._imap_settings()
+                if not settings:
+                    print("Email not configured - skipping email check")
+                    self._stop_event.wait(self.check_interval)
+                    continue
                 
-            if not email_address or not email_password:
-                print("Email not configured - skipping email check")
-                return
+                mail = self._connect_imap(settings)
+                uid_validity = self._uid_validity(mail)
+                use_idle = IMAP_USE_IDLE and 'IDLE' in self._capabilities(mail)
+                print(f"✅ Watching inbox of {settings['email_address']} "
+                      f"({'IDLE' if use_idle else 'polling every %d s' % settings['check_interval']})")
+                retry_delay = IMAP_RETRY_SECONDS
                 
-            print(f"🔗 Connecting to imap.gmail.com...")
-            
-            # Connect to Gmail IMAP
-            mail = imaplib.IMAP4_SSL('imap.gmail.com', 993)
-            mail.login(email_address, email_password)
-            mail.select('inbox')
+                while self.running:
+                    self._sync_new_emails(mail, settings, uid_validity)
+                    if use_idle:
+                        self._idle(mail, IMAP_IDLE_SECONDS)
+                    elif not self._stop_event.wait(settings['check_interval']):
+                        mail.noop()
+                        
+            except (imaplib.IMAP4.abort, OSError) as e:
+                print(f"IMAP connection lost: {e}")
+            except imaplib.IMAP4.error as e:
+                print(f"IMAP authentication error: {e}")
+                print("Please verify your App Password is correct")
+            except Exception as e:
+                print(f"Email monitoring error: {e}")
+            finally:
+                if mail is not None:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
             
-            # Search for UNSEEN emails (not UNREAD)
-            # Gmail uses \Unseen flag instead of \Seen
+            if self.running:
+                self._stop_event.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, IMAP_MAX_RETRY_SECONDS)
+                
+    def _imap_settings(self):
+        """Account, server and polling interval from email_config (None if not configured)"""
+        config = self.email_service.get_email_config()
+        if not isinstance(config, dict) or not config.get('email_address') or not config.get('email_password'):
+            return None
+        server, port = self.email_service.imap_address(config)
+        return {
+            'email_address': config['email_address'],
+            'email_password': config['email_password'],
+            'server': server,
+            'port': port,
+            'use_ssl': config.get('imap_use_ssl') is None or bool(config.get('imap_use_ssl')),
+            'check_interval': int(config.get('check_interval') or 10) * 60
+        }
+        
+    def _connect_imap(self, settings):
+        """Logged-in IMAP session with the inbox selected"""
+        print(f"🔗 Connecting to {settings['server']}...")
+        if settings['use_ssl']:
+            mail = imaplib.IMAP4_SSL(settings['server'], settings['port'], timeout=IMAP_TIMEOUT_SECONDS)
+        else:
+            mail = imaplib.IMAP4(settings['server'], settings['port'], timeout=IMAP_TIMEOUT_SECONDS)
+        mail.login(settings['email_address'], settings['email_password'])
+        mail.select(IMAP_MAILBOX)
+        return mail
+        
+    def _capabilities(self, mail):
+        """Server capabilities after login (they can differ from the greeting's)"""
+        status, data = mail.capability()
+        if status == 'OK' and data and data[0]:
+            return set(data[0].decode(errors='replace').upper().split())
+        return set(mail.capabilities)
+        
+    def _idle(self, mail, timeout):
+        """
+        Wait in IDLE until the server reports a change, timeout seconds pass
+        (servers drop IDLE after ~30 minutes, so it is renewed) or the service stops
+        """
+        # The socket timeout must not fire during IDLE; select() does the waiting
+        mail.sock.settimeout(None)
+        tag = mail._new_tag()
+        mail.send(tag + b' IDLE\r\n')
+        response = mail.readline()
+        if not response.startswith(b'+'):
+            raise imaplib.IMAP4.error(f"IDLE refused: {response!r}")
+        
+        deadline = time.monotonic() + timeout
+        while self.running and time.monotonic() < deadline:
+            pending = getattr(mail.sock, 'pending', lambda: 0)()
+            if not pending and not select.select([mail.sock], [], [], 1.0)[0]:
+                continue
+            # Any untagged response (EXISTS, EXPUNGE, a keepalive) ends the wait: a sync
+            # by UID is cheap, and lines buffered behind this one are read after DONE
+            if not mail.readline():
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            break
+        
+        mail.send(b'DONE\r\n')
+        # Read up to the IDLE command's own completion
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed ending IDLE")
+            if line.startswith(tag):
+                break
+        mail.sock.settimeout(IMAP_TIMEOUT_SECONDS)
+            
+    def _sync_new_emails(self, mail, settings, uid_validity):
+        """
+        Process the messages that arrived since the last sync, by UID. The first
+        sync of a mailbox (or after its UIDVALIDITY changed) looks at the last
+        day's unread mail only. The saved UID never passes a message that
+        failed to save, so the next sync retries it (up to IMAP_SAVE_ATTEMPTS
+        times); messages after it that were saved are recognised by Message-ID.
+        """
+        account = settings['email_address']
+        state = self._load_sync_state(account)
+        
+        if state is None or state[0] != uid_validity:
+            highest = self._highest_uid(mail)
             since_date = (datetime.now() - timedelta(hours=24)).strftime('%d-%b-%Y')
-            status, messages = mail.search(None, f'(UNSEEN SINCE {since_date})')
+            status, data = mail.uid('SEARCH', None, f'(UNSEEN SINCE {since_date})')
+            uids = [int(uid) for uid in data[0].split() if int(uid) <= highest] if status == 'OK' and data[0] else []
+            self._save_sync_state(account, uid_validity, highest)
+            last_uid = highest
+        else:
+            last_uid = state[1]
+            status, data = mail.uid('SEARCH', None, f'UID {last_uid + 1}:*')
+            # "n:*" always matches the newest message, even if it is older than n
+            uids = [int(uid) for uid in data[0].split() if int(uid) > last_uid] if status == 'OK' and data[0] else []
             
-            if status == 'OK' and messages[0]:
-                email_ids = messages[0].split()
-                print(f"📧 Found {len(email_ids)} new emails")
+        if not uids:
+            return
+        print(f"📧 Found {len(uids)} new emails")
+        
+        config = {'email_address': account, 'email_password': settings['email_password']}
+        first_failed = None
+        for start in range(0, len(uids), IMAP_FETCH_BATCH):
+            batch = uids[start:start + IMAP_FETCH_BATCH]
+            for uid, email_data in self._fetch_headers(mail, batch):
+                try:
+                    # Only mail that concerns the school is downloaded in full
+                    if not self._is_system_related_email(email_data) or self._already_saved(email_data):
+                        saved = True
+                    else:
+                        status, msg_data = mail.uid('FETCH', str(uid), '(UID BODY.PEEK[])')
+                        parts = self._fetch_parts(msg_data) if status == 'OK' else []
+                        saved = not parts or self._process_incoming_email(
+                            mail, uid, self._extract_email_details(email.message_from_bytes(parts[0][1])), config
+                        )
+                except (imaplib.IMAP4.abort, OSError):
+                    raise
+                except Exception as e:
+                    print(f"❌ Error processing email {uid}: {e}")
+                    saved = False
+                if saved:
+                    self._failed_uids.pop(uid, None)
+                    continue
+                attempts = self._failed_uids[uid] = self._failed_uids.get(uid, 0) + 1
+                if attempts >= IMAP_SAVE_ATTEMPTS:
+                    print(f"⚠️ Giving up on email {uid} after {attempts} attempts; it stays unread in the mailbox")
+                    self._failed_uids.pop(uid)
+                elif first_failed is None or uid < first_failed:
+                    first_failed = uid
+            last_uid = max(last_uid, max(batch) if first_failed is None else first_failed - 1)
+            self._save_sync_state(account, uid_validity, last_uid)
+        print("✅ Email check completed successfully")
+        
+    def _already_saved(self, email_data):
+        """True if a message with this Message-ID is already stored"""
+        if not email_data.get('message_id'):
+            return False
+        cursor = self.db_connection.cursor()
+        try:
+            cursor.execute("SELECT 1 FROM email_messages WHERE message_id = %s LIMIT 1",
+                           (email_data['message_id'],))
+            return cursor.fetchone() is not None
+        finally:
+            cursor.close()
+            
+    def _uid_validity(self, mail):
+        """UIDVALIDITY of the selected mailbox (UIDs are only comparable while it is unchanged)"""
+        value = mail.response('UIDVALIDITY')[1][0]
+        if value:
+            return int(value)
+        status, data = mail.status(IMAP_MAILBOX, '(UIDVALIDITY)')
+        match = re.search(rb'UIDVALIDITY (\d+)', data[0] or b'') if status == 'OK' else None
+        return int(match.group(1)) if match else 0
+        
+    def _highest_uid(self, mail):
+        """UID of the newest message in the selected mailbox (0 if empty)"""
+        status, data = mail.uid('SEARCH', None, 'UID *')
+        uids = [int(uid) for uid in data[0].split()] if status == 'OK' and data[0] else []
+        return max(uids, default=0)
+        
+    def _fetch_headers(self, mail, uids):
+        """[(uid, email_data without body)] for uids, from their headers alone"""
+        status, data = mail.uid('FETCH', ','.join(str(uid) for uid in uids),
+                                f'(UID RFC822.SIZE BODY.PEEK[HEADER.FIELDS ({IMAP_HEADER_FIELDS})])')
+        if status != 'OK':
+            return []
+        return [(uid, self._extract_email_details(email.message_from_bytes(headers)))
+                for uid, headers in sorted(self._fetch_parts(data))]
+        
+    @staticmethod
+    def _fetch_parts(data):
+        """[(uid, literal)] from an imaplib FETCH response"""
+        parts = []
+        for i, item in enumerate(data):
+            if not isinstance(item, tuple):
+                continue
+            match = re.search(rb'UID (\d+)', item[0])
+            # Some servers put UID after the literal
+            if not match and i + 1 < len(data) and isinstance(data[i + 1], bytes):
+                match = re.search(rb'UID (\d+)', data[i + 1])
+            if match:
+                parts.append((int(match.group(1)), item[1]))
+        return parts
+        
+    def _load_sync_state(self, account):
+        """(uid_validity, last_uid) from the last sync of the inbox, or None"""
+        with models_db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT uid_validity, last_uid FROM email_sync_state
+                    WHERE account = %s AND mailbox = %s
+                """, (account, IMAP_MAILBOX))
+                return cursor.fetchone()
+            finally:
+                cursor.close()
                 
-                for email_id in email_ids:
-                    try:
-                        # Fetch the email
-                        status, msg_data = mail.fetch(email_id, '(RFC822)')
-                        if status != 'OK':
-                            continue
-                            
-                        raw_email = msg_data[0][1]
-                        msg = email.message_from_bytes(raw_email)
-                        
-                        # Extract email details
-                        email_data = self._extract_email_details(msg)
-                        
-                        # Check if this is a reply to our system
-                        if self._is_system_related_email(email_data):
-                            # Process the email
-                            self._process_incoming_email(mail, email_id, email_data, {
-                                'email_address': email_address,
-                                'email_password': email_password
-                            })
-                            
-                    except Exception as e:
-                        print(f"❌ Error processing email {email_id}: {e}")
-                        continue
-                        
-            mail.logout()
-            print("✅ Email check completed successfully")
-            
-        except imaplib.IMAP4.error as e:
-            print(f"IMAP authentication error: {e}")
-            print("Please verify your App Password is correct")
-        except Exception as e:
-            print(f"IMAP error: {e}")
-            
-    def _process_incoming_email(self, mail, email_id, email_data, config):
-        """Process an incoming email with Gmail-specific handling"""
+    def _save_sync_state(self, account, uid_validity, last_uid):
+        with models_db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    INSERT INTO email_sync_state (account, mailbox, uid_validity, last_uid)
+                    VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE uid_validity = VALUES(uid_validity), last_uid = VALUES(last_uid)
+                """, (account, IMAP_MAILBOX, uid_validity, last_uid))
+                conn.commit()
+            finally:
+                cursor.close()
+            
+    def _process_incoming_email(self, mail, uid, email_data, config):
+        """Process an incoming email with Gmail-specific handling; returns True once it is saved"""
         try:
+            # Save to database and notify UI; a message that could not be
+            # saved stays unread in the mailbox
+            if not self._save_incoming_email(email_data, config):
+                return False
+            
             # Mark as read in Gmail (using \Seen flag)
             # With "Auto-Expunge off", this won't immediately delete the email
-            mail.store(email_id, '+FLAGS', '\\Seen')
-            
-            # Save to database and notify UI
-            self._save_incoming_email(email_data, config)
+            mail.uid('STORE', str(uid), '+FLAGS', '(\\Seen)')
             
             print(f"✅ Processed email: {email_data['subject']}")
             
         except Exception as e:
             print(f"Error processing email: {e}")
+        # Saved, even if flagging it as read failed
+        return True
             
     def _extract_email_details(self, msg):
         """Extract details from email message including attachments"""
@@ -316,30 +521,23 @@ class EmailNotificationService(QObject):
             return header
     
     def _save_attachment_to_db(self, message_id, attachment_data):
-        """Save attachment to database"""
-        try:
-            cursor = self.db_connection.cursor()
-            
-            cursor.execute("""
-                INSERT INTO email_attachments 
-                (message_id, content_id, filename, file_data, file_size, content_type)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                message_id,
-                attachment_data.get('content_id'),
-                attachment_data['filename'],
-                attachment_data['file_data'],  # Store binary data
-                attachment_data['size'],
-                attachment_data['content_type']
-            ))
-            
-            self.db_connection.commit()
-            return cursor.lastrowid
-            
-        except Exception as e:
-            print(f"Error saving attachment to database: {e}")
-            self.db_connection.rollback()
-            return None
+        """
+        Store an attachment (attachment store or file_data, see
+        services/attachment_store.py). Errors propagate so
+        _save_incoming_email rolls the message back.
+        """
+        cursor = self.db_connection.cursor()
+        
+        # Committed with the message by _save_incoming_email
+        return save_attachment(
+            cursor,
+            message_id,
+            attachment_data.get('content_id'),
+            attachment_data['filename'],
+            attachment_data['file_data'] or b'',
+            attachment_data['size'],
+            attachment_data['content_type']
+        )
     
     def _is_system_related_email(self, email_data):
         """Check if email is related to our system"""
@@ -357,7 +555,7 @@ class EmailNotificationService(QObject):
         return any(keyword in subject_lower for keyword in system_keywords)
     
     def _save_incoming_email(self, email_data, config):
-        """Save incoming email to database with attachments"""
+        """Save incoming email to database with attachments; returns True if it was saved"""
         try:
             cursor = self.db_connection.cursor(dictionary=True)
             
@@ -427,10 +625,12 @@ class EmailNotificationService(QObject):
             
             self.new_notification.emit(notification_data)
             self._update_notification_count()
+            return True
             
         except Exception as e:
             print(f"Error saving email: {e}")
             self.db_connection.rollback()
+            return False
     
     def _find_existing_conversation(self, email_data):
         """Find existing conversation for this email"""
@@ -567,22 +767,11 @@ class EmailNotificationService(QObject):
             return False
     
     def get_attachment(self, attachment_id):
-        """Retrieve attachment from database"""
+        """Filename and on-disk path of an attachment (read it from the path)"""
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT filename, file_data, content_type 
-                FROM email_attachments 
-                WHERE id = %s
-            """, (attachment_id,))
-            
-            result = cursor.fetchone()
-            if result:
-                return {
-                    'filename': result['filename'],
-                    'file_data': result['file_data'],
-                    'content_type': result['content_type']
-                }
+            resolved = resolve_attachment(self.db_connection, attachment_id)
+            if resolved:
+                return {'filename': resolved[0], 'path': resolved[1]}
             return None
             
         except Exception as e:
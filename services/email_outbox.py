@@ -0,0 +1,362 @@
+# services/email_outbox.py
+"""
+Persistent email outbox with a background SMTP dispatcher.
+
+EmailService.queue_email() stores one email_outbox row per recipient and
+returns at once. EMAIL_WORKERS worker threads claim queued rows and send
+them, each over a single authenticated SMTP session kept open between
+messages (reconnecting only when the server drops it). Sending is throttled
+to EMAIL_RATE_PER_MINUTE messages across all workers. A failed message is
+retried with exponential backoff up to EMAIL_MAX_ATTEMPTS times, unless the
+server refused it permanently. Every row records its status, attempts and
+last error, and queued mail survives a restart.
+
+Attachments are queued as local file paths, so a row with attachments
+records the host that queued it and only that host's workers claim it.
+Any host may send the rest.
+"""
+import json
+import os
+import smtplib
+import socket
+import threading
+import time
+import uuid
+import logging
+
+from PySide6.QtCore import QObject, Signal
+
+from models.models import db_connection
+from services.email_service import EmailService
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMAIL_WORKERS = int(os.getenv('EMAIL_WORKERS', '2'))
+EMAIL_RATE_PER_MINUTE = int(os.getenv('EMAIL_RATE_PER_MINUTE', '60'))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', '5'))
+EMAIL_RETRY_BASE_SECONDS = int(os.getenv('EMAIL_RETRY_BASE_SECONDS', '30'))
+# Seconds between outbox checks when nothing wakes the dispatcher
+EMAIL_OUTBOX_POLL = int(os.getenv('EMAIL_OUTBOX_POLL', '15'))
+# An idle SMTP session is closed after this many seconds
+EMAIL_SMTP_IDLE_SECONDS = int(os.getenv('EMAIL_SMTP_IDLE_SECONDS', '60'))
+# Rows a worker claims at a time (fewer when the rate limit is low)
+EMAIL_CLAIM_SIZE = 20
+# A row left 'sending' this long (e.g. the app was killed) is queued again
+EMAIL_STALE_MINUTES = 15
+# Host recorded on rows whose attachment paths only exist on this machine
+EMAIL_OUTBOX_HOST = socket.gethostname()[:255]
+
+
+class PermanentSendError(Exception):
+    """The message can never be sent as it is (no point retrying)"""
+
+
+class _RateLimiter:
+    """Spaces sends evenly: at most per_minute across all threads"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, stopping):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            stopping.wait(slot - now)
+
+
+class _SmtpSession:
+    """One worker's SMTP connection, reused across messages"""
+
+    def __init__(self, email_service):
+        self.email_service = email_service
+        self.server = None
+        self.config_key = None
+        self.last_used = 0.0
+
+    def send(self, config, from_addr, to_addrs, message):
+        key = (config['email_address'], config['email_password'], self.email_service.smtp_address(config))
+        if self.server is not None and (key != self.config_key or
+                                        time.monotonic() - self.last_used > EMAIL_SMTP_IDLE_SECONDS):
+            self.close()
+        for attempt in (1, 2):
+            if self.server is None:
+                self.server = self.email_service.open_smtp(config)
+                self.config_key = key
+            try:
+                self.server.sendmail(from_addr, to_addrs, message)
+                self.last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                # The server closed a reused session: reconnect once
+                self.server = None
+                if attempt == 2:
+                    raise
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
+
+
+def _is_permanent(error):
+    if isinstance(error, (PermanentSendError, smtplib.SMTPRecipientsRefused)):
+        return True
+    code = getattr(error, 'smtp_code', None)
+    # 5xx is a permanent refusal, except authentication (fixable in the settings)
+    return (isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError))
+            and code is not None and 500 <= code < 600)
+
+
+class EmailOutbox(QObject):
+    """Queues outgoing mail in email_outbox and sends it on worker threads"""
+    # outbox id, recipient, 'sent' / 'retry' / 'failed', error text
+    message_status = Signal(int, str, str, str)
+    # batch id, sent count, failed count: every message of the batch is settled
+    batch_finished = Signal(str, int, int)
+
+    def __init__(self, workers=EMAIL_WORKERS, rate_per_minute=EMAIL_RATE_PER_MINUTE, parent=None):
+        super().__init__(parent)
+        self.worker_count = max(1, workers)
+        self.rate_limiter = _RateLimiter(rate_per_minute)
+        # Claims no more than the workers can send in half the stale window
+        per_worker = rate_per_minute * EMAIL_STALE_MINUTES // (2 * self.worker_count)
+        self.claim_size = max(1, min(EMAIL_CLAIM_SIZE, per_worker)) if rate_per_minute > 0 else EMAIL_CLAIM_SIZE
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"email-outbox-{i}", daemon=True)
+            for i in range(self.worker_count)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def shutdown(self, timeout=5):
+        """Stop the workers (queued mail stays in the outbox for next time)"""
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        self._wake.set()
+
+    def enqueue(self, to_emails, subject, body, attachment_paths=None, is_html=True,
+                reply_to=None, in_reply_to=None):
+        """Store one outbox row per recipient (same subject and body); returns the batch id"""
+        messages = [(email, subject, body) for email in dict.fromkeys(to_emails) if email]
+        return self.enqueue_messages(messages, attachment_paths, is_html, reply_to, in_reply_to)
+
+    def enqueue_messages(self, messages, attachment_paths=None, is_html=True, reply_to=None, in_reply_to=None):
+        """Store (email, subject, body) messages as one batch; returns the batch id"""
+        batch_id = uuid.uuid4().hex
+        attachment_paths = [os.path.abspath(path) for path in attachment_paths or []]
+        attachments = json.dumps(attachment_paths)
+        origin_host = EMAIL_OUTBOX_HOST if attachment_paths else None
+        rows = [(batch_id, email, subject, body, is_html, attachments, reply_to, in_reply_to, origin_host)
+                for email, subject, body in messages]
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.executemany("""
+                    INSERT INTO email_outbox
+                        (batch_id, to_email, subject, body, is_html, attachments, reply_to, in_reply_to,
+                         origin_host)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, rows)
+                conn.commit()
+            finally:
+                cursor.close()
+        logger.info(f"Queued {len(rows)} email(s) in batch {batch_id}")
+        self.start()
+        self.wake()
+        return batch_id
+
+    def batch_counts(self, batch_id):
+        """{status: count} for a batch"""
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT status, COUNT(*) FROM email_outbox WHERE batch_id = %s GROUP BY status",
+                               (batch_id,))
+                return dict(cursor.fetchall())
+            finally:
+                cursor.close()
+
+    # --- worker side ---
+    def _run(self):
+        session = _SmtpSession(EmailService())
+        try:
+            while not self._stopping.is_set():
+                try:
+                    claimed = self._claim()
+                except Exception as e:
+                    logger.warning(f"Email outbox unavailable: {e}")
+                    claimed = None
+                if not claimed:
+                    self._wake.wait(EMAIL_OUTBOX_POLL)
+                    self._wake.clear()
+                    if session.server is not None and time.monotonic() - session.last_used > EMAIL_SMTP_IDLE_SECONDS:
+                        session.close()
+                    continue
+                config, rows = claimed
+                for index, row in enumerate(rows):
+                    if self._stopping.is_set():
+                        self._release(rows[index:])
+                        break
+                    self.rate_limiter.wait(self._stopping)
+                    self._send_row(session, config, row)
+        finally:
+            session.close()
+
+    def _claim(self):
+        """Mark a few due rows this host can send as ours; returns (config, rows) or None"""
+        token = uuid.uuid4().hex
+        with db_connection() as conn:
+            config = EmailService(conn).get_email_config()
+            if not config or not config.get('email_address') or not config.get('email_password'):
+                return None
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(f"""
+                    UPDATE email_outbox SET status = 'queued', claim_token = NULL
+                    WHERE status = 'sending' AND claimed_at < NOW() - INTERVAL {EMAIL_STALE_MINUTES} MINUTE
+                """)
+                cursor.execute("""
+                    UPDATE email_outbox
+                    SET status = 'sending', claim_token = %s, claimed_at = NOW(), attempts = attempts + 1
+                    WHERE status = 'queued' AND next_attempt_at <= NOW()
+                      AND (origin_host IS NULL OR origin_host = %s)
+                    ORDER BY id
+                    LIMIT %s
+                """, (token, EMAIL_OUTBOX_HOST, self.claim_size))
+                conn.commit()
+                if not cursor.rowcount:
+                    return None
+                cursor.execute("""
+                    SELECT id, batch_id, to_email, subject, body, is_html, attachments,
+                           reply_to, in_reply_to, attempts, claim_token
+                    FROM email_outbox
+                    WHERE claim_token = %s AND status = 'sending'
+                    ORDER BY id
+                """, (token,))
+                return config, cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def _send_row(self, session, config, row):
+        try:
+            attachment_paths = json.loads(row['attachments'] or '[]')
+            missing = [path for path in attachment_paths if not os.path.exists(path)]
+            if missing:
+                raise PermanentSendError(f"Attachment not found: {', '.join(missing)}")
+            message = EmailService().build_message(
+                config, [row['to_email']], row['subject'], row['body'], attachment_paths,
+                bool(row['is_html']), row['reply_to'], row['in_reply_to']
+            )
+            session.send(config, config['email_address'], [row['to_email']], message.as_string())
+        except Exception as e:
+            if isinstance(e, smtplib.SMTPAuthenticationError):
+                # Every message would fail the same way: drop the session and back off
+                session.close()
+            retry = not _is_permanent(e) and row['attempts'] < EMAIL_MAX_ATTEMPTS
+            self._finish(row, 'queued' if retry else 'failed', str(e), retry_after=(
+                EMAIL_RETRY_BASE_SECONDS * 2 ** (row['attempts'] - 1) if retry else None))
+            return
+        self._finish(row, 'sent')
+
+    def _finish(self, row, status, error=None, retry_after=None):
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    if status == 'sent':
+                        cursor.execute("""
+                            UPDATE email_outbox SET status = 'sent', sent_at = NOW(), last_error = NULL,
+                                   claim_token = NULL
+                            WHERE id = %s
+                        """, (row['id'],))
+                    else:
+                        cursor.execute("""
+                            UPDATE email_outbox
+                            SET status = %s, last_error = %s, claim_token = NULL,
+                                next_attempt_at = NOW() + INTERVAL %s SECOND
+                            WHERE id = %s
+                        """, (status, error[:1000] if error else None, retry_after or 0, row['id']))
+                    # The rest of the claim is still being worked on, so it must not go stale
+                    cursor.execute("""
+                        UPDATE email_outbox SET claimed_at = NOW()
+                        WHERE claim_token = %s AND status = 'sending'
+                    """, (row['claim_token'],))
+                    conn.commit()
+                    cursor.execute("SELECT status, COUNT(*) FROM email_outbox WHERE batch_id = %s GROUP BY status",
+                                   (row['batch_id'],))
+                    counts = dict(cursor.fetchall())
+                    batch_done = False
+                    if not counts.get('queued') and not counts.get('sending'):
+                        # Workers finishing a batch's last rows together both get here;
+                        # only the one whose insert succeeds reports it
+                        cursor.execute("INSERT IGNORE INTO email_outbox_batches (batch_id) VALUES (%s)",
+                                       (row['batch_id'],))
+                        batch_done = cursor.rowcount == 1
+                        conn.commit()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            # The row stays 'sending' and is picked up again once stale
+            logger.error(f"Could not record outcome of outbox message {row['id']}: {e}")
+            return
+
+        if status == 'sent':
+            logger.info(f"Email {row['id']} sent to {row['to_email']}")
+        else:
+            logger.warning(f"Email {row['id']} to {row['to_email']} "
+                           f"{'will be retried' if status == 'queued' else 'failed'}: {error}")
+        self.message_status.emit(row['id'], row['to_email'], 'retry' if status == 'queued' else status,
+                                 error or "")
+        if batch_done:
+            self.batch_finished.emit(row['batch_id'], counts.get('sent', 0), counts.get('failed', 0))
+
+    def _release(self, rows):
+        """Give claimed rows back (shutting down); their attempt is not counted"""
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.executemany("""
+                        UPDATE email_outbox SET status = 'queued', claim_token = NULL, attempts = attempts - 1
+                        WHERE id = %s AND status = 'sending'
+                    """, [(row['id'],) for row in rows])
+                    conn.commit()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            logger.warning(f"Could not release {len(rows)} claimed email(s): {e}")
+
+
+_email_outbox = None
+
+
+def get_email_outbox():
+    """Shared EmailOutbox (create it from the GUI thread)"""
+    global _email_outbox
+    if _email_outbox is None:
+        _email_outbox = EmailOutbox()
+    return _email_outbox
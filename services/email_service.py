@@ -3,7 +3,8 @@ import smtplib
 import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+from services.mail_merge import merge_messages, attachment_part
+from services.recipient_resolver import RecipientResolver, recipient_kind
 from datetime import datetime
 import logging
 from PySide6.QtWidgets import QMessageBox, QProgressDialog
@@ -21,6 +22,11 @@ class EmailService:
             'outlook': {'server': 'smtp.office365.com', 'port': 587},
             'yahoo': {'server': 'smtp.mail.yahoo.com', 'port': 587}
         }
+        self.imap_config = {
+            'gmail': {'server': 'imap.gmail.com', 'port': 993},
+            'outlook': {'server': 'imap-mail.outlook.com', 'port': 993},
+            'yahoo': {'server': 'imap.mail.yahoo.com', 'port': 993}
+        }
     
     def get_email_config(self):
         """Get email configuration from database"""
@@ -28,7 +34,8 @@ class EmailService:
             cursor = self.db_connection.cursor(dictionary=True)  # Ensure dictionary format
             cursor.execute("""
                 SELECT email_provider, email_address, email_password, 
-                       default_sender_name, smtp_server, smtp_port
+                       default_sender_name, smtp_server, smtp_port,
+                       imap_server, imap_port, imap_use_ssl, check_interval
                 FROM email_config 
                 WHERE is_active = TRUE 
                 ORDER BY created_at DESC 
@@ -48,7 +55,11 @@ class EmailService:
                         'email_password': config[2],
                         'default_sender_name': config[3],
                         'smtp_server': config[4],
-                        'smtp_port': config[5]
+                        'smtp_port': config[5],
+                        'imap_server': config[6],
+                        'imap_port': config[7],
+                        'imap_use_ssl': config[8],
+                        'check_interval': config[9]
                     }
                     return config_dict
                 return config
@@ -59,10 +70,63 @@ class EmailService:
             print(f"Error getting email config: {e}")
             return None
     
-    # services/email_service.py - Updated send_email method
+    def smtp_address(self, config):
+        """(server, port) from the config, or the provider's defaults"""
+        if config.get('smtp_server'):
+            return config['smtp_server'], config.get('smtp_port') or 587
+        provider = (config.get('email_provider') or 'gmail').lower()
+        smtp_config = self.smtp_config.get(provider, self.smtp_config['gmail'])
+        return smtp_config['server'], smtp_config['port']
+
+    def imap_address(self, config):
+        """(server, port) for receiving mail, from the config or the provider's defaults"""
+        provider = (config.get('email_provider') or 'gmail').lower()
+        imap_config = self.imap_config.get(provider, self.imap_config['gmail'])
+        return (config.get('imap_server') or imap_config['server'],
+                config.get('imap_port') or imap_config['port'])
+
+    def open_smtp(self, config, timeout=30):
+        """Connected, authenticated SMTP session (the caller quits it)"""
+        smtp_server, smtp_port = self.smtp_address(config)
+        if smtp_port == 465:
+            server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=timeout)
+        else:
+            server = smtplib.SMTP(smtp_server, smtp_port, timeout=timeout)
+            server.starttls()
+        server.login(config['email_address'], config['email_password'])
+        return server
+
+    def build_message(self, config, to_emails, subject, body, attachment_paths=None, is_html=True,
+                      reply_to=None, in_reply_to=None):
+        """MIME message for to_emails (list)"""
+        msg = MIMEMultipart()
+        msg['From'] = f"{config['default_sender_name']} <{config['email_address']}>"
+        msg['To'] = ", ".join(to_emails)
+        msg['Subject'] = subject
+        msg['Date'] = datetime.now().strftime('%a, %d %b %Y %H:%M:%S %z')
+
+        # Add Reply-To header if specified
+        if reply_to:
+            msg['Reply-To'] = reply_to
+
+        # Add In-Reply-To header for threading
+        if in_reply_to:
+            msg['In-Reply-To'] = in_reply_to
+            msg['References'] = in_reply_to
+
+        # Add body
+        msg.attach(MIMEText(body, 'html' if is_html else 'plain'))
+
+        # Add attachments (encoded once, shared by every message that attaches them)
+        for attachment_path in attachment_paths or []:
+            if os.path.exists(attachment_path):
+                msg.attach(attachment_part(attachment_path))
+        return msg
+
     def send_email(self, to_emails, subject, body, attachment_paths=None, is_html=True, reply_to=None, in_reply_to=None):
         """
-        Send email to multiple recipients
+        Send email to multiple recipients right away (blocking; opens its own
+        SMTP session). Bulk mail should go through queue_email instead.
         
         Parameters:
         - to_emails: List of email addresses or single email
@@ -82,51 +146,11 @@ class EmailService:
             if isinstance(to_emails, str):
                 to_emails = [to_emails]
             
-            # Determine SMTP server
-            if config['smtp_server']:
-                smtp_server = config['smtp_server']
-                smtp_port = config['smtp_port']
-            else:
-                provider = config['email_provider'].lower()
-                smtp_config = self.smtp_config.get(provider, self.smtp_config['gmail'])
-                smtp_server = smtp_config['server']
-                smtp_port = smtp_config['port']
-            
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = f"{config['default_sender_name']} <{config['email_address']}>"
-            msg['To'] = ", ".join(to_emails)
-            msg['Subject'] = subject
-            msg['Date'] = datetime.now().strftime('%a, %d %b %Y %H:%M:%S %z')
-            
-            # Add Reply-To header if specified
-            if reply_to:
-                msg['Reply-To'] = reply_to
-            
-            # Add In-Reply-To header for threading
-            if in_reply_to:
-                msg['In-Reply-To'] = in_reply_to
-                msg['References'] = in_reply_to
-            
-            # Add body
-            if is_html:
-                msg.attach(MIMEText(body, 'html'))
-            else:
-                msg.attach(MIMEText(body, 'plain'))
-            
-            # Add attachments
-            if attachment_paths:
-                for attachment_path in attachment_paths:
-                    if os.path.exists(attachment_path):
-                        with open(attachment_path, "rb") as f:
-                            part = MIMEApplication(f.read(), Name=os.path.basename(attachment_path))
-                        part['Content-Disposition'] = f'attachment; filename="{os.path.basename(attachment_path)}"'
-                        msg.attach(part)
+            msg = self.build_message(config, to_emails, subject, body, attachment_paths, is_html,
+                                     reply_to, in_reply_to)
             
             # Send email
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()
-                server.login(config['email_address'], config['email_password'])
+            with self.open_smtp(config) as server:
                 server.sendmail(config['email_address'], to_emails, msg.as_string())
             
             logger.info(f"Email sent successfully to {len(to_emails)} recipients")
@@ -136,14 +160,53 @@ class EmailService:
             error_msg = f"Failed to send email: {str(e)}"
             logger.error(error_msg)
             return False, error_msg
+
+    def queue_email(self, to_emails, subject, body, attachment_paths=None, is_html=True,
+                    reply_to=None, in_reply_to=None):
+        """
+        Queue one message per recipient in the email outbox; the background
+        dispatcher (services/email_outbox.py) sends them.
+        Returns (success, batch_id or error message).
+        """
+        from services.email_outbox import get_email_outbox
+        if isinstance(to_emails, str):
+            to_emails = [to_emails]
+        try:
+            batch_id = get_email_outbox().enqueue(to_emails, subject, body, attachment_paths, is_html,
+                                                  reply_to, in_reply_to)
+            return True, batch_id
+        except Exception as e:
+            error_msg = f"Failed to queue email: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+    
+    def queue_merge(self, recipients, subject, body, attachment_paths=None, is_html=True):
+        """
+        Queue a personalized copy of subject/body for each recipient.
+        recipients: dicts with 'email' plus the {{field}} values for that
+        address (see services/mail_merge.py).
+        Returns (success, batch_id or error message).
+        """
+        from services.email_outbox import get_email_outbox
+        try:
+            messages = merge_messages(recipients, subject, body, is_html)
+            if not messages:
+                return False, "No email addresses found"
+            return True, get_email_outbox().enqueue_messages(messages, attachment_paths, is_html)
+        except Exception as e:
+            error_msg = f"Failed to queue email: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
     
     def get_recipient_emails(self, recipient_type, recipient_ids):
         """
-        Get email addresses for students, teachers, or parents
+        Get email addresses for students, teachers, parents, classes or grades
         
         Parameters:
-        - recipient_type: 'student', 'teacher', or 'parent'
+        - recipient_type: 'student', 'teacher', 'parent', 'class' or 'grade' (plural works too)
         - recipient_ids: List of IDs or single ID
+        
+        Students bring their parents' addresses (via student_parent) as well.
         """
         try:
             if not self.db_connection:
@@ -153,53 +216,8 @@ class EmailService:
             if isinstance(recipient_ids, (int, str)):
                 recipient_ids = [recipient_ids]
             
-            cursor = self.db_connection.cursor()
-            
-            if recipient_type == 'student':
-                cursor.execute("""
-                    SELECT id, full_name, email, parent_email 
-                    FROM students 
-                    WHERE id IN (%s) AND is_active = TRUE
-                """ % ','.join(['%s'] * len(recipient_ids)), recipient_ids)
-                
-            elif recipient_type == 'teacher':
-                cursor.execute("""
-                    SELECT id, first_name, surname, email 
-                    FROM teachers 
-                    WHERE id IN (%s) AND is_active = TRUE
-                """ % ','.join(['%s'] * len(recipient_ids)), recipient_ids)
-                
-            elif recipient_type == 'parent':
-                cursor.execute("""
-                    SELECT p.id, p.full_name, p.email, p.phone,
-                           s.full_name as student_name, s.email as student_email
-                    FROM parents p
-                    JOIN students s ON p.student_id = s.id
-                    WHERE p.id IN (%s) AND p.is_active = TRUE
-                """ % ','.join(['%s'] * len(recipient_ids)), recipient_ids)
-            
-            results = cursor.fetchall()
-            emails = []
-            
-            for result in results:
-                if recipient_type == 'student':
-                    # Student email and parent email
-                    if result[2]:  # student email
-                        emails.append(result[2])
-                    if result[3]:  # parent email
-                        emails.append(result[3])
-                        
-                elif recipient_type == 'teacher':
-                    if result[3]:  # teacher email
-                        emails.append(result[3])
-                        
-                elif recipient_type == 'parent':
-                    if result[2]:  # parent email
-                        emails.append(result[2])
-            
-            # Remove duplicates and empty emails
-            emails = list(set(filter(None, emails)))
-            return emails
+            resolver = RecipientResolver(self.db_connection)
+            return resolver.resolve_emails(recipient_kind(recipient_type), recipient_ids)
             
         except Exception as e:
             logger.error(f"Error getting recipient emails: {e}")
@@ -208,7 +226,7 @@ class EmailService:
     def send_bulk_email(self, parent_widget, recipient_type, recipient_ids, subject, body, 
                        attachment_paths=None, is_html=True):
         """
-        Send bulk email with progress dialog
+        Queue a bulk email: one message per recipient, sent in the background
         """
         # Get emails
         emails = self.get_recipient_emails(recipient_type, recipient_ids)
@@ -217,35 +235,23 @@ class EmailService:
             QMessageBox.warning(parent_widget, "No Emails", "No email addresses found for selected recipients.")
             return False, "No email addresses found"
         
-        # Show progress dialog
-        progress = QProgressDialog(f"Sending email to {len(emails)} recipients...", 
-                                 "Cancel", 0, len(emails), parent_widget)
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setWindowTitle("Sending Emails")
-        progress.show()
-        
-        try:
-            # Send email
-            success, message = self.send_email(emails, subject, body, attachment_paths, is_html)
-            
-            progress.close()
-            
-            if success:
-                QMessageBox.information(parent_widget, "Success", 
-                                      f"Email sent successfully to {len(emails)} recipients!")
-            else:
-                QMessageBox.warning(parent_widget, "Failed", message)
-            
-            return success, message
-            
-        except Exception as e:
-            progress.close()
-            error_msg = f"Failed to send bulk email: {str(e)}"
-            QMessageBox.critical(parent_widget, "Error", error_msg)
-            return False, error_msg
+        # One message per recipient, sent in the background by the outbox
+        success, result = self.queue_email(emails, subject, body, attachment_paths, is_html)
+        if success:
+            QMessageBox.information(parent_widget, "Queued",
+                                    f"Email queued for {len(emails)} recipients and is being sent in the background.")
+            return True, result
+        QMessageBox.warning(parent_widget, "Failed", result)
+        return False, result
 
 # Email templates
 class EmailTemplates:
+    """
+    HTML email bodies. Passing "{{field}}" placeholders instead of values
+    (e.g. simple_notification("{{name}}", title, message)) gives a mail-merge
+    template for EmailService.queue_merge.
+    """
+
     @staticmethod
     def assignment_notification(student_name, assignment_details):
         return f"""
@@ -0,0 +1,248 @@
+# services/job_runner.py
+"""
+Background job runner for exports and reports.
+
+Jobs run on a QThreadPool so the GUI thread stays responsive. A job function
+receives a JobContext it uses to report progress and to notice cancellation;
+results, failures and progress come back to the GUI thread through the
+runner's signals (the runner must be created on the GUI thread, which
+get_job_runner() takes care of when first called from the UI).
+"""
+import itertools
+import os
+import threading
+import time
+import traceback
+import logging
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from models.models import db_connection
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Concurrent background jobs, rows between progress updates, rows per fetchmany
+JOB_THREADS = int(os.getenv('JOB_THREADS', '2'))
+PROGRESS_EVERY = 500
+FETCH_SIZE = 1000
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when the user cancelled it"""
+
+
+class JobContext:
+    """Handed to a job function: progress reporting and cancellation checks"""
+
+    def __init__(self, runner, job_id):
+        self._runner = runner
+        self.job_id = job_id
+        self._cancel_event = threading.Event()
+        self.done = 0
+        self.total = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def progress(self, done, total=None):
+        """Report progress; total=None keeps the previous total (or unknown)"""
+        self.done = done
+        if total is not None:
+            self.total = total
+        self._runner.job_progress.emit(self.job_id, done, self.total if self.total is not None else -1)
+
+    def track(self, rows, total=None):
+        """Iterate rows, reporting progress and stopping if cancelled"""
+        if total is None and hasattr(rows, '__len__'):
+            total = len(rows)
+        self.progress(0, total)
+        done = 0
+        for row in rows:
+            self.check_cancelled()
+            yield row
+            done += 1
+            if done % PROGRESS_EVERY == 0:
+                self.progress(done)
+        self.progress(done)
+
+
+class _JobRunnable(QRunnable):
+    def __init__(self, runner, context, func):
+        super().__init__()
+        self.runner = runner
+        self.context = context
+        self.func = func
+        self.setAutoDelete(True)
+
+    def run(self):
+        job_id = self.context.job_id
+        if self.context.cancelled:
+            self.runner.job_cancelled.emit(job_id)
+            return
+        self.runner.job_started.emit(job_id)
+        try:
+            result = self.func(self.context)
+        except JobCancelled:
+            self.runner.job_cancelled.emit(job_id)
+        except Exception as e:
+            logger.error(f"Background job {job_id} failed: {e}\n{traceback.format_exc()}")
+            self.runner.job_failed.emit(job_id, str(e))
+        else:
+            self.runner.job_finished.emit(job_id, result)
+
+
+class JobRunner(QObject):
+    """Runs job functions on a thread pool and tracks their state"""
+    job_added = Signal(int, str)
+    job_started = Signal(int)
+    job_progress = Signal(int, int, int)      # job_id, done, total (-1 if unknown)
+    job_finished = Signal(int, object)        # job_id, result
+    job_failed = Signal(int, str)             # job_id, error message
+    job_cancelled = Signal(int)
+    job_removed = Signal(int)
+
+    def __init__(self, max_threads=JOB_THREADS, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, max_threads))
+        self._ids = itertools.count(1)
+        self._jobs = {}   # job_id -> dict(title, context, on_done, on_error, on_cancel, state, started)
+
+        # Slots run on the runner's (GUI) thread
+        self.job_started.connect(self._on_started)
+        self.job_finished.connect(self._on_finished)
+        self.job_failed.connect(self._on_failed)
+        self.job_cancelled.connect(self._on_cancelled)
+
+    def submit(self, title, func, on_done=None, on_error=None, on_cancel=None):
+        """
+        Queue func(context) -> result. Callbacks run on the GUI thread:
+        on_done(result), on_error(message), on_cancel().
+        Returns the job id.
+        """
+        job_id = next(self._ids)
+        context = JobContext(self, job_id)
+        self._jobs[job_id] = {
+            'title': title,
+            'context': context,
+            'on_done': on_done,
+            'on_error': on_error,
+            'on_cancel': on_cancel,
+            'state': 'queued',
+            'started': None,
+        }
+        self.job_added.emit(job_id, title)
+        self.pool.start(_JobRunnable(self, context, func))
+        return job_id
+
+    def submit_query(self, title, query, params, writer, count_query=None, count_params=None,
+                     convert=None, **callbacks):
+        """
+        Run query on a pooled connection in the background and pass the rows,
+        streamed through an unbuffered cursor, to writer(rows) -> result.
+        count_query (optional) gives the total for the progress bar.
+        """
+        def run(context):
+            with db_connection() as conn:
+                total = None
+                if count_query:
+                    count_cursor = conn.cursor()
+                    try:
+                        count_cursor.execute(count_query, count_params if count_params is not None else params or ())
+                        row = count_cursor.fetchone()
+                        total = int(row[0]) if row and row[0] is not None else None
+                    finally:
+                        count_cursor.close()
+                context.check_cancelled()
+
+                cursor = conn.cursor(buffered=False)
+                try:
+                    cursor.execute(query, params or ())
+                    rows = context.track(_stream_rows(cursor, convert), total)
+                    return writer(rows)
+                finally:
+                    try:
+                        cursor.close()
+                    except Exception:
+                        # Unread rows after a cancel: the pool discards the connection
+                        pass
+
+        return self.submit(title, run, **callbacks)
+
+    def cancel(self, job_id):
+        """Request cancellation; queued jobs are dropped when the pool reaches them"""
+        job = self._jobs.get(job_id)
+        if job:
+            job['context'].cancel()
+
+    def cancel_all(self):
+        for job_id in list(self._jobs):
+            self.cancel(job_id)
+
+    def active_jobs(self):
+        return {job_id: job['title'] for job_id, job in self._jobs.items()}
+
+    def wait_for_done(self, timeout_ms=3000):
+        """Wait for running jobs (e.g. at shutdown)"""
+        return self.pool.waitForDone(timeout_ms)
+
+    def _on_started(self, job_id):
+        job = self._jobs.get(job_id)
+        if job:
+            job['state'] = 'running'
+            job['started'] = time.monotonic()
+
+    def _finish(self, job_id):
+        job = self._jobs.pop(job_id, None)
+        if job:
+            self.job_removed.emit(job_id)
+        return job
+
+    def _on_finished(self, job_id, result):
+        job = self._finish(job_id)
+        if not job:
+            return
+        if job['started'] is not None:
+            logger.info(f"Job '{job['title']}' finished in {time.monotonic() - job['started']:.1f}s")
+        if job['on_done']:
+            job['on_done'](result)
+
+    def _on_failed(self, job_id, message):
+        job = self._finish(job_id)
+        if job and job['on_error']:
+            job['on_error'](message)
+
+    def _on_cancelled(self, job_id):
+        job = self._finish(job_id)
+        if job and job['on_cancel']:
+            job['on_cancel']()
+
+
+def _stream_rows(cursor, convert=None, batch_size=FETCH_SIZE):
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        for row in batch:
+            yield convert(row) if convert else row
+
+
+_job_runner = None
+
+
+def get_job_runner():
+    """Shared JobRunner (create it from the GUI thread)"""
+    global _job_runner
+    if _job_runner is None:
+        _job_runner = JobRunner()
+    return _job_runner
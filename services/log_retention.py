@@ -0,0 +1,125 @@
+# services/log_retention.py
+"""
+Retention for audit_log and login_logs.
+
+purge_logs_before() removes every month that ended before a cutoff. Each
+month is first exported to a gzip-compressed CSV in LOG_ARCHIVE_DIR and then
+its partition is dropped (models/log_partitions.py), which takes
+milliseconds and leaves nothing in the undo log. A table that could not be
+partitioned is archived the same way and emptied in short DELETE batches,
+each committed on its own.
+
+Purges run from the log browsers under LOG_MAINTENANCE_LOCK, and first
+prepare the coming months' partitions. An existing installation's log
+tables are converted once by an administrator:
+
+    python -m services.log_retention
+"""
+import csv
+import gzip
+import os
+import logging
+from datetime import datetime
+
+from models.models import db_connection
+from models.log_partitions import (
+    PARTITIONED_LOG_TABLES, drop_log_partitions, ensure_log_partitions, log_maintenance_lock,
+    log_partitions, month_start
+)
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LOG_ARCHIVE_DIR = os.getenv('LOG_ARCHIVE_DIR', os.path.join('logs', 'archive'))
+LOG_PURGE_BATCH = int(os.getenv('LOG_PURGE_BATCH', '5000'))
+FETCH_SIZE = 1000
+
+
+def archive_rows(cursor, query, params, path):
+    """Stream a query's rows into a gzip CSV at path (never replacing a file); returns the row count"""
+    if os.path.exists(path):
+        raise FileExistsError(f"Archive {path} already exists")
+    cursor.execute(query, params)
+    count = 0
+    temp_path = path + '.part'
+    with gzip.open(temp_path, 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(cursor.column_names)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            writer.writerows(rows)
+            count += len(rows)
+    # Only a complete file takes the final name
+    os.replace(temp_path, path)
+    return count
+
+
+def purge_logs_before(table_name, cutoff, archive_dir=LOG_ARCHIVE_DIR, job=None):
+    """
+    Archive and remove the months of table_name before cutoff's month.
+    Returns (archive files, rows removed).
+    """
+    column = PARTITIONED_LOG_TABLES[table_name]
+    first_kept = month_start(cutoff)
+    # Each run writes its own files; an earlier run's archive is never overwritten
+    run = f"{datetime.now():%Y%m%d_%H%M%S}"
+    os.makedirs(archive_dir, exist_ok=True)
+    files, removed = [], 0
+    with db_connection() as conn, log_maintenance_lock(conn):
+        cursor = conn.cursor()
+        try:
+            ensure_log_partitions(cursor)
+            partitions = log_partitions(cursor, table_name)
+            if partitions is None:
+                return _purge_unpartitioned(conn, cursor, table_name, column, first_kept, archive_dir, run, job)
+            for month in sorted(month for month in partitions if month < first_kept):
+                if job is not None:
+                    job.check_cancelled()
+                path = os.path.join(archive_dir, f"{table_name}_{month:%Y_%m}_{run}.csv.gz")
+                removed += archive_rows(cursor, f"SELECT * FROM {table_name} PARTITION ({partitions[month]})",
+                                        (), path)
+                # Dropped right after its archive is written, so a cancel loses nothing
+                drop_log_partitions(cursor, table_name, [partitions[month]])
+                files.append(path)
+        finally:
+            cursor.close()
+    logger.info(f"Purged {removed} row(s) from {table_name} before {first_kept}")
+    return files, removed
+
+
+def _purge_unpartitioned(conn, cursor, table_name, column, first_kept, archive_dir, run, job):
+    # Archive and delete the same rows: ids up to the newest one present now,
+    # so a row written in between is neither deleted nor left unarchived
+    cursor.execute(f"SELECT MAX(id) FROM {table_name} WHERE {column} < %s", (first_kept,))
+    last_id = cursor.fetchone()[0]
+    if last_id is None:
+        return [], 0
+    path = os.path.join(archive_dir, f"{table_name}_before_{first_kept:%Y_%m}_{run}.csv.gz")
+    count = archive_rows(cursor, f"SELECT * FROM {table_name} WHERE {column} < %s AND id <= %s",
+                         (first_kept, last_id), path)
+    removed = 0
+    while True:
+        if job is not None:
+            job.check_cancelled()
+        cursor.execute(f"DELETE FROM {table_name} WHERE {column} < %s AND id <= %s LIMIT {LOG_PURGE_BATCH}",
+                       (first_kept, last_id))
+        deleted = cursor.rowcount
+        conn.commit()
+        removed += deleted
+        if deleted < LOG_PURGE_BATCH:
+            break
+    logger.info(f"Purged {removed} of {count} archived row(s) from unpartitioned {table_name}")
+    return [path], removed
+
+
+if __name__ == "__main__":
+    # One-off conversion of the log tables (MySQL copies each table)
+    with db_connection() as conn, log_maintenance_lock(conn):
+        cursor = conn.cursor()
+        try:
+            ensure_log_partitions(cursor, convert=True)
+        finally:
+            cursor.close()
@@ -0,0 +1,77 @@
+# services/log_search.py
+"""
+Filter pushdown for the audit and login log browsers.
+
+A username filter is resolved to user ids first, so the log query filters
+on its own indexed (user_id, timestamp) columns instead of joining users
+and matching every row's username. Audit descriptions are matched through
+the ft_audit_description FULLTEXT index when the table has one; MySQL does
+not allow FULLTEXT indexes on partitioned tables, so a partitioned
+audit_log falls back to LIKE, which seek pagination keeps to scanning one
+page of matches at a time.
+"""
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# More matching users than this and the filter is left to a join
+MAX_FILTER_USER_IDS = 500
+
+_description_fulltext = None
+
+
+def matching_user_ids(connection, username):
+    """Ids of users whose username contains username (None if too many to list)"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT id FROM users WHERE username LIKE %s LIMIT %s",
+                       (f"%{username}%", MAX_FILTER_USER_IDS + 1))
+        ids = [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+    return ids if len(ids) <= MAX_FILTER_USER_IDS else None
+
+
+def user_condition(connection, column, username):
+    """(sql, params) restricting column (a user_id) to users matching username"""
+    if not username:
+        return "", []
+    ids = matching_user_ids(connection, username)
+    if ids is None:
+        return (f" AND {column} IN (SELECT id FROM users WHERE username LIKE %s)",
+                [f"%{username}%"])
+    if not ids:
+        return " AND FALSE", []
+    return f" AND {column} IN ({', '.join(['%s'] * len(ids))})", ids
+
+
+def has_description_fulltext(connection):
+    """True if audit_log has its FULLTEXT description index (checked once)"""
+    global _description_fulltext
+    if _description_fulltext is None:
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_log'
+                  AND INDEX_NAME = 'ft_audit_description' AND INDEX_TYPE = 'FULLTEXT'
+            """)
+            _description_fulltext = cursor.fetchone()[0] > 0
+        except Exception as e:
+            logger.warning(f"Could not check FULLTEXT index on audit_log: {e}")
+            return False
+        finally:
+            cursor.close()
+    return _description_fulltext
+
+
+def description_condition(connection, column, term):
+    """(sql, params) matching term anywhere in an audit description"""
+    if not term:
+        return "", []
+    if has_description_fulltext(connection):
+        # A quoted phrase: the ngram parser then matches it as a substring
+        return f" AND MATCH({column}) AGAINST (%s IN BOOLEAN MODE)", ['"' + term.replace('"', ' ') + '"']
+    return f" AND {column} LIKE %s", [f"%{term}%"]
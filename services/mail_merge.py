@@ -0,0 +1,102 @@
+# services/mail_merge.py
+"""
+Mail merge: one personalized message per recipient from a single template.
+
+MergeTemplate splits a subject or body with {{field}} placeholders once and
+then renders it for each recipient's fields. Any EmailTemplates method
+called with placeholders as arguments is a merge template too, e.g.
+EmailTemplates.simple_notification('{{name}}', title, message).
+
+Attachments go into every message as the same pre-encoded MIME part:
+attachment_part() reads and base64-encodes a file once and hands out the
+cached part after that. A notice to 2,000 parents therefore encodes each
+attachment once instead of 2,000 times.
+"""
+import html
+import os
+import re
+import threading
+from collections import OrderedDict
+from email.mime.application import MIMEApplication
+
+FIELD_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# Encoded attachment parts kept for reuse (least recently used go first)
+MAIL_MERGE_CACHE_MB = int(os.getenv('MAIL_MERGE_CACHE_MB', '64'))
+
+
+class MergeTemplate:
+    """Template text with {{field}} placeholders, parsed once"""
+
+    def __init__(self, text, escape_html=False):
+        parts = FIELD_PATTERN.split(text or "")
+        self.literals = parts[0::2]
+        self.fields = parts[1::2]
+        self.escape_html = escape_html
+
+    @property
+    def field_names(self):
+        return set(self.fields)
+
+    def render(self, values):
+        """The text with each placeholder replaced by values[field] ('' if missing)"""
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            value = values.get(field)
+            value = "" if value is None else str(value)
+            out.append(html.escape(value) if self.escape_html else value)
+            out.append(literal)
+        return "".join(out)
+
+
+def merge_messages(recipients, subject, body, is_html=True):
+    """
+    Render subject and body for each recipient (a dict with 'email' and any
+    merge fields). Returns [(email, subject, body)], one per distinct address.
+    """
+    subject_template = MergeTemplate(subject)
+    body_template = MergeTemplate(body, escape_html=is_html)
+    messages = []
+    seen = set()
+    for recipient in recipients:
+        email = (recipient.get('email') or "").strip()
+        if not email or email.lower() in seen:
+            continue
+        seen.add(email.lower())
+        messages.append((email, subject_template.render(recipient), body_template.render(recipient)))
+    return messages
+
+
+_parts = OrderedDict()
+_parts_size = 0
+_parts_lock = threading.Lock()
+
+
+def attachment_part(path):
+    """
+    MIME part for a file, base64-encoded on first use and shared afterwards.
+    Cached by path, size and modification time, so an edited file is re-read.
+    """
+    global _parts_size
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _parts_lock:
+        part = _parts.get(key)
+        if part is not None:
+            _parts.move_to_end(key)
+            return part
+
+    name = os.path.basename(path)
+    with open(path, "rb") as f:
+        # MIMEApplication encodes the payload here; messages only copy it out
+        part = MIMEApplication(f.read(), Name=name)
+    part['Content-Disposition'] = f'attachment; filename="{name}"'
+
+    with _parts_lock:
+        if key not in _parts:
+            _parts[key] = part
+            _parts_size += stat.st_size
+            while _parts_size > MAIL_MERGE_CACHE_MB * 1024 * 1024 and len(_parts) > 1:
+                (_, size, _), _ = _parts.popitem(last=False)
+                _parts_size -= size
+        return _parts[key]
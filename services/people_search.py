@@ -0,0 +1,233 @@
+# services/people_search.py
+"""
+People search across students, parents and teachers.
+
+Matching uses the FULLTEXT (ngram parser) indexes created by
+models.initialize_tables, ranked by MATCH() relevance. When a table has no
+FULLTEXT index (e.g. a server without the ngram plugin) an in-process trigram
+index over the same columns is used instead, so neither path falls back to
+`LIKE '%term%'` scans over the whole table. A term with no word of at least
+NGRAM_TOKEN_SIZE characters matches nothing while FULLTEXT is available.
+The whole table is not loaded just to match single letters.
+"""
+import os
+import re
+import threading
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# FULLTEXT index name and searchable columns per table
+SEARCH_INDEXES = {
+    'students': ('ft_students_search', ['first_name', 'surname', 'full_name', 'regNo', 'email']),
+    'parents': ('ft_parents_search', ['first_name', 'surname', 'full_name', 'phone', 'email']),
+    'teachers': ('ft_teachers_search', ['first_name', 'surname', 'full_name', 'teacher_id_code',
+                                        'email', 'phone_contact_1']),
+}
+
+# Default ngram_token_size; shorter terms cannot be matched by the ngram parser
+NGRAM_TOKEN_SIZE = 2
+
+# Seconds before a fallback trigram index is rebuilt from the table
+TRIGRAM_INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', '120'))
+
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """In-memory trigram index: id -> searchable text, trigram -> ids"""
+
+    def __init__(self, rows):
+        self.texts = {}
+        self.postings = {}
+        for row_id, text in rows:
+            text = (text or '').lower()
+            self.texts[row_id] = text
+            for gram in _trigrams(text):
+                self.postings.setdefault(gram, set()).add(row_id)
+        self.built_at = time.monotonic()
+
+    def _candidates(self, word):
+        grams = _trigrams(word)
+        if not grams:
+            # Words shorter than a trigram: scan the cached texts
+            return {row_id for row_id, text in self.texts.items() if word in text}
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        # Trigram hits can straddle word boundaries, so confirm the substring
+        return {row_id for row_id in candidates if word in self.texts[row_id]}
+
+    def matching_ids(self, term):
+        """Unranked set of ids whose text contains every word of term"""
+        matches = None
+        for word in term.lower().split():
+            found = self._candidates(word)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return set()
+        return matches or set()
+
+    def search(self, term, limit=100):
+        """Return [(id, score)] for rows containing every word of term"""
+        words = term.lower().split()
+        matches = self.matching_ids(term)
+        if not matches:
+            return []
+
+        results = []
+        for row_id in matches:
+            text = self.texts[row_id]
+            tokens = text.split()
+            # Prefer whole-word and prefix matches, then shorter texts
+            score = sum(2.0 if word in tokens else
+                        1.5 if any(token.startswith(word) for token in tokens) else 1.0
+                        for word in words)
+            score += len(term) / max(len(text), 1)
+            results.append((row_id, score))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results[:limit]
+
+
+_trigram_indexes = {}
+_trigram_lock = threading.Lock()
+_fulltext_available = {}
+
+
+def invalidate_search_index(table=None):
+    """Drop cached fallback indexes (and FULLTEXT detection) after data changes"""
+    with _trigram_lock:
+        if table is None:
+            _trigram_indexes.clear()
+            _fulltext_available.clear()
+        else:
+            for active_only in (True, False):
+                _trigram_indexes.pop((table, active_only), None)
+            _fulltext_available.pop(table, None)
+
+
+class PeopleSearch:
+    """Ranked id lookup for people tables; see SEARCH_INDEXES"""
+
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def has_fulltext(self, table):
+        """True if the table's FULLTEXT search index exists (cached)"""
+        if table in _fulltext_available:
+            return _fulltext_available[table]
+        index_name, _ = SEARCH_INDEXES[table]
+        available = False
+        cursor = self.db_connection.cursor()
+        try:
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                  AND INDEX_NAME = %s AND INDEX_TYPE = 'FULLTEXT'
+            """, (table, index_name))
+            available = cursor.fetchone()[0] > 0
+        except Exception as e:
+            logger.warning(f"Could not check FULLTEXT index on {table}: {e}")
+        finally:
+            cursor.close()
+        _fulltext_available[table] = available
+        if not available:
+            logger.info(f"No FULLTEXT index on {table}; using trigram fallback")
+        return available
+
+    @staticmethod
+    def build_match(table, term):
+        """
+        MATCH ... AGAINST clause and params ranking rows that contain every
+        word of term. Returns (None, None) if no word is long enough.
+        """
+        _, columns = SEARCH_INDEXES[table]
+        words = [w for w in _BOOLEAN_OPERATORS.sub(' ', term).split() if len(w) >= NGRAM_TOKEN_SIZE]
+        if not words:
+            return None, None
+        # Quoted words become ngram phrase matches, i.e. substring matches
+        against = ' '.join(f'+"{word}"' for word in words)
+        column_list = ', '.join(columns)
+        return f"MATCH({column_list}) AGAINST (%s IN BOOLEAN MODE)", against
+
+    def search_ids(self, table, term, limit=100, active_only=False):
+        """Return [(id, score)] best first; with active_only, inactive rows never take a place"""
+        term = (term or '').strip()
+        if not term:
+            return []
+        if self.has_fulltext(table):
+            match_sql, against = self.build_match(table, term)
+            if not match_sql:
+                return []
+            active_sql = " AND is_active = TRUE" if active_only else ""
+            cursor = self.db_connection.cursor()
+            try:
+                cursor.execute(
+                    f"SELECT id, {match_sql} AS score FROM {table} "
+                    f"WHERE {match_sql}{active_sql} ORDER BY score DESC, id LIMIT %s",
+                    (against, against, limit)
+                )
+                return [(row[0], float(row[1])) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        return self._trigram_index(table, active_only).search(term, limit)
+
+    def _trigram_index(self, table, active_only=False):
+        key = (table, active_only)
+        with _trigram_lock:
+            index = _trigram_indexes.get(key)
+            if index and time.monotonic() - index.built_at < TRIGRAM_INDEX_TTL:
+                return index
+
+        _, columns = SEARCH_INDEXES[table]
+        cursor = self.db_connection.cursor()
+        try:
+            cursor.execute(f"SELECT id, CONCAT_WS(' ', {', '.join(columns)}) FROM {table}"
+                           f"{' WHERE is_active = TRUE' if active_only else ''}")
+            index = TrigramIndex(cursor.fetchall())
+        finally:
+            cursor.close()
+        logger.info(f"Built trigram search index for {table} ({len(index.texts)} rows)")
+
+        with _trigram_lock:
+            _trigram_indexes[key] = index
+        return index
+
+    def search_student_ids(self, term, limit=100, include_parents=True, active_only=False):
+        """
+        Student ids matching term, best first. With include_parents, students
+        whose linked parent matches are appended after direct matches. With
+        active_only, only active students (found through active parents) count.
+        """
+        ranked = [row_id for row_id, _ in self.search_ids('students', term, limit, active_only)]
+        if include_parents and len(ranked) < limit:
+            parent_ids = [row_id for row_id, _ in self.search_ids('parents', term, limit, active_only)]
+            if parent_ids:
+                placeholders = ','.join(['%s'] * len(parent_ids))
+                active_join = (" JOIN students s ON s.id = sp.student_id AND s.is_active = TRUE"
+                               if active_only else "")
+                cursor = self.db_connection.cursor()
+                try:
+                    cursor.execute(
+                        f"SELECT DISTINCT sp.student_id FROM student_parent sp{active_join} "
+                        f"WHERE sp.parent_id IN ({placeholders})",
+                        parent_ids
+                    )
+                    seen = set(ranked)
+                    for (student_id,) in cursor.fetchall():
+                        if student_id not in seen:
+                            ranked.append(student_id)
+                            seen.add(student_id)
+                finally:
+                    cursor.close()
+        return ranked[:limit]
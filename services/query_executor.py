@@ -0,0 +1,229 @@
+# services/query_executor.py
+"""
+Asynchronous query executor shared by the forms.
+
+Queries (or any function taking a connection) run on a QThreadPool using
+connections borrowed from the pool in models.models, and results are
+delivered to the GUI thread through Qt signals. Requests submitted with the
+same `key` coalesce: a newer request supersedes the older one, which is
+dropped if still queued, killed on the server if running, and whose result
+is never delivered. This is what a search box wants while the user types.
+"""
+import os
+import threading
+import traceback
+import logging
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from models.models import db_connection
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Worker threads for background queries (each holds one pooled connection while running)
+QUERY_THREADS = int(os.getenv('DB_QUERY_THREADS', '4'))
+
+
+class QueryFuture(QObject):
+    """
+    Handle for a submitted query.
+    Signals fire on the GUI thread; `finished` always fires last (also after
+    an error) unless the request was cancelled or superseded.
+    """
+    result_ready = Signal(object)
+    error_occurred = Signal(str)
+    finished = Signal()
+
+    def __init__(self, executor, key=None):
+        super().__init__(executor)
+        self.executor = executor
+        self.key = key
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._connection_id = None
+        self._kill_done = None  # set once a KILL QUERY for this request has been sent
+        self._runnable = None   # kept referenced until the request completes
+        self.done = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """Drop the request: dequeue it, or kill its running statement"""
+        with self._lock:
+            if self._cancelled or self.done:
+                return
+            self._cancelled = True
+            connection_id = self._connection_id
+            if connection_id is not None:
+                # The worker keeps the connection until the kill has been sent
+                self._kill_done = threading.Event()
+        if connection_id is None:
+            if self._runnable is not None and self.executor.pool.tryTake(self._runnable):
+                # Never started: complete it here so it is cleaned up
+                self.executor._completed.emit(self, None, None)
+            return
+        self.executor.kill_query(connection_id, self._kill_done)
+
+    # Called from the worker thread
+    def _set_connection_id(self, connection_id):
+        with self._lock:
+            self._connection_id = connection_id
+            return not self._cancelled
+
+    def _release_connection(self):
+        """Forget the connection before it goes back to the pool (worker thread)"""
+        with self._lock:
+            self._connection_id = None
+            kill_done = self._kill_done
+        if kill_done is not None:
+            # A KILL sent after the connection is reused would hit someone else's query
+            kill_done.wait(timeout=10)
+
+    def _deliver(self, ok, payload):
+        # Runs on the GUI thread (queued from the worker)
+        self._runnable = None
+        self.done = True
+        if self._cancelled or ok is None:
+            return
+        if ok:
+            self.result_ready.emit(payload)
+        else:
+            self.error_occurred.emit(payload)
+        self.finished.emit()
+
+
+class _QueryRunnable(QRunnable):
+    def __init__(self, executor, future, func):
+        super().__init__()
+        self.executor = executor
+        self.future = future
+        self.func = func
+        self.setAutoDelete(False)  # owned by the future so tryTake() stays safe
+
+    def run(self):
+        # Always report completion (ok=None when cancelled) so the GUI side can clean up
+        future = self.future
+        if future.cancelled:
+            self.executor._completed.emit(future, None, None)
+            return
+        try:
+            with db_connection() as conn:
+                try:
+                    if not future._set_connection_id(getattr(conn, 'connection_id', None)):
+                        self.executor._completed.emit(future, None, None)
+                        return
+                    result = self.func(conn)
+                finally:
+                    future._release_connection()
+            self.executor._completed.emit(future, True, result)
+        except Exception as e:
+            if future.cancelled:
+                self.executor._completed.emit(future, None, None)
+                return
+            logger.error(f"Background query failed: {e}\n{traceback.format_exc()}")
+            self.executor._completed.emit(future, False, str(e))
+
+
+class QueryExecutor(QObject):
+    """Thread pool of pooled connections with keyed request coalescing"""
+    _completed = Signal(object, object, object)  # future, ok (True/False, None if cancelled), payload
+
+    def __init__(self, max_threads=QUERY_THREADS, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, max_threads))
+        self._latest = {}  # key -> newest QueryFuture
+        self._completed.connect(self._on_completed)
+
+    def submit_call(self, func, key=None, on_result=None, on_error=None, on_finished=None):
+        """
+        Run func(connection) -> result in the background.
+        With a key, any earlier request with the same key is superseded.
+        Callbacks run on the GUI thread. Returns a QueryFuture.
+        """
+        future = QueryFuture(self, key)
+        if on_result:
+            future.result_ready.connect(on_result)
+        if on_error:
+            future.error_occurred.connect(on_error)
+        if on_finished:
+            future.finished.connect(on_finished)
+
+        if key is not None:
+            previous = self._latest.get(key)
+            self._latest[key] = future
+            if previous is not None:
+                previous.cancel()
+
+        runnable = _QueryRunnable(self, future, func)
+        future._runnable = runnable
+        self.pool.start(runnable)
+        return future
+
+    def submit(self, query, params=None, key=None, fetch='all', dictionary=False, **callbacks):
+        """
+        Run a single statement in the background.
+        fetch: 'all' (rows), 'one' (row or None) or 'none' (commit, returns rowcount).
+        """
+        def run(conn):
+            cursor = conn.cursor(dictionary=dictionary, buffered=True)
+            try:
+                cursor.execute(query, params or ())
+                if fetch == 'all':
+                    return cursor.fetchall()
+                if fetch == 'one':
+                    return cursor.fetchone()
+                conn.commit()
+                return cursor.rowcount
+            finally:
+                cursor.close()
+
+        return self.submit_call(run, key=key, **callbacks)
+
+    def cancel(self, key):
+        """Cancel the newest request submitted under key"""
+        future = self._latest.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def kill_query(self, connection_id, done=None):
+        """Stop a running statement from a separate connection (sets done when sent)"""
+        def kill():
+            try:
+                with db_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(f"KILL QUERY {int(connection_id)}")
+                    cursor.close()
+            except Exception as e:
+                logger.warning(f"Could not cancel query on connection {connection_id}: {e}")
+            finally:
+                if done is not None:
+                    done.set()
+        threading.Thread(target=kill, daemon=True).start()
+
+    def shutdown(self, timeout_ms=2000):
+        for key in list(self._latest):
+            self.cancel(key)
+        self.pool.clear()
+        return self.pool.waitForDone(timeout_ms)
+
+    def _on_completed(self, future, ok, payload):
+        if future.key is not None and self._latest.get(future.key) is future:
+            del self._latest[future.key]
+        future._deliver(ok, payload)
+        future.deleteLater()
+
+
+_query_executor = None
+
+
+def get_query_executor():
+    """Shared QueryExecutor (create it from the GUI thread)"""
+    global _query_executor
+    if _query_executor is None:
+        _query_executor = QueryExecutor()
+    return _query_executor
@@ -0,0 +1,181 @@
+# services/recipient_resolver.py
+"""
+Email recipient resolution.
+
+RecipientResolver expands teachers, parents, students, classes or grades
+(all streams of a class name) into deduplicated, validated addresses. Each
+kind is one SQL statement over student_parent (plus the current
+student_class_assignments for classes and grades). The statement returns
+every address row for its scope, tagged as the student's own or a
+parent's. The rows are kept for the resolver's lifetime, so a dialog that
+holds one resolver lists and expands selections without going back to the
+database.
+"""
+import logging
+import re
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMAIL_PATTERN = re.compile(r"^[^@\s,;]+@[^@\s,;]+\.[^@\s,;]+$")
+
+# Who receives mail sent to students, classes or grades
+AUDIENCE_ALL = 'all'
+AUDIENCE_STUDENTS = 'students'
+AUDIENCE_PARENTS = 'parents'
+
+_CLASS_JOIN = """
+    JOIN student_class_assignments sca ON sca.student_id = s.id AND sca.is_current = TRUE
+    JOIN classes c ON c.id = sca.class_id AND c.is_active = TRUE
+"""
+
+# A student's own address and each linked parent's, per scope (student, class or grade)
+_STUDENT_ADDRESSES = """
+    SELECT {scope} AS scope_id, {label} AS label, s.email, s.full_name AS name,
+           s.full_name AS student_name, 'student' AS role
+    FROM students s {join}
+    WHERE s.is_active = TRUE{where}
+    UNION ALL
+    SELECT {scope}, {label}, p.email, p.full_name, s.full_name, 'parent'
+    FROM students s {join}
+    JOIN student_parent sp ON sp.student_id = s.id
+    JOIN parents p ON p.id = sp.parent_id
+    WHERE s.is_active = TRUE AND p.is_active = TRUE{where}
+"""
+
+_QUERIES = {
+    'student': _STUDENT_ADDRESSES.format(scope="s.id", label="s.full_name", join="", where="{where}"),
+    'class': _STUDENT_ADDRESSES.format(scope="c.id", label="CONCAT_WS(' ', c.class_name, c.stream)",
+                                       join=_CLASS_JOIN, where="{where}"),
+    'grade': _STUDENT_ADDRESSES.format(scope="c.class_name", label="c.class_name",
+                                       join=_CLASS_JOIN, where="{where}"),
+    'parent': """
+        SELECT p.id AS scope_id, p.full_name AS label, p.email, p.full_name AS name,
+               s.full_name AS student_name, 'parent' AS role
+        FROM parents p
+        LEFT JOIN student_parent sp ON sp.parent_id = p.id
+        LEFT JOIN students s ON s.id = sp.student_id AND s.is_active = TRUE
+        WHERE p.is_active = TRUE{where}
+    """,
+    'teacher': """
+        SELECT t.id AS scope_id, CONCAT_WS(' ', t.first_name, t.surname) AS label, t.email,
+               CONCAT_WS(' ', t.first_name, t.surname) AS name, NULL AS student_name, 'teacher' AS role
+        FROM teachers t
+        WHERE t.is_active = TRUE{where}
+    """,
+}
+
+_SCOPE_COLUMNS = {'student': 's.id', 'class': 'c.id', 'grade': 'c.class_name',
+                  'parent': 'p.id', 'teacher': 't.id'}
+
+
+# Recipient types offered by the email composer -> resolver kind
+RECIPIENT_TYPES = {
+    'Students': 'student', 'Teachers': 'teacher', 'Parents': 'parent',
+    'Classes': 'class', 'Grades': 'grade',
+}
+
+# Recipient type names as callers spell them -> resolver kind
+RECIPIENT_KINDS = {
+    'student': 'student', 'students': 'student',
+    'teacher': 'teacher', 'teachers': 'teacher',
+    'parent': 'parent', 'parents': 'parent',
+    'class': 'class', 'classes': 'class',
+    'grade': 'grade', 'grades': 'grade',
+}
+
+
+def recipient_kind(recipient_type):
+    """'students' / 'Classes' / 'student' -> 'student' / 'class' / 'student' (unknown names unchanged)"""
+    kind = (recipient_type or '').strip().lower()
+    return RECIPIENT_KINDS.get(kind, kind)
+
+
+def valid_email(email):
+    return bool(email) and EMAIL_PATTERN.match(email.strip()) is not None
+
+
+class RecipientResolver:
+    """Address lookups for one dialog or bulk send; results are cached per instance"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._rows = {}
+
+    def _load(self, kind, ids=None):
+        """{scope_id: (label, [(email, name, student_name, role)])} for kind (optionally only ids)"""
+        key = (kind, None if ids is None else tuple(sorted(set(ids), key=str)))
+        if (kind, None) in self._rows:
+            return self._rows[(kind, None)]
+        if key in self._rows:
+            return self._rows[key]
+        if kind not in _QUERIES:
+            raise ValueError(f"Unknown recipient type: {kind}")
+
+        where, params = "", []
+        if ids is not None:
+            if not key[1]:
+                return {}
+            where = f" AND {_SCOPE_COLUMNS[kind]} IN ({', '.join(['%s'] * len(key[1]))})"
+            params = list(key[1])
+        # The student kinds repeat the scope filter in both halves of the UNION
+        params = params * _QUERIES[kind].count("{where}")
+        query = _QUERIES[kind].format(where=where)
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query + " ORDER BY label", tuple(params))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+
+        scopes = {}
+        for scope_id, label, email, name, student_name, role in rows:
+            entry = scopes.setdefault(scope_id, (label or '', []))
+            if valid_email(email):
+                entry[1].append((email.strip(), name or '', student_name or '', role))
+        self._rows[key] = scopes
+        return scopes
+
+    def entries(self, kind, audience=AUDIENCE_ALL):
+        """[(scope_id, label, address count)] for kind, skipping scopes with no addresses"""
+        entries = []
+        for scope_id, (label, addresses) in self._load(kind).items():
+            count = len({email.lower() for email, _, _, role in addresses if self._wanted(role, audience)})
+            if count:
+                entries.append((scope_id, label, count))
+        return entries
+
+    def resolve(self, kind, ids, audience=AUDIENCE_ALL):
+        """
+        Recipient dicts (email, name, student_name) for the given ids of kind,
+        one per distinct address. A parent of several selected students gets
+        one message naming all of them.
+        """
+        scopes = self._load(kind, ids)
+        recipients = {}
+        for scope_id in ids:
+            for email, name, student_name, role in scopes.get(scope_id, ('', []))[1]:
+                if not self._wanted(role, audience):
+                    continue
+                recipient = recipients.setdefault(email.lower(), {
+                    'email': email, 'name': name, 'student_names': []
+                })
+                if student_name and student_name not in recipient['student_names']:
+                    recipient['student_names'].append(student_name)
+        return [
+            {'email': r['email'], 'name': r['name'], 'student_name': ', '.join(r['student_names'])}
+            for r in recipients.values()
+        ]
+
+    def resolve_emails(self, kind, ids, audience=AUDIENCE_ALL):
+        return [recipient['email'] for recipient in self.resolve(kind, ids, audience)]
+
+    @staticmethod
+    def _wanted(role, audience):
+        if audience == AUDIENCE_STUDENTS:
+            return role != 'parent'
+        if audience == AUDIENCE_PARENTS:
+            return role != 'student'
+        return True
@@ -0,0 +1,188 @@
+# services/reference_cache.py
+"""
+App-wide cache of reference (lookup) data.
+
+Schools, academic years, terms, classes, departments and the active teacher
+and student lists are read by most forms when they are built or refreshed.
+They are loaded once (preloaded at login) and shared. Each cached dataset
+remembers a version stamp of its tables, MAX(updated_at) and COUNT(*), so a
+change made from another machine is picked up the next time the stamp is
+checked (at most every REFERENCE_CHECK_SECONDS). Local writes invalidate
+the affected tables right away through invalidate_reference_data(), which
+AuditBaseForm.log_audit_action calls for every audited write.
+"""
+import os
+import threading
+import time
+import logging
+from contextlib import nullcontext
+
+from models.models import db_connection
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds a dataset is trusted before its version stamp is checked again
+REFERENCE_CHECK_SECONDS = int(os.getenv('REFERENCE_CHECK_SECONDS', '30'))
+
+# name -> (tables the dataset depends on, query)
+REFERENCE_DATASETS = {
+    'schools': (('schools',), """
+        SELECT id, school_name, address, phone, email
+        FROM schools
+        ORDER BY id
+    """),
+    'academic_years': (('academic_years',), """
+        SELECT id, year_name, is_current
+        FROM academic_years
+        ORDER BY year_name DESC
+    """),
+    'terms': (('terms', 'academic_years'), """
+        SELECT t.id, t.term_name, ay.year_name, t.is_current, t.start_date, t.academic_year_id
+        FROM terms t
+        LEFT JOIN academic_years ay ON t.academic_year_id = ay.id
+        ORDER BY t.start_date DESC
+    """),
+    'classes': (('classes',), """
+        SELECT id, class_name, stream, level, is_active
+        FROM classes
+        WHERE class_name IS NOT NULL AND class_name != ''
+        ORDER BY
+            level,
+            CASE
+                WHEN class_name LIKE 'S%' THEN CAST(SUBSTR(class_name, 2) AS SIGNED)
+                ELSE 999
+            END,
+            stream
+    """),
+    'departments': (('departments',), """
+        SELECT id, department_name, is_active
+        FROM departments
+        ORDER BY department_name
+    """),
+    'active_teachers': (('teachers',), """
+        SELECT id, full_name, first_name, surname, position, teacher_id_code
+        FROM teachers
+        WHERE is_active = 1
+        ORDER BY full_name
+    """),
+    'active_students': (('students',), """
+        SELECT id, full_name, first_name, surname, grade_applied_for
+        FROM students
+        WHERE is_active = 1
+        ORDER BY full_name
+    """),
+}
+
+
+class _Dataset:
+    __slots__ = ('columns', 'rows', 'stamps', 'checked_at')
+
+    def __init__(self, columns, rows, stamps):
+        self.columns = columns
+        self.rows = rows
+        self.stamps = stamps
+        self.checked_at = time.monotonic()
+
+
+class ReferenceCache:
+    """Versioned cache of the datasets in REFERENCE_DATASETS"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._datasets = {}
+
+    def rows(self, name, connection=None):
+        """Rows (tuples, in query column order) of a dataset"""
+        return self._get(name, connection).rows
+
+    def records(self, name, connection=None):
+        """Rows of a dataset as dicts keyed by column name"""
+        dataset = self._get(name, connection)
+        return [dict(zip(dataset.columns, row)) for row in dataset.rows]
+
+    def invalidate(self, *tables):
+        """Drop datasets depending on tables (all datasets if none given)"""
+        with self._lock:
+            if not tables:
+                self._datasets.clear()
+                return
+            for name, (dataset_tables, _) in REFERENCE_DATASETS.items():
+                if any(table in dataset_tables for table in tables):
+                    self._datasets.pop(name, None)
+
+    def preload(self, names=None, connection=None):
+        """Load the given datasets (default: all) in one go, e.g. at login"""
+        names = list(names or REFERENCE_DATASETS)
+        with self._maybe_connection(connection) as conn:
+            for name in names:
+                self._get(name, conn)
+        logger.info(f"Preloaded reference data: {', '.join(names)}")
+
+    def _get(self, name, connection):
+        with self._lock:
+            dataset = self._datasets.get(name)
+            if dataset and time.monotonic() - dataset.checked_at < REFERENCE_CHECK_SECONDS:
+                return dataset
+            tables, query = REFERENCE_DATASETS[name]
+            with self._maybe_connection(connection) as conn:
+                if dataset:
+                    stamps = self._stamps(conn, tables)
+                    if stamps == dataset.stamps:
+                        dataset.checked_at = time.monotonic()
+                        return dataset
+                dataset = self._load(conn, tables, query)
+            self._datasets[name] = dataset
+            return dataset
+
+    def _load(self, conn, tables, query):
+        # Stamp first: a write landing between the two reads is seen next check
+        stamps = self._stamps(conn, tables)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            columns = tuple(cursor.column_names)
+        finally:
+            cursor.close()
+        return _Dataset(columns, rows, stamps)
+
+    @staticmethod
+    def _stamps(conn, tables):
+        """Version stamp per table: (MAX(updated_at), COUNT(*))"""
+        query = " UNION ALL ".join(
+            f"SELECT '{table}', MAX(updated_at), COUNT(*) FROM {table}" for table in tables
+        )
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query)
+            return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _maybe_connection(connection):
+        if connection is not None:
+            return nullcontext(connection)
+        return db_connection()
+
+
+_reference_cache = ReferenceCache()
+
+
+def get_reference_cache():
+    return _reference_cache
+
+
+def invalidate_reference_data(*tables):
+    """Call after writing to any of tables so cached lookups are reloaded"""
+    _reference_cache.invalidate(*tables)
+
+
+def preload_reference_data():
+    """Warm the cache (called once after login); failures are only logged"""
+    try:
+        _reference_cache.preload()
+    except Exception as e:
+        logger.warning(f"Could not preload reference data: {e}")
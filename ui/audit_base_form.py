@@ -4,14 +4,25 @@ from PySide6.QtGui import QFont, QCursor
 from PySide6.QtCore import Qt
 from typing import Optional, Dict, Any
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.cell.cell import MergedCell  # For checking merged cells
-from datetime import datetime
+from datetime import date, datetime
+from itertools import chain, islice
 import os
 import platform
 import subprocess
 from models.models import get_db_connection
+from services.job_runner import get_job_runner
+from services.query_executor import get_query_executor
+from services.reference_cache import get_reference_cache
+from services.change_feed import get_change_feed
+from services.audit_sink import get_audit_sink
+from services.audit_diff import diff_values, normalize_value, snapshot_row, to_json
+
+# Rows sampled to size export columns
+EXPORT_WIDTH_SAMPLE = 200
 
 
 class AuditBaseForm(QWidget):
@@ -858,176 +869,136 @@ class AuditBaseForm(QWidget):
         self.apply_hand_cursor_to_buttons()
         
         
-    def log_audit_action(self, action: str, table_name: str, record_id: int, description: str):
-        """Log an audit action to the audit_log table."""
-        if not hasattr(self, 'cursor') or not hasattr(self, 'db_connection'):
-            print("Error: Database cursor or connection not available.")
-            return
+    def run_query_async(self, query, params=None, key=None, on_result=None, on_error=None,
+                        on_finished=None, fetch='all'):
+        """
+        Run a read query on the shared query executor and get the rows back on
+        the GUI thread. Keys are scoped to this form; a newer request with the
+        same key supersedes one still in flight. Returns a QueryFuture.
+        """
+        if key is not None:
+            key = f"{type(self).__name__}.{id(self)}.{key}"
+        return get_query_executor().submit(
+            query, params, key=key, fetch=fetch,
+            on_result=on_result, on_error=on_error, on_finished=on_finished
+        )
+
+    def run_call_async(self, func, key=None, on_result=None, on_error=None, on_finished=None):
+        """Like run_query_async, for func(connection) -> result (several queries on one connection)"""
+        if key is not None:
+            key = f"{type(self).__name__}.{id(self)}.{key}"
+        return get_query_executor().submit_call(
+            func, key=key, on_result=on_result, on_error=on_error, on_finished=on_finished
+        )
 
+    def log_audit_action(self, action: str, table_name: str, record_id: int, description: str,
+                         old_values: Optional[Dict[str, Any]] = None,
+                         new_values: Optional[Dict[str, Any]] = None):
+        """
+        Log an audit action to the audit_log table.
+        The event is queued and written in a batch by the audit sink
+        (services/audit_sink.py), so this costs no database round trip.
+        When both old_values and new_values are given only the fields that
+        changed are stored; an insert passes just new_values, a delete old_values.
+        """
         try:
+            if old_values is not None and new_values is not None:
+                old_values, new_values = diff_values(old_values, new_values)
+                if record_id is not None:
+                    self.remember_record(table_name, record_id, new_values, merge=True)
             user_id = self.user_session.get('user_id') if self.user_session else None
             ip_address = self.user_session.get('ip_address', '127.0.0.1') if self.user_session else '127.0.0.1'
-
-            query = """
-                INSERT INTO audit_log (user_id, action, table_name, record_id, description, ip_address)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            self.cursor.execute(query, (user_id, action, table_name, record_id, description, ip_address))
-            self.db_connection.commit()
+            get_audit_sink().log(user_id, action, table_name, record_id, description, ip_address,
+                                 to_json(old_values), to_json(new_values))
         except Exception as e:
             print(f"Failed to log audit action: {e}")
+        finally:
+            # Every audited write names its table: tell the other open forms
+            # (this also drops cached lookups built from the table)
+            get_change_feed().notify_local_change(table_name, source=self)
+
+    def remember_record(self, table_name: str, record_id: int, values: Dict[str, Any], merge: bool = False):
+        """Keep a record as loaded into the form, so its update can be diffed without re-reading it"""
+        if not hasattr(self, '_loaded_records'):
+            self._loaded_records = {}
+        values = {key: normalize_value(value) for key, value in values.items()}
+        key = (table_name, record_id)
+        if merge and key in self._loaded_records:
+            self._loaded_records[key].update(values)
+        elif not merge:
+            self._loaded_records[key] = values
+
+    def loaded_record(self, table_name: str, record_id: int, columns) -> Optional[Dict[str, Any]]:
+        """
+        Values of columns before an update: the remembered record if it has
+        them all, otherwise read from the database (None if the row is gone).
+        """
+        record = getattr(self, '_loaded_records', {}).get((table_name, record_id))
+        if record is not None and all(column in record for column in columns):
+            return record
+        return snapshot_row(self.cursor, table_name, record_id, columns)
+
+    def forget_record(self, table_name: str, record_id: int):
+        getattr(self, '_loaded_records', {}).pop((table_name, record_id), None)
 
 
     def export_with_green_header(self, data, headers, filename_prefix="export", title=None):
+        """
+        Export rows to a styled Excel file.
+        The workbook is written by a background job (see services/job_runner.py)
+        so the window stays responsive; rows are streamed to disk, and data may
+        be a list or any iterable.
+        """
         try:
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-            from openpyxl.utils import get_column_letter
-            from openpyxl.cell.cell import MergedCell
-            from datetime import datetime
-            import os
-            import platform
-            import subprocess
-    
-            # Use provided title or fallback
-            display_title = title or "CBCENTRA SCHOOL MANAGEMENT SYSTEM"
-    
-            # Create workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Data Export"
-    
-            # === STYLING ===
-            header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-            header_fill = PatternFill(start_color='2E7D32', end_color='2E7D32', fill_type='solid')  # Dark green
-            header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            thin_border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
+            filename = self.ask_export_filename(filename_prefix)
+            if not filename:
+                return False
+
+            get_job_runner().submit(
+                f"Export {os.path.basename(filename)}",
+                lambda job: self.write_green_header_workbook(filename, job.track(data), headers, title),
+                on_done=lambda row_count: self.on_export_finished(filename, row_count),
+                on_error=lambda message: QMessageBox.critical(self, "Save Error", f"Could not save file:\n{message}"),
+                on_cancel=lambda: self.on_export_cancelled(filename)
             )
-            data_font = Font(name='Arial', size=11)
-            data_alignment = Alignment(horizontal='left', vertical='center')
-    
-            # === METADATA ROWS ===
-            ws.insert_rows(0, 3)
-            total_cols = len(headers)
-            last_col_letter = get_column_letter(total_cols)
-    
-            # Title
-            ws.merge_cells(f'A1:{last_col_letter}1')
-            title_cell = ws['A1']
-            title_cell.value = display_title.upper()
-            title_cell.font = Font(name='Arial', size=16, bold=True, color='2E7D32')
-            title_cell.alignment = Alignment(horizontal='center', vertical='center')
+            return True
     
-            # Subtitle
-            ws.merge_cells(f'A2:{last_col_letter}2')
-            subtitle_cell = ws['A2']
-            subtitle_cell.value = f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Exported by: {self.user_session.get('full_name', 'Unknown')}"
-            subtitle_cell.font = Font(name='Arial', size=10, italic=True, color='555555')
-            subtitle_cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-            ws['A3'].value = ""  # Empty row
-    
-            # === WRITE HEADERS (row 4) ===
-            ws.append(headers)
-            for col_num in range(1, len(headers) + 1):
-                cell = ws.cell(row=4, column=col_num)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-                cell.border = thin_border
-    
-            # === WRITE DATA ===
-            for row_data in data:
-                ws.append(row_data)
-    
-            # === COLUMN WIDTH AUTO-FIT (SAFE) ===
-            for column_cells in ws.columns:
-                max_length = 0
-                column_letter = None
-                for cell in column_cells:
-                    if isinstance(cell, MergedCell):
-                        continue
-                    if column_letter is None:
-                        column_letter = cell.column_letter
-                    try:
-                        if cell.value:
-                            max_length = max(max_length, len(str(cell.value)))
-                    except:
-                        pass
-                if column_letter:
-                    adjusted_width = min(max_length + 2, 50)
-                    ws.column_dimensions[column_letter].width = adjusted_width
-    
-            # === DATA FORMATTING ===
-            for row in ws.iter_rows(min_row=5, max_row=ws.max_row):
-                for cell in row:
-                    cell.font = data_font
-                    cell.alignment = data_alignment
-                    cell.border = thin_border
-                    
-            # === FREEZE HEADER ROW ===
-            ws.freeze_panes = 'A5'
-    
-            # === FOOTER ===
-            footer_row = ws.max_row + 2
-            ws.merge_cells(f'A{footer_row}:{last_col_letter}{footer_row}')
-            footer_cell = ws[f'A{footer_row}']
-            footer_cell.value = "Generated by CBCentra School Management System"
-            footer_cell.font = Font(name='Arial', size=9, italic=True, color='999999')
-            footer_cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-            # === ASK USER FOR SAVE LOCATION ===
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            suggested_filename = f"{filename_prefix}_{timestamp}.xlsx"
-            
-            # Default to exports folder, but let user choose
-            export_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exports")
-            os.makedirs(export_dir, exist_ok=True)
-            suggested_path = os.path.join(export_dir, suggested_filename)
-            
-            filename, _ = QFileDialog.getSaveFileName(
+        except ImportError:
+            QMessageBox.critical(
                 self,
-                "Save Export File",
-                suggested_path,
-                "Excel Files (*.xlsx);;All Files (*)"
+                "Export Error",
+                "Required library 'openpyxl' not installed.\nRun: pip install openpyxl"
             )
-            
-            # If user cancels, abort
+        except Exception as e:
+            QMessageBox.critical(self, "Export Error", f"Failed to export:\n{str(e)}")
+        return False
+
+    def export_query_with_green_header(self, query, params, headers, filename_prefix="export",
+                                       title=None, convert=None, count_query=None, count_params=None):
+        """
+        Export a query straight to Excel in a background job: rows stream
+        through an unbuffered (server-side) cursor on a pooled connection.
+        convert(row) -> list may reshape each row for the sheet; count_query
+        (optional) gives the progress bar a total.
+        """
+        try:
+            filename = self.ask_export_filename(filename_prefix)
             if not filename:
                 return False
-            
-            # Ensure .xlsx extension
-            if not filename.lower().endswith('.xlsx'):
-                filename += '.xlsx'
-            
-            # === SAVE FILE ===
-            try:
-                wb.save(filename)
-            except Exception as e:
-                QMessageBox.critical(self, "Save Error", f"Could not save file:\n{str(e)}")
-                return False
-    
-            # === OPEN FILE ===
-            try:
-                if platform.system() == "Windows":
-                    os.startfile(filename)
-                elif platform.system() == "Darwin":  # macOS
-                    subprocess.call(["open", filename])
-                else:  # Linux
-                    subprocess.call(["xdg-open", filename])
-            except Exception as e:
-                print(f"Could not open file: {e}")
-    
-            QMessageBox.information(
-                self,
-                "Success",
-                f"Data exported successfully!\nSaved to: {os.path.basename(filename)}"
+
+            get_job_runner().submit_query(
+                f"Export {os.path.basename(filename)}",
+                query, params,
+                writer=lambda rows: self.write_green_header_workbook(filename, rows, headers, title),
+                count_query=count_query,
+                count_params=count_params,
+                convert=convert,
+                on_done=lambda row_count: self.on_export_finished(filename, row_count),
+                on_error=lambda message: QMessageBox.critical(self, "Export Error", f"Failed to export:\n{message}"),
+                on_cancel=lambda: self.on_export_cancelled(filename)
             )
-    
+            return True
+
         except ImportError:
             QMessageBox.critical(
                 self,
@@ -1036,6 +1007,186 @@ class AuditBaseForm(QWidget):
             )
         except Exception as e:
             QMessageBox.critical(self, "Export Error", f"Failed to export:\n{str(e)}")
+        return False
+
+    def on_export_finished(self, filename, row_count):
+        """Called on the GUI thread when a background export completes"""
+        if row_count == 0:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            QMessageBox.information(self, "No Data", "No data found to export.")
+            return
+
+        self.open_exported_file(filename)
+        QMessageBox.information(
+            self,
+            "Success",
+            f"{row_count:,} rows exported successfully!\nSaved to: {os.path.basename(filename)}"
+        )
+
+    def on_export_cancelled(self, filename):
+        """The workbook is only saved at the end, but remove any partial file"""
+        if os.path.exists(filename):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+        print(f"Export cancelled: {os.path.basename(filename)}")
+
+    def ask_export_filename(self, filename_prefix):
+        """Ask where to save an export (defaults to the exports folder); None if cancelled"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suggested_filename = f"{filename_prefix}_{timestamp}.xlsx"
+        
+        # Default to exports folder, but let user choose
+        export_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exports")
+        os.makedirs(export_dir, exist_ok=True)
+        suggested_path = os.path.join(export_dir, suggested_filename)
+        
+        filename, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Export File",
+            suggested_path,
+            "Excel Files (*.xlsx);;All Files (*)"
+        )
+        
+        # If user cancels, abort
+        if not filename:
+            return None
+        
+        # Ensure .xlsx extension
+        if not filename.lower().endswith('.xlsx'):
+            filename += '.xlsx'
+        return filename
+
+    def open_exported_file(self, filename):
+        """Open a saved export with the platform's default application"""
+        try:
+            if platform.system() == "Windows":
+                os.startfile(filename)
+            elif platform.system() == "Darwin":  # macOS
+                subprocess.call(["open", filename])
+            else:  # Linux
+                subprocess.call(["xdg-open", filename])
+        except Exception as e:
+            print(f"Could not open file: {e}")
+
+    def write_green_header_workbook(self, filename, rows, headers, title=None):
+        """
+        Stream rows into a write-only workbook with the green header layout.
+        Column widths are estimated from the first EXPORT_WIDTH_SAMPLE rows and
+        cells share named styles. Returns the number of data rows written.
+        """
+        display_title = title or "CBCENTRA SCHOOL MANAGEMENT SYSTEM"
+        exported_by = (self.user_session or {}).get('full_name', 'Unknown')
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Data Export")
+        for style in self.export_named_styles():
+            wb.add_named_style(style)
+
+        def styled(value, style_name):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = style_name
+            return cell
+
+        # Widths must be set before the first row is written
+        rows = iter(rows)
+        sample = list(islice(rows, EXPORT_WIDTH_SAMPLE))
+        total_cols = len(headers)
+        last_col_letter = get_column_letter(total_cols)
+        for col_idx, header in enumerate(headers):
+            max_length = len(str(header))
+            for row in sample:
+                if col_idx < len(row) and row[col_idx] is not None:
+                    max_length = max(max_length, len(str(row[col_idx])))
+            ws.column_dimensions[get_column_letter(col_idx + 1)].width = min(max_length + 2, 50)
+        ws.freeze_panes = 'A5'
+
+        # === METADATA ROWS ===
+        ws.append([styled(display_title.upper(), 'export_title')])
+        ws.merged_cells.add(f'A1:{last_col_letter}1')
+        ws.append([styled(
+            f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Exported by: {exported_by}",
+            'export_subtitle'
+        )])
+        ws.merged_cells.add(f'A2:{last_col_letter}2')
+        ws.append([])
+
+        # === HEADERS (row 4) ===
+        ws.append([styled(header, 'export_header') for header in headers])
+
+        # === DATA ===
+        row_count = 0
+        for row in chain(sample, rows):
+            ws.append([styled(value, self.export_data_style(value)) for value in row])
+            row_count += 1
+
+        # === FOOTER ===
+        footer_row = 4 + row_count + 2
+        ws.append([])
+        ws.append([styled("Generated by CBCentra School Management System", 'export_footer')])
+        ws.merged_cells.add(f'A{footer_row}:{last_col_letter}{footer_row}')
+
+        wb.save(filename)
+        return row_count
+
+    @staticmethod
+    def export_data_style(value):
+        """Named style for a data cell: dates keep a readable number format"""
+        if isinstance(value, datetime):
+            return 'export_datetime'
+        if isinstance(value, date):
+            return 'export_date'
+        return 'export_data'
+
+    @staticmethod
+    def export_named_styles():
+        """Shared cell styles for Excel exports"""
+        thin_border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+
+        title_style = NamedStyle(name='export_title')
+        title_style.font = Font(name='Arial', size=16, bold=True, color='2E7D32')
+        title_style.alignment = Alignment(horizontal='center', vertical='center')
+
+        subtitle_style = NamedStyle(name='export_subtitle')
+        subtitle_style.font = Font(name='Arial', size=10, italic=True, color='555555')
+        subtitle_style.alignment = Alignment(horizontal='center', vertical='center')
+
+        header_style = NamedStyle(name='export_header')
+        header_style.font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
+        header_style.fill = PatternFill(start_color='2E7D32', end_color='2E7D32', fill_type='solid')  # Dark green
+        header_style.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        header_style.border = thin_border
+
+        data_style = NamedStyle(name='export_data')
+        data_style.font = Font(name='Arial', size=11)
+        data_style.alignment = Alignment(horizontal='left', vertical='center')
+        data_style.border = thin_border
+
+        # Without a number format dates would export as General serials (e.g. 43831)
+        date_style = NamedStyle(name='export_date', number_format='yyyy-mm-dd')
+        date_style.font = Font(name='Arial', size=11)
+        date_style.alignment = Alignment(horizontal='left', vertical='center')
+        date_style.border = thin_border
+
+        datetime_style = NamedStyle(name='export_datetime', number_format='yyyy-mm-dd hh:mm:ss')
+        datetime_style.font = Font(name='Arial', size=11)
+        datetime_style.alignment = Alignment(horizontal='left', vertical='center')
+        datetime_style.border = thin_border
+
+        footer_style = NamedStyle(name='export_footer')
+        footer_style.font = Font(name='Arial', size=9, italic=True, color='999999')
+        footer_style.alignment = Alignment(horizontal='center', vertical='center')
+
+        return [title_style, subtitle_style, header_style, data_style, date_style, datetime_style, footer_style]
 
     def get_school_info(self, school_id=None):
         """
@@ -1043,16 +1194,12 @@ class AuditBaseForm(QWidget):
         If no school_id, return default or first school
         """
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-    
+            # Served from the shared reference-data cache
+            schools = get_reference_cache().rows('schools')
             if school_id:
-                cursor.execute("SELECT school_name, address, phone, email FROM schools WHERE id = %s", (school_id,))
+                result = next((school[1:] for school in schools if str(school[0]) == str(school_id)), None)
             else:
-                cursor.execute("SELECT school_name, address, phone, email FROM schools ORDER by id LIMIT 1")
-    
-            result = cursor.fetchone()
-            conn.close()
+                result = schools[0][1:] if schools else None
     
             if result:
                 return {
@@ -8,9 +8,9 @@ from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
     QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
     QMessageBox, QFileDialog, QFrame, QGroupBox, QComboBox,
-    QDateEdit, QProgressDialog, QGridLayout, QTabWidget
+    QDateEdit, QProgressDialog, QGridLayout, QTabWidget, QTableView
 )
-from PySide6.QtGui import QFont
+from PySide6.QtGui import QFont, QColor
 from PySide6.QtCore import Qt, QDate
 import mysql.connector
 from mysql.connector import Error
@@ -20,6 +20,15 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.models import get_db_connection
 from utils.permissions import has_permission
 from ui.audit_base_form import AuditBaseForm
+from models.log_partitions import month_start
+from services.job_runner import get_job_runner
+from services.log_retention import LOG_ARCHIVE_DIR, purge_logs_before
+from services.audit_summary import summarize_audit_log
+from services.log_search import description_condition, user_condition
+from ui.table_models import DataTableModel, DataTableProxyModel, KeysetPageLoader, attach_data_table
+
+# Audit rows fetched per page as the log table is scrolled (older pages load on scroll)
+AUDIT_LOG_PAGE_SIZE = 1000
 
 
 
@@ -143,6 +152,13 @@ class AuditLogsForm(AuditBaseForm):
         stats_layout.addStretch()
         layout.addWidget(stats_frame)
 
+        # Breakdowns over the whole filtered range
+        breakdown_layout = QHBoxLayout()
+        self.table_counts_model = self.add_breakdown_table(breakdown_layout, "By Table", "Table")
+        self.user_counts_model = self.add_breakdown_table(breakdown_layout, "Most Active Users", "Username")
+        self.day_counts_model = self.add_breakdown_table(breakdown_layout, "By Day", "Date")
+        layout.addLayout(breakdown_layout)
+
         # Action Buttons
         action_layout = QHBoxLayout()
         export_btn = self.create_button("Export to CSV", self.colors['success'], self.export_logs)
@@ -159,13 +175,30 @@ class AuditLogsForm(AuditBaseForm):
 
         layout.addStretch()
 
+    def add_breakdown_table(self, layout, title, name_header):
+        """Small two-column (name, count) table for the summary tab"""
+        group = QGroupBox(title)
+        group.setFont(self.fonts['label'])
+        group_layout = QVBoxLayout(group)
+        view = QTableView()
+        model = DataTableModel([name_header, "Actions"], parent=self)
+        view.setModel(model)
+        view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        view.setAlternatingRowColors(True)
+        view.verticalHeader().setVisible(False)
+        view.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        view.setMinimumHeight(180)
+        group_layout.addWidget(view)
+        layout.addWidget(group)
+        return model
+
     def setup_table_tab(self):
         """Setup the audit log table tab"""
         layout = QVBoxLayout(self.table_tab)
         layout.setContentsMargins(10, 10, 10, 10)
 
         # Table
-        self.logs_table = QTableWidget()
+        self.logs_table = QTableView()
         self.setup_table()
         layout.addWidget(self.logs_table, 1)
 
@@ -173,12 +206,15 @@ class AuditLogsForm(AuditBaseForm):
         """Setup the audit logs table with description"""
         headers = ["ID", "Timestamp", "Username", "Action", "Description", "Table", "Record ID",
                    "IP Address", "User Agent"]
-        self.logs_table.setColumnCount(len(headers))
-        self.logs_table.setHorizontalHeaderLabels(headers)
+        self.logs_model = DataTableModel(headers, parent=self)
+        self.logs_model.set_role_handler(Qt.ItemDataRole.ToolTipRole, self.log_tooltip)
+        self.logs_model.set_role_handler(Qt.ItemDataRole.ForegroundRole, self.log_foreground)
+        self.logs_proxy = DataTableProxyModel(self)
+        attach_data_table(self.logs_table, self.logs_model, self.logs_proxy)
         self.logs_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.logs_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
         self.logs_table.setAlternatingRowColors(True)
-        self.logs_table.setSortingEnabled(True)
+        self.logs_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.logs_table.setFont(self.fonts['table'])
         
         header = self.logs_table.horizontalHeader()
@@ -250,97 +286,100 @@ class AuditLogsForm(AuditBaseForm):
                     return
                 self.cursor = self.db_connection.cursor(dictionary=True)
     
-            query = '''
+            conditions, params = self.log_filter_conditions()
+            query = f'''
                 SELECT al.id, al.created_at, u.username, al.action, al.description,
                        al.table_name, al.record_id,
                        al.ip_address, al.user_agent
                 FROM audit_log al
                 LEFT JOIN users u ON al.user_id = u.id
-                WHERE 1=1
+                WHERE 1=1{conditions}{{seek}}
+                ORDER BY al.created_at DESC, al.id DESC
             '''
-            params = []
-    
-            from_date = self.from_date.date().toString("yyyy-MM-dd")
-            to_date = self.to_date.date().addDays(1).toString("yyyy-MM-dd")
-            query += " AND al.created_at >= %s AND al.created_at < %s"
-            params.extend([from_date, to_date])
-    
-            action = self.action_combo.currentText()
-            if action != "All":
-                query += " AND al.action = %s"
-                params.append(action)
-    
-            table = self.table_combo.currentText()
-            if table != "All":
-                query += " AND al.table_name = %s"
-                params.append(table)
-    
-            username_filter = self.user_filter.text().strip()
-            if username_filter:
-                query += " AND u.username LIKE %s"
-                params.append(f"%{username_filter}%")
-    
-            desc_filter = self.description_filter.text().strip()
-            if desc_filter:
-                query += " AND al.description LIKE %s"
-                params.append(f"%{desc_filter}%")
-    
-            query += " ORDER BY al.created_at DESC LIMIT 1000"
-    
-            self.cursor.execute(query, params)
-            logs = self.cursor.fetchall()
-            self.update_logs_table(logs)
-            self.update_statistics(logs)
+
+            # Newest first; each older page seeks past the last (created_at, id)
+            # served, so walking deep into the log costs the same as page one
+            self.logs_loader = KeysetPageLoader(
+                self.cursor, query,
+                seek_columns=[("al.created_at", lambda log: log['created_at']),
+                              ("al.id", lambda log: log['id'])],
+                params=params,
+                page_size=AUDIT_LOG_PAGE_SIZE,
+                convert=lambda logs: (self.build_log_rows(logs), logs),
+                descending=True
+            )
+            self.logs_loader.load_into(self.logs_model)
+            self.load_statistics()
     
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to load audit logs: {e}")
 
-    def update_logs_table(self, logs):
-        """Update the audit logs table with new data and tooltips"""
-        # Clear existing content
-        self.logs_table.clearContents()  # Keeps headers, clears data
-        self.logs_table.setRowCount(len(logs))
-    
-        for row, log in enumerate(logs):
-            # Store original values for tooltips
-            original_description = log['description'] or 'N/A'
-            original_user_agent = log['user_agent'] or 'N/A'
-            original_username = log['username'] or 'System'
-            
-            row_data = [
-                str(log['id']),
-                log['created_at'].strftime('%Y-%m-%d %H:%M:%S') if log['created_at'] else 'N/A',
-                original_username,
+    def log_filter_conditions(self):
+        """WHERE conditions for the current filters, pushed down to indexed audit_log columns"""
+        from_date = self.from_date.date().toString("yyyy-MM-dd")
+        to_date = self.to_date.date().addDays(1).toString("yyyy-MM-dd")
+        sql = " AND al.created_at >= %s AND al.created_at < %s"
+        params = [from_date, to_date]
+
+        action = self.action_combo.currentText()
+        if action != "All":
+            sql += " AND al.action = %s"
+            params.append(action)
+
+        table = self.table_combo.currentText()
+        if table != "All":
+            sql += " AND al.table_name = %s"
+            params.append(table)
+
+        for condition, condition_params in (
+            user_condition(self.db_connection, "al.user_id", self.user_filter.text().strip()),
+            description_condition(self.db_connection, "al.description", self.description_filter.text().strip()),
+        ):
+            sql += condition
+            params.extend(condition_params)
+        return sql, params
+
+    def build_log_rows(self, logs):
+        """Convert audit log rows into table model rows"""
+        rows = []
+        for log in logs:
+            description = log['description'] or 'N/A'
+            user_agent = log['user_agent'] or 'N/A'
+            rows.append((
+                log['id'],
+                log['created_at'] or 'N/A',
+                log['username'] or 'System',
                 log['action'] or 'N/A',
-                original_description[:60] + '...' if len(original_description) > 60 else original_description,
+                description[:60] + '...' if len(description) > 60 else description,
                 log['table_name'] or 'N/A',
-                str(log['record_id']) if log['record_id'] else 'N/A',
+                log['record_id'] if log['record_id'] else 'N/A',
                 log['ip_address'] or 'N/A',
-                original_user_agent[:50] + '...' if len(original_user_agent) > 50 else original_user_agent
-            ]
-            
-            for col, data in enumerate(row_data):
-                item = QTableWidgetItem(str(data))
-                item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                
-                # Add comprehensive tooltips for all columns
-                tooltip = self.create_tooltip_for_column(col, log, original_description, original_user_agent, original_username)
-                if tooltip:
-                    item.setToolTip(tooltip)
-                
-                # Color coding for Action column
-                if col == 3:  # Action column
-                    if data == 'CREATE':
-                        item.setData(Qt.ItemDataRole.ForegroundRole, self.colors['success'])
-                    elif data == 'UPDATE':
-                        item.setData(Qt.ItemDataRole.ForegroundRole, self.colors['info'])
-                    elif data == 'DELETE':
-                        item.setData(Qt.ItemDataRole.ForegroundRole, self.colors['danger'])
-                
-                self.logs_table.setItem(row, col, item)
-    
-        # Optional: Resize columns to fit content after update
-        self.logs_table.resizeColumnsToContents()
+                user_agent[:50] + '...' if len(user_agent) > 50 else user_agent
+            ))
+        return rows
+
+    def update_logs_table(self, logs):
+        """Update the audit logs table with new data"""
+        self.logs_model.set_rows(self.build_log_rows(logs), logs)
+
+    def log_tooltip(self, row, col):
+        """Tooltip role for the logs model, built on demand for the hovered cell"""
+        log = self.logs_model.record_at(row)
+        return self.create_tooltip_for_column(
+            col, log, log['description'] or 'N/A', log['user_agent'] or 'N/A', log['username'] or 'System'
+        )
+
+    def log_foreground(self, row, col):
+        """Color coding for the Action column"""
+        if col != 3:
+            return None
+        action_colors = {
+            'CREATE': self.colors['success'],
+            'UPDATE': self.colors['info'],
+            'DELETE': self.colors['danger'],
+        }
+        color = action_colors.get(self.logs_model.value(row, col))
+        return QColor(color) if color else None
     
     def create_tooltip_for_column(self, col, log, original_description, original_user_agent, original_username):
         """Create detailed tooltips for each column"""
@@ -404,15 +443,39 @@ class AuditLogsForm(AuditBaseForm):
         
         return None
 
-    def update_statistics(self, logs):
-        total = len(logs)
-        create_count = sum(1 for log in logs if log['action'] == 'CREATE')
-        update_count = sum(1 for log in logs if log['action'] == 'UPDATE')
-        delete_count = sum(1 for log in logs if log['action'] == 'DELETE')
-        self.total_actions_label.setText(f"Total Actions: {total}")
-        self.create_count_label.setText(f"CREATE: {create_count}")
-        self.update_count_label.setText(f"UPDATE: {update_count}")
-        self.delete_count_label.setText(f"DELETE: {delete_count}")
+    def summary_filters(self):
+        """Current filters in the form summarize_audit_log expects"""
+        action = self.action_combo.currentText()
+        table = self.table_combo.currentText()
+        return {
+            'from_date': self.from_date.date().toPython(),
+            'to_date': self.to_date.date().addDays(1).toPython(),
+            'action': action if action != "All" else None,
+            'table_name': table if table != "All" else None,
+            'username': self.user_filter.text().strip(),
+            'description': self.description_filter.text().strip(),
+        }
+
+    def load_statistics(self):
+        """Count the whole filtered range on the server, in the background"""
+        filters = self.summary_filters()
+        self.run_call_async(
+            lambda conn: summarize_audit_log(conn, filters), key='summary',
+            on_result=self.update_statistics,
+            on_error=lambda error: print(f"⚠️ Failed to load audit statistics: {error}")
+        )
+
+    def update_statistics(self, summary):
+        by_action = dict(summary['by_action'])
+        self.total_actions_label.setText(f"Total Actions: {summary['total']}")
+        self.create_count_label.setText(f"CREATE: {by_action.get('CREATE', 0)}")
+        self.update_count_label.setText(f"UPDATE: {by_action.get('UPDATE', 0)}")
+        self.delete_count_label.setText(f"DELETE: {by_action.get('DELETE', 0)}")
+        self.table_counts_model.set_rows([(table or 'N/A', count) for table, count in summary['by_table']])
+        self.user_counts_model.set_rows(summary['by_user'])
+        # Latest day first
+        self.day_counts_model.set_rows([(day.strftime('%Y-%m-%d'), count)
+                                        for day, count in reversed(summary['by_day'])])
 
     def apply_filters(self):
         self.load_audit_logs()
@@ -438,58 +501,28 @@ class AuditLogsForm(AuditBaseForm):
                 LEFT JOIN users u ON al.user_id = u.id
                 WHERE 1=1
             '''
-            params = []
-            
             # Apply the same filters
-            from_date = self.from_date.date().toString("yyyy-MM-dd")
-            to_date = self.to_date.date().addDays(1).toString("yyyy-MM-dd")
-            query += " AND al.created_at >= %s AND al.created_at < %s"
-            params.extend([from_date, to_date])
-    
-            action = self.action_combo.currentText()
-            if action != "All":
-                query += " AND al.action = %s"
-                params.append(action)
-    
-            table = self.table_combo.currentText()
-            if table != "All":
-                query += " AND al.table_name = %s"
-                params.append(table)
-    
-            username_filter = self.user_filter.text().strip()
-            if username_filter:
-                query += " AND u.username LIKE %s"
-                params.append(f"%{username_filter}%")
-    
-            desc_filter = self.description_filter.text().strip()
-            if desc_filter:
-                query += " AND al.description LIKE %s"
-                params.append(f"%{desc_filter}%")
+            conditions, params = self.log_filter_conditions()
+            query += conditions
     
+            # Same filters, counted first so the jobs panel can show a total
+            count_query = "SELECT COUNT(*) " + query[query.index("FROM audit_log"):]
             query += " ORDER BY al.created_at DESC"
     
-            self.cursor.execute(query, params)
-            logs = self.cursor.fetchall()
-    
-            if not logs:
-                QMessageBox.information(self, "No Data", "No audit logs found to export.")
-                return
-    
-            # Prepare data for export - convert to list of lists
-            export_data = []
-            for log in logs:
-                row_data = [
-                    log['id'],
-                    log['created_at'].strftime('%Y-%m-%d %H:%M:%S') if log['created_at'] else 'N/A',
-                    log['username'] or 'System',
-                    log['action'] or 'N/A',
-                    log['description'] or 'N/A',
-                    log['table_name'] or 'N/A',
-                    str(log['record_id']) if log['record_id'] else 'N/A',
-                    log['ip_address'] or 'N/A',
-                    log['user_agent'] or 'N/A'
+            # Rows are converted as they stream from the server
+            def export_row(log):
+                log_id, created_at, username, action, description, table_name, record_id, ip, agent = log
+                return [
+                    log_id,
+                    created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else 'N/A',
+                    username or 'System',
+                    action or 'N/A',
+                    description or 'N/A',
+                    table_name or 'N/A',
+                    str(record_id) if record_id else 'N/A',
+                    ip or 'N/A',
+                    agent or 'N/A'
                 ]
-                export_data.append(row_data)
     
             # Define headers
             headers = [
@@ -505,12 +538,14 @@ class AuditLogsForm(AuditBaseForm):
                      f"Date Range: {self.from_date.date().toString('yyyy-MM-dd')} "
                      f"to {self.to_date.date().toString('yyyy-MM-dd')}")
     
-            # Use shared export method
-            self.export_with_green_header(
-                data=export_data,
+            # Use shared export method; runs in the background, streaming from the server
+            self.export_query_with_green_header(
+                query, params,
                 headers=headers,
                 filename_prefix="audit_logs_export",
-                title=title
+                title=title,
+                convert=export_row,
+                count_query=count_query
             )
     
         except Exception as e:
@@ -520,39 +555,35 @@ class AuditLogsForm(AuditBaseForm):
         if not has_permission(self.user_session, 'delete_audit_logs'):
             QMessageBox.warning(self, "Permission Denied", "You don't have permission to delete audit logs.")
             return
+        # Whole months are removed: everything before the month 365 days ago
+        cutoff = month_start(datetime.now() - timedelta(days=365))
         reply = QMessageBox.question(
             self, "Confirm Delete",
-            "Are you sure you want to delete audit logs older than 1 year?\n\n"
-            "This action is irreversible and affects compliance records!",
+            f"Are you sure you want to delete audit logs from before {cutoff:%B %Y}?\n\n"
+            f"Each month is archived to {LOG_ARCHIVE_DIR} (compressed CSV) before it is removed.\n"
+            "This affects compliance records! This action is irreversible!",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.No
         )
         if reply == QMessageBox.StandardButton.Yes:
-            try:
-                cutoff_date = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
-                query = "DELETE FROM audit_log WHERE created_at < %s"
-                self.cursor.execute(query, (cutoff_date,))
-                deleted_count = self.cursor.rowcount
-                self.db_connection.commit()
-
-                # Log this deletion action
-                audit_query = """
-                    INSERT INTO audit_log 
-                    (user_id, action, description, table_name, ip_address, user_agent)
-                    VALUES (%s, 'DELETE', %s, 'audit_log', %s, %s)
-                """
-                self.cursor.execute(audit_query, (
-                    self.user_session.get('user_id'),
-                    'Deleted old audit logs older than 1 year',
-                    self.user_session.get('ip_address', '127.0.0.1'),
-                    'System cleanup tool'
-                ))
-                self.db_connection.commit()
-
-                QMessageBox.information(self, "Success", f"Deleted {deleted_count} old audit logs!")
-                self.load_audit_logs()
-            except Error as e:
-                QMessageBox.critical(self, "Error", f"Failed to delete old logs: {e}")
+            get_job_runner().submit(
+                "Archive old audit logs",
+                lambda job: purge_logs_before('audit_log', cutoff, job=job),
+                on_done=lambda result: self.on_old_logs_deleted(cutoff, *result),
+                on_error=lambda message: QMessageBox.critical(self, "Error", f"Failed to delete old logs: {message}")
+            )
+
+    def on_old_logs_deleted(self, cutoff, files, deleted_count):
+        if self.user_session:
+            self.log_audit_action(
+                action="DELETE",
+                table_name="audit_log",
+                record_id=None,
+                description=f"Deleted {deleted_count} audit logs older than {cutoff:%Y-%m-%d} "
+                            f"(archived to {len(files)} file(s) in {LOG_ARCHIVE_DIR})"
+            )
+        QMessageBox.information(self, "Success", f"Archived and deleted {deleted_count} old audit logs!")
+        self.load_audit_logs()
 
     def refresh_data(self):
         #force
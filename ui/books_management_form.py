@@ -9,13 +9,15 @@ from PySide6.QtWidgets import (
     QMessageBox, QFileDialog, QScrollArea, QFrame, QSizePolicy,
     QGroupBox, QGridLayout, QSpacerItem, QComboBox, QFormLayout, 
     QTabWidget, QMenu, QCheckBox, QDateEdit, QTextEdit, QApplication,
-    QSplitter, QListWidget, QListWidgetItem, QProgressDialog, QSpinBox
+    QSplitter, QListWidget, QListWidgetItem, QProgressDialog, QSpinBox, QTableView
 )
 from PySide6.QtGui import QFont, QPalette, QIcon, QPixmap, QPainter, QAction, QColor, QTextCursor
 from PySide6.QtCore import Qt, Signal, QSize, QDate, QTimer, QDateTime
 import mysql.connector
 from mysql.connector import Error
 from ui.audit_base_form import AuditBaseForm
+from ui.table_models import DataTableModel, DataTableProxyModel, attach_data_table
+from ui.incremental_search import IncrementalSearch
 from models.models import get_db_connection
 from ui.borrowing_form import BorrowingManagementForm
 from fpdf import FPDF
@@ -46,7 +48,6 @@ class BooksManagementForm(AuditBaseForm):
         # Data storage
         self.books_data = []
         self.categories_data = []
-        self.filtered_books_data = []
         
         self.setup_ui()
         self.load_data()
@@ -162,8 +163,10 @@ class BooksManagementForm(AuditBaseForm):
         self.search_entry = QLineEdit()
         self.search_entry.setProperty("class", "form-control")
         self.search_entry.setPlaceholderText("Search by title, author, or ISBN...")
-        self.search_entry.textChanged.connect(self.search_books)
         search_layout.addWidget(self.search_entry)
+        # Debounced; the proxy narrows from its last result as the term grows
+        self.books_search = IncrementalSearch(self.search_entry, parent=self)
+        self.books_search.search_requested.connect(self.search_books)
         
         category_label = QLabel("Category:")
         category_label.setProperty("class", "field-label")
@@ -237,15 +240,15 @@ class BooksManagementForm(AuditBaseForm):
         books_layout.addLayout(action_layout)
         
         # Books table
-        self.books_table = QTableWidget()
-        self.books_table.setColumnCount(9)
-        self.books_table.setHorizontalHeaderLabels([
+        self.books_model = DataTableModel([
             "ID", "Title", "Author", "ISBN", "Category", "Year", "Quantity", "Available", "Status"
-        ])
+        ], parent=self)
+        self.books_proxy = DataTableProxyModel(self)
+        self.books_table = attach_data_table(QTableView(), self.books_model, self.books_proxy)
         self.books_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.books_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.books_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.books_table.cellClicked.connect(self.on_book_row_click)
+        self.books_table.clicked.connect(self.on_book_row_click)
         self.books_table.setAlternatingRowColors(True)
         self.books_table.setProperty("class", "data-table")
         
@@ -546,7 +549,6 @@ class BooksManagementForm(AuditBaseForm):
                 ORDER BY b.title
             """)
             self.books_data = self.cursor.fetchall()
-            self.filtered_books_data = self.books_data.copy()
             
             # Load categories
             self.cursor.execute("SELECT * FROM categories ORDER BY name")
@@ -564,28 +566,22 @@ class BooksManagementForm(AuditBaseForm):
             
     def update_books_table(self):
         """Update the books table with current data"""
-        self.books_table.setRowCount(0)
-        
-        for row, book in enumerate(self.filtered_books_data):
-            self.books_table.insertRow(row)
-            
+        rows = []
+        for book in self.books_data:
             # Calculate status
             available = book['available_quantity']
-            total = book['quantity']
             status = "Available" if available > 0 else "Checked Out"
-            
-            # Add items to table
-            self.books_table.setItem(row, 0, QTableWidgetItem(str(book['id'])))
-            self.books_table.setItem(row, 1, QTableWidgetItem(book['title']))
-            self.books_table.setItem(row, 2, QTableWidgetItem(book['author']))
-            self.books_table.setItem(row, 3, QTableWidgetItem(book['isbn']))
-            self.books_table.setItem(row, 4, QTableWidgetItem(book['category_name'] or "Uncategorized"))
-            self.books_table.setItem(row, 5, QTableWidgetItem(str(book['published_year'])))
-            self.books_table.setItem(row, 6, QTableWidgetItem(str(book['quantity'])))
-            self.books_table.setItem(row, 7, QTableWidgetItem(str(book['available_quantity'])))
-            self.books_table.setItem(row, 8, QTableWidgetItem(status))
-            
-        self.books_info_label.setText(f"Showing {len(self.filtered_books_data)} of {len(self.books_data)} books")
+            rows.append((
+                book['id'], book['title'], book['author'], book['isbn'],
+                book['category_name'] or "Uncategorized", book['published_year'],
+                book['quantity'], book['available_quantity'], status
+            ))
+        self.books_model.set_rows(rows, self.books_data)
+        self.update_books_info_label()
+
+    def update_books_info_label(self):
+        """Show how many books pass the current filters"""
+        self.books_info_label.setText(f"Showing {self.books_proxy.rowCount()} of {len(self.books_data)} books")
         
     def update_categories_table(self):
         """Update the categories table with current data"""
@@ -608,15 +604,15 @@ class BooksManagementForm(AuditBaseForm):
         for category in self.categories_data:
             self.category_filter.addItem(category['name'], category['id'])
             
-    def on_book_row_click(self, row, column):
+    def on_book_row_click(self, index):
         """Handle book row selection"""
-        if row < 0 or row >= len(self.filtered_books_data):
+        if not index.isValid():
             return
             
-        book_id = self.books_table.item(row, 0).text()
-        self.selected_book_id = int(book_id)
+        source_row = self.books_proxy.source_row(index.row())
+        self.selected_book_id = int(self.books_model.id_at(source_row))
         
-        book_title = self.books_table.item(row, 1).text()
+        book_title = self.books_model.value(source_row, 1)
         self.books_info_label.setText(f"Selected: {book_title}")
         
     def on_category_row_click(self, row, column):
@@ -631,55 +627,45 @@ class BooksManagementForm(AuditBaseForm):
         self.categories_info_label.setText(f"Selected: {category_name}")
         
     def search_books(self):
-        """Search books based on search text"""
-        search_text = self.search_entry.text().lower().strip()
-        
-        if not search_text:
-            self.filtered_books_data = self.books_data.copy()
-        else:
-            self.filtered_books_data = [
-                book for book in self.books_data
-                if (search_text in book['title'].lower() or 
-                    search_text in book['author'].lower() or 
-                    search_text in book['isbn'].lower())
-            ]
-            
-        self.update_books_table()
+        """Search books by title, author or ISBN (filters loaded rows, no re-query)"""
+        search_text = self.books_search.current_term()
+        self.books_proxy.set_filter_text(search_text, columns=[1, 2, 3])
+        self.update_books_info_label()
         
     def filter_books_by_category(self):
         """Filter books by selected category"""
-        category_name = self.category_filter.currentText()
-        
-        if category_name == "All Categories":
-            self.filtered_books_data = self.books_data.copy()
-        else:
-            self.filtered_books_data = [
-                book for book in self.books_data
-                if book['category_name'] == category_name
-            ]
-            
-        self.update_books_table()
+        self.apply_book_filters()
         
     def filter_books_by_status(self):
         """Filter books by availability status"""
+        self.apply_book_filters()
+
+    def apply_book_filters(self):
+        """Apply the category and status dropdowns as a row predicate on the proxy"""
+        category_name = self.category_filter.currentText()
         status = self.status_filter.currentText()
-        
-        if status == "All":
-            self.filtered_books_data = self.books_data.copy()
-        elif status == "Available":
-            self.filtered_books_data = [book for book in self.books_data if book['available_quantity'] > 0]
-        elif status == "Checked Out":
-            self.filtered_books_data = [book for book in self.books_data if book['available_quantity'] == 0]
-            
-        self.update_books_table()
+
+        def accepts(model, row):
+            book = model.record_at(row)
+            if category_name and category_name != "All Categories" and book['category_name'] != category_name:
+                return False
+            if status == "Available" and book['available_quantity'] <= 0:
+                return False
+            if status == "Checked Out" and book['available_quantity'] != 0:
+                return False
+            return True
+
+        self.books_proxy.set_row_predicate(accepts)
+        self.update_books_info_label()
         
     def clear_filters(self):
         """Clear all filters"""
         self.search_entry.clear()
         self.category_filter.setCurrentIndex(0)
         self.status_filter.setCurrentIndex(0)
-        self.filtered_books_data = self.books_data.copy()
-        self.update_books_table()
+        self.books_proxy.set_filter_text("")
+        self.books_proxy.set_row_predicate(None)
+        self.update_books_info_label()
         
     def add_book(self):
         """Open dialog to add a new book"""
@@ -695,11 +681,7 @@ class BooksManagementForm(AuditBaseForm):
             return
             
         # Find the selected book
-        selected_book = None
-        for book in self.books_data:
-            if book['id'] == self.selected_book_id:
-                selected_book = book
-                break
+        selected_book = self.books_model.record_for_id(self.selected_book_id)
                 
         if not selected_book:
             QMessageBox.warning(self, "Error", "Selected book not found.")
@@ -717,11 +699,7 @@ class BooksManagementForm(AuditBaseForm):
             return
             
         # Find the selected book
-        selected_book = None
-        for book in self.books_data:
-            if book['id'] == self.selected_book_id:
-                selected_book = book
-                break
+        selected_book = self.books_model.record_for_id(self.selected_book_id)
                 
         if not selected_book:
             QMessageBox.warning(self, "Error", "Selected book not found.")
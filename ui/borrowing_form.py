@@ -6,13 +6,15 @@ from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QDialog,
     QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
     QMessageBox, QComboBox, QDateEdit, QGroupBox, QFormLayout, QTabWidget,
-    QSpinBox, QTextEdit, QApplication
+    QSpinBox, QTextEdit, QApplication, QTableView
 )
 from PySide6.QtGui import QFont, QPalette, QIcon, QPixmap, QPainter, QAction, QColor, QTextCursor
 from PySide6.QtCore import Qt, Signal, QSize, QDate, QTimer, QDateTime
 import mysql.connector
 from mysql.connector import Error
 from ui.audit_base_form import AuditBaseForm
+from services.reference_cache import get_reference_cache
+from ui.table_models import DataTableModel, DataTableProxyModel, attach_data_table
 from models.models import get_db_connection
 
 class BorrowingManagementForm(AuditBaseForm):
@@ -31,7 +33,6 @@ class BorrowingManagementForm(AuditBaseForm):
         
         # Data storage
         self.borrowing_data = []
-        self.filtered_data = []
         self.books_data = []
         self.students_data = []
         self.teachers_data = []
@@ -136,16 +137,16 @@ class BorrowingManagementForm(AuditBaseForm):
         main_layout.addLayout(action_layout)
         
         # Borrowing records table
-        self.records_table = QTableWidget()
-        self.records_table.setColumnCount(10)
-        self.records_table.setHorizontalHeaderLabels([
+        self.records_model = DataTableModel([
             "ID", "Book", "Borrower", "Type", "Borrow Date", "Due Date", 
             "Return Date", "Status", "Days Left", "Fine"
-        ])
+        ], parent=self)
+        self.records_proxy = DataTableProxyModel(self)
+        self.records_table = attach_data_table(QTableView(), self.records_model, self.records_proxy)
         self.records_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.records_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.records_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.records_table.cellClicked.connect(self.on_record_row_click)
+        self.records_table.clicked.connect(self.on_record_row_click)
         self.records_table.setAlternatingRowColors(True)
         self.records_table.setProperty("class", "data-table")
         
@@ -186,7 +187,6 @@ class BorrowingManagementForm(AuditBaseForm):
                 ORDER BY br.borrow_date DESC
             """)
             self.borrowing_data = self.cursor.fetchall()
-            self.filtered_data = self.borrowing_data.copy()
     
             # Load available books - DEBUGGING: Add more details and ensure books exist
             self.cursor.execute("""
@@ -210,24 +210,12 @@ class BorrowingManagementForm(AuditBaseForm):
                 for book in all_books:
                     print(f"  - {book['title']} (Available: {book['available_quantity']}/{book['quantity']})")
             
-            # Load ACTIVE students only (using is_active column)
-            self.cursor.execute("""
-                SELECT id, first_name, surname 
-                FROM students 
-                WHERE is_active = TRUE
-                ORDER BY first_name, surname
-            """)
-            self.students_data = self.cursor.fetchall()
+            # ACTIVE students and teachers come from the shared reference-data cache
+            by_name = lambda person: ((person['first_name'] or '').lower(), (person['surname'] or '').lower())
+            self.students_data = sorted(get_reference_cache().records('active_students'), key=by_name)
             print(f"DEBUG: Found {len(self.students_data)} active students")
             
-            # Load ACTIVE teachers only (using is_active column)
-            self.cursor.execute("""
-                SELECT id, first_name, surname 
-                FROM teachers 
-                WHERE is_active = TRUE
-                ORDER BY first_name, surname
-            """)
-            self.teachers_data = self.cursor.fetchall()
+            self.teachers_data = sorted(get_reference_cache().records('active_teachers'), key=by_name)
             print(f"DEBUG: Found {len(self.teachers_data)} active teachers")
             
             # Update UI
@@ -241,72 +229,64 @@ class BorrowingManagementForm(AuditBaseForm):
             
     def update_records_table(self):
         """Update the records table with current data"""
-        self.records_table.setRowCount(0)
-        
-        for row, record in enumerate(self.filtered_data):
-            self.records_table.insertRow(row)
-            
+        rows = []
+        for record in self.borrowing_data:
             # Format borrower name
             borrower_name = f"{record['first_name']} {record['last_name']}" if record['first_name'] else "Unknown"
-            
-            # Add items to table
-            self.records_table.setItem(row, 0, QTableWidgetItem(str(record['id'])))
-            self.records_table.setItem(row, 1, QTableWidgetItem(f"{record['book_title']} ({record['book_isbn']})"))
-            self.records_table.setItem(row, 2, QTableWidgetItem(borrower_name))
-            self.records_table.setItem(row, 3, QTableWidgetItem(record['borrower_type']))
-            self.records_table.setItem(row, 4, QTableWidgetItem(str(record['borrow_date'])))
-            self.records_table.setItem(row, 5, QTableWidgetItem(str(record['due_date'])))
-            self.records_table.setItem(row, 6, QTableWidgetItem(str(record['return_date'] or "Not returned")))
-            self.records_table.setItem(row, 7, QTableWidgetItem(record['status']))
-            self.records_table.setItem(row, 8, QTableWidgetItem(str(record['days_left'])))
-            self.records_table.setItem(row, 9, QTableWidgetItem(str(record['fine_amount'])))
-            
-        self.info_label.setText(f"Showing {len(self.filtered_data)} of {len(self.borrowing_data)} records")
-        
-    def on_record_row_click(self, row, column):
+            rows.append((
+                record['id'],
+                f"{record['book_title']} ({record['book_isbn']})",
+                borrower_name,
+                record['borrower_type'],
+                record['borrow_date'],
+                record['due_date'],
+                record['return_date'] or "Not returned",
+                record['status'],
+                record['days_left'],
+                record['fine_amount']
+            ))
+        self.records_model.set_rows(rows, self.borrowing_data)
+        self.update_records_info_label()
+
+    def update_records_info_label(self):
+        """Show how many records pass the current filters"""
+        self.info_label.setText(f"Showing {self.records_proxy.rowCount()} of {len(self.borrowing_data)} records")
+        
+    def on_record_row_click(self, index):
         """Handle record row selection"""
-        if row < 0 or row >= len(self.filtered_data):
+        if not index.isValid():
             return
             
-        record_id = self.records_table.item(row, 0).text()
-        self.selected_record_id = int(record_id)
+        source_row = self.records_proxy.source_row(index.row())
+        self.selected_record_id = int(self.records_model.id_at(source_row))
         
-        book_title = self.records_table.item(row, 1).text()
+        book_title = self.records_model.value(source_row, 1)
         self.info_label.setText(f"Selected: {book_title}")
         
     def search_records(self):
-        """Search records based on search text"""
-        search_text = self.search_entry.text().lower().strip()
-        
-        if not search_text:
-            self.filtered_data = self.borrowing_data.copy()
-        else:
-            self.filtered_data = [
-                record for record in self.borrowing_data
-                if (search_text in record['book_title'].lower() or 
-                    search_text in (record['first_name'] or '').lower() or 
-                    search_text in (record['last_name'] or '').lower())
-            ]
-            
-        self.update_records_table()
+        """Search records by book title or borrower name (filters loaded rows, no re-query)"""
+        search_text = self.search_entry.text().strip()
+        self.records_proxy.set_filter_text(search_text, columns=[1, 2])
+        self.update_records_info_label()
         
     def filter_by_status(self):
         """Filter records by status"""
         status = self.status_filter.currentText()
         
         if status == "All":
-            self.filtered_data = self.borrowing_data.copy()
+            self.records_proxy.set_row_predicate(None)
         else:
-            self.filtered_data = [record for record in self.borrowing_data if record['status'] == status]
+            self.records_proxy.set_row_predicate(lambda model, row: model.value(row, 7) == status)
             
-        self.update_records_table()
+        self.update_records_info_label()
         
     def clear_filters(self):
         """Clear all filters"""
         self.search_entry.clear()
         self.status_filter.setCurrentIndex(0)
-        self.filtered_data = self.borrowing_data.copy()
-        self.update_records_table()
+        self.records_proxy.set_filter_text("")
+        self.records_proxy.set_row_predicate(None)
+        self.update_records_info_label()
         
     def borrow_book(self):
         """Open dialog to borrow a new book"""
@@ -323,11 +303,7 @@ class BorrowingManagementForm(AuditBaseForm):
             return
             
         # Find the selected record
-        selected_record = None
-        for record in self.borrowing_data:
-            if record['id'] == self.selected_record_id:
-                selected_record = record
-                break
+        selected_record = self.records_model.record_for_id(self.selected_record_id)
                 
         if not selected_record:
             QMessageBox.warning(self, "Error", "Selected record not found.")
@@ -373,11 +349,7 @@ class BorrowingManagementForm(AuditBaseForm):
             return
             
         # Find the selected record
-        selected_record = None
-        for record in self.borrowing_data:
-            if record['id'] == self.selected_record_id:
-                selected_record = record
-                break
+        selected_record = self.records_model.record_for_id(self.selected_record_id)
                 
         if not selected_record:
             QMessageBox.warning(self, "Error", "Selected record not found.")
@@ -419,11 +391,7 @@ class BorrowingManagementForm(AuditBaseForm):
             return
             
         # Find the selected record
-        selected_record = None
-        for record in self.borrowing_data:
-            if record['id'] == self.selected_record_id:
-                selected_record = record
-                break
+        selected_record = self.records_model.record_for_id(self.selected_record_id)
                 
         if not selected_record:
             QMessageBox.warning(self, "Error", "Selected record not found.")
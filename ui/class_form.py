@@ -20,150 +20,31 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.models import get_db_connection
 from ui.academic_years_form import AcademicYearsForm
 from ui.audit_base_form import AuditBaseForm
+from ui.searchable_combo import SearchableComboBox
 from ui.terms_form import TermsForm
 from ui.student_class_assignment_form import StudentClassAssignmentForm
 from utils.permissions import has_permission
+from ui.incremental_search import IncrementalSearch
+from services.reference_cache import get_reference_cache
+from services.change_feed import get_change_feed
 
-
-
-class SearchableComboBox(QComboBox):
-    """Enhanced ComboBox with real-time search functionality"""
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setEditable(True)
-        self.original_data = []  # Store (display_text, value) pairs
-        self.filtered_data = []  # Store currently filtered data
-        
-        # Configure line edit for better UX
-        line_edit = self.lineEdit()
-        line_edit.textEdited.connect(self.filter_values)
-        line_edit.returnPressed.connect(self.on_return_pressed)
-        line_edit.setPlaceholderText("Type to search...")
-        
-        # Set properties for better dropdown behavior
-        self.setMaxVisibleItems(10)
-        self.setInsertPolicy(QComboBox.InsertPolicy.NoInsert)
-        
-        # Connect signals for better interaction
-        self.activated.connect(self.on_item_selected)
-        
-    def setData(self, data_list):
-        """Set the data for the combobox - list of (display_text, value) tuples"""
-        self.original_data = data_list.copy()
-        self.filtered_data = data_list.copy()
-        self.refresh_items()
-        
-    def refresh_items(self):
-        """Refresh combobox items from filtered data"""
-        current_text = self.lineEdit().text()
-        self.clear()
-        
-        for display, value in self.filtered_data:
-            self.addItem(display, value)
-        
-        # Restore the text without triggering signals
-        self.blockSignals(True)
-        self.lineEdit().setText(current_text)
-        self.blockSignals(False)
-        
-    def filter_values(self, text):
-        """Filter values based on typed text with real-time updates"""
-        if not text.strip():
-            # Show all items when text is empty
-            self.filtered_data = self.original_data.copy()
-            self.refresh_items()
-            if not self.view().isVisible():
-                self.showPopup()
-            return
-            
-        # Filter data based on search text
-        search_text = text.lower().strip()
-        self.filtered_data = [
-            (display, value) for display, value in self.original_data 
-            if search_text in display.lower()
-        ]
-        
-        # Update dropdown items
-        self.refresh_items()
-        
-        # Show dropdown if we have matches
-        if self.filtered_data and not self.view().isVisible():
-            self.showPopup()
-        elif not self.filtered_data and self.view().isVisible():
-            self.hidePopup()
-        
-    def on_return_pressed(self):
-        """Handle return pressed to select the first matching item"""
-        if self.count() > 0:
-            self.setCurrentIndex(0)
-            self.on_item_selected(0)
-            self.hidePopup()
-        
-    def on_item_selected(self, index):
-        """Handle item selection"""
-        if index >= 0:
-            selected_text = self.itemText(index)
-            self.lineEdit().setText(selected_text)
-            self.hidePopup()
-    
-    def getCurrentValue(self):
-        """Get the current selected value (not display text)"""
-        current_text = self.lineEdit().text()
-        
-        # First try to find exact match in filtered data
-        for display, value in self.filtered_data:
-            if display == current_text:
-                return value
-        
-        # Then try to find exact match in original data
-        for display, value in self.original_data:
-            if display == current_text:
-                return value
-                
-        # If no exact match and we have a current index, use that
-        current_index = self.currentIndex()
-        if current_index >= 0 and current_index < self.count():
-            return self.itemData(current_index)
-            
-        return None
-    
-    def setCurrentValue(self, value):
-        """Set current selection by value"""
-        for i in range(self.count()):
-            if self.itemData(i) == value:
-                self.setCurrentIndex(i)
-                return True
-        return False
-    
-    def setCurrentTextValue(self, text):
-        """Set current selection by display text"""
-        for display, value in self.original_data:
-            if display == text:
-                self.lineEdit().setText(text)
-                self.setCurrentValue(value)
-                return True
-        return False
-    
-    def keyPressEvent(self, event):
-        """Handle key press events for better navigation"""
-        if event.key() == Qt.Key.Key_Down and not self.view().isVisible():
-            self.showPopup()
-        elif event.key() == Qt.Key.Key_Escape:
-            self.hidePopup()
-        else:
-            super().keyPressEvent(event)
-    
-    def focusInEvent(self, event):
-        """Handle focus in event"""
-        super().focusInEvent(event)
-        # Select all text when focused for easy replacement
-        self.lineEdit().selectAll()
-    
-    def showPopup(self):
-        """Override to ensure proper popup behavior"""
-        if self.count() > 0:
-            super().showPopup()
-
+# Class list with teacher and term; {where} takes an optional search filter
+CLASS_LIST_QUERY = '''
+    SELECT 
+        c.id, 
+        c.class_name, 
+        c.stream, 
+        c.level, 
+        t.full_name as teacher_name,
+        CONCAT(tr.term_name, COALESCE(CONCAT(' (', ay.year_name, ')'), '')) as term_info,
+        CASE WHEN c.is_active = 1 THEN 'Active' ELSE 'Inactive' END as status
+    FROM classes c
+    LEFT JOIN teachers t ON c.class_teacher_id = t.id
+    LEFT JOIN terms tr ON c.term_id = tr.id
+    LEFT JOIN academic_years ay ON tr.academic_year_id = ay.id
+    {where}
+    ORDER BY c.class_name, c.stream
+'''
 
 
 class ClassesForm(AuditBaseForm):
@@ -186,6 +67,17 @@ class ClassesForm(AuditBaseForm):
         self.load_data()
         self.apply_permissions()
         
+        # Pick up changes made in other forms or on other machines
+        get_change_feed().subscribe(('classes', 'teachers', 'terms', 'academic_years'),
+                                    self.on_tables_changed, owner=self)
+        
+    def on_tables_changed(self, tables):
+        """Change feed callback: reload the teacher list and the class table"""
+        if 'teachers' in tables:
+            self.refresh_teachers()
+        # Re-runs the current search (or loads all classes)
+        self.class_search.refresh()
+        
     def setup_ui(self):
         """Setup the main UI with tabs - leveraging AuditBaseForm styling"""
         main_layout = QVBoxLayout(self)
@@ -460,8 +352,12 @@ class ClassesForm(AuditBaseForm):
         self.search_entry = QLineEdit()
         self.search_entry.setFont(self.fonts['entry'])
         self.search_entry.setPlaceholderText("Enter class name, stream, or teacher...")
-        self.search_entry.textChanged.connect(self.on_search_changed)
         self.search_entry.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+        self.class_search = IncrementalSearch(self.search_entry, fetch=self.fetch_classes,
+                                              match=self.class_matches, parent=self)
+        self.class_search.results_ready.connect(self.on_class_search_results)
+        self.class_search.search_failed.connect(
+            lambda error: QMessageBox.critical(self, "Database Error", f"Failed to search classes: {error}"))
         
         # Search button with icon
         search_btn = QPushButton("Search")
@@ -607,19 +503,11 @@ class ClassesForm(AuditBaseForm):
     def load_teachers(self):
         """Load teachers for dropdown with enhanced formatting"""
         try:
-            self._ensure_connection()
-            query = '''
-                SELECT id, full_name, position, teacher_id_code, email, day_phone
-                FROM teachers 
-                WHERE is_active = 1 
-                ORDER BY full_name
-            '''
-            self.cursor.execute(query)
-            teachers = self.cursor.fetchall()
+            teachers = get_reference_cache().rows('active_teachers')
             
             # Prepare data for searchable combo box with better formatting
             teacher_data = [("-- Select Teacher --", None)]
-            for teacher_id, full_name, position, teacher_code, email, day_phone in teachers:
+            for teacher_id, full_name, _, _, position, teacher_code in teachers:
                 # Create rich display text for better searchability
                 display_parts = [full_name]
                 
@@ -632,7 +520,7 @@ class ClassesForm(AuditBaseForm):
                 display_text = " ".join(display_parts)
                 teacher_data.append((display_text, teacher_id))
             
-            self.class_teacher.setData(teacher_data)
+            self.class_teacher.setData(teacher_data, shared_name="active_teachers")
             
             # Set placeholder text for better UX
             self.class_teacher.lineEdit().setPlaceholderText("Type teacher name or code...")
@@ -644,15 +532,8 @@ class ClassesForm(AuditBaseForm):
     def load_terms(self):
         """Load terms for dropdown"""
         try:
-            self._ensure_connection()
-            self.cursor.execute('''
-                SELECT t.id, t.term_name, ay.year_name
-                FROM terms t
-                LEFT JOIN academic_years ay ON t.academic_year_id = ay.id
-                WHERE t.is_current = 1
-                ORDER BY t.start_date DESC
-            ''')
-            terms = self.cursor.fetchall()
+            # Current terms, newest first (the cached list is ordered by start_date DESC)
+            terms = [term[:3] for term in get_reference_cache().rows('terms') if term[3]]
             
             self.term_data = []
             self.term.clear()
@@ -672,24 +553,12 @@ class ClassesForm(AuditBaseForm):
         """Load classes from database"""
         try:
             self._ensure_connection()
-            query = '''
-                SELECT 
-                    c.id, 
-                    c.class_name, 
-                    c.stream, 
-                    c.level, 
-                    t.full_name as teacher_name,
-                    CONCAT(tr.term_name, COALESCE(CONCAT(' (', ay.year_name, ')'), '')) as term_info,
-                    CASE WHEN c.is_active = 1 THEN 'Active' ELSE 'Inactive' END as status
-                FROM classes c
-                LEFT JOIN teachers t ON c.class_teacher_id = t.id
-                LEFT JOIN terms tr ON c.term_id = tr.id
-                LEFT JOIN academic_years ay ON tr.academic_year_id = ay.id
-                ORDER BY c.class_name, c.stream
-            '''
-            self.cursor.execute(query)
+            self.cursor.execute(CLASS_LIST_QUERY.format(where=""))
             classes = self.cursor.fetchall()
             self.update_class_table(classes)
+            # Cached search results may be stale now
+            if hasattr(self, 'class_search'):
+                self.class_search.invalidate()
             
         except Error as e:
             QMessageBox.critical(self, "Database Error", f"Failed to load classes: {e}")
@@ -717,58 +586,42 @@ class ClassesForm(AuditBaseForm):
         active_classes = len([cls for cls in classes if cls[6] == "Active"])
         self.table_info.setText(f"Total classes: {total_classes} (Active: {active_classes})")
         
-    def on_search_changed(self):
-        """Handle search text changes with delay"""
-        if hasattr(self, 'search_timer'):
-            self.search_timer.stop()
-        
-        self.search_timer = QTimer()
-        self.search_timer.timeout.connect(self.search_classes)
-        self.search_timer.setSingleShot(True)
-        self.search_timer.start(300)
-        
+    @staticmethod
+    def fetch_classes(connection, search_term):
+        """Classes matching search_term (all if empty); runs on the query executor"""
+        cursor = connection.cursor()
+        try:
+            if not search_term:
+                cursor.execute(CLASS_LIST_QUERY.format(where=""))
+            else:
+                search_pattern = f"%{search_term}%"
+                cursor.execute(CLASS_LIST_QUERY.format(where='''
+                    WHERE (
+                        c.class_name LIKE %s OR 
+                        c.stream LIKE %s OR 
+                        c.level LIKE %s OR
+                        t.full_name LIKE %s
+                    )'''), (search_pattern, search_pattern, search_pattern, search_pattern))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def class_matches(cls, search_term):
+        """In-memory version of the search filter (name, stream, level, teacher)"""
+        return any(search_term in str(value).lower() for value in cls[1:5] if value is not None)
+
+    def on_class_search_results(self, search_term, classes):
+        self.update_class_table(classes)
+
     def search_classes(self):
         """Search classes by name, stream, or teacher"""
-        search_term = self.search_entry.text().strip()
-        if not search_term:
-            self.load_classes()
-            return
-            
-        try:
-            self._ensure_connection()
-            query = '''
-                SELECT 
-                    c.id, 
-                    c.class_name, 
-                    c.stream, 
-                    c.level, 
-                    t.full_name as teacher_name,
-                    CONCAT(tr.term_name, COALESCE(CONCAT(' (', ay.year_name, ')'), '')) as term_info,
-                    CASE WHEN c.is_active = 1 THEN 'Active' ELSE 'Inactive' END as status
-                FROM classes c
-                LEFT JOIN teachers t ON c.class_teacher_id = t.id
-                LEFT JOIN terms tr ON c.term_id = tr.id
-                LEFT JOIN academic_years ay ON tr.academic_year_id = ay.id
-                WHERE (
-                    c.class_name LIKE %s OR 
-                    c.stream LIKE %s OR 
-                    c.level LIKE %s OR
-                    t.full_name LIKE %s
-                )
-                ORDER by c.class_name, c.stream
-            '''
-            search_pattern = f"%{search_term}%"
-            self.cursor.execute(query, (search_pattern, search_pattern, search_pattern, search_pattern))
-            classes = self.cursor.fetchall()
-            self.update_class_table(classes)
-            
-        except Error as e:
-            QMessageBox.critical(self, "Database Error", f"Failed to search classes: {e}")
+        self.class_search.refresh()
             
     def clear_search(self):
         """Clear search and reload all classes"""
         self.search_entry.clear()
-        self.load_classes()
+        self.class_search.refresh()
         
     def on_class_select(self):
         """Handle class selection from table"""
@@ -9,9 +9,14 @@ from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QIcon, QFont
 import os
 from services.email_service import EmailService, EmailTemplates
+from services.recipient_resolver import (
+    RecipientResolver, RECIPIENT_TYPES, recipient_kind, valid_email,
+    AUDIENCE_ALL, AUDIENCE_STUDENTS, AUDIENCE_PARENTS
+)
 # In your email_composer_dialog.py
 from ui.spam_checker_dialog import SpamCheckerDialog
 
+
 class EmailComposerDialog(QDialog):
     # Add these constants
     MAX_ATTACHMENTS = 5  # Maximum number of attachments
@@ -27,6 +32,8 @@ class EmailComposerDialog(QDialog):
         self.preset_subject = subject
         self.preset_body = body
         self.attachments = []
+        # Address lookups are cached for as long as the dialog is open
+        self.resolver = RecipientResolver(db_connection)
         
         self.setWindowTitle("Compose Email")
         self.setMinimumSize(1000, 700)
@@ -62,13 +69,31 @@ class EmailComposerDialog(QDialog):
         type_layout.addWidget(QLabel("Send to:"))
         
         self.recipient_type_combo = QComboBox()
-        self.recipient_type_combo.addItems(["Students", "Teachers", "Parents", "Custom"])
+        # "Custom" addresses are typed in, not looked up
+        self.recipient_type_combo.addItems(list(RECIPIENT_TYPES) + ["Custom"])
+        for i in range(self.recipient_type_combo.count()):
+            if self.recipient_type and recipient_kind(self.recipient_type_combo.itemText(i)) == recipient_kind(self.recipient_type):
+                self.recipient_type_combo.setCurrentIndex(i)
         self.recipient_type_combo.currentTextChanged.connect(self.on_recipient_type_changed)
         type_layout.addWidget(self.recipient_type_combo)
         
         type_layout.addStretch()
         recipient_layout.addLayout(type_layout)
         
+        # For students, classes and grades: the students, their parents or both
+        audience_layout = QHBoxLayout()
+        audience_layout.addWidget(QLabel("Include:"))
+        
+        self.audience_combo = QComboBox()
+        self.audience_combo.addItem("Students and parents", AUDIENCE_ALL)
+        self.audience_combo.addItem("Students only", AUDIENCE_STUDENTS)
+        self.audience_combo.addItem("Parents only", AUDIENCE_PARENTS)
+        self.audience_combo.currentIndexChanged.connect(self.on_audience_changed)
+        audience_layout.addWidget(self.audience_combo)
+        
+        audience_layout.addStretch()
+        recipient_layout.addLayout(audience_layout)
+        
         # Recipient list
         self.recipient_list = QListWidget()
         self.recipient_list.setSelectionMode(QListWidget.MultiSelection)
@@ -117,6 +142,10 @@ class EmailComposerDialog(QDialog):
         
         self.body_edit = QTextEdit()
         self.body_edit.setPlaceholderText("Type your message here...")
+        self.body_edit.setToolTip(
+            "Personalize with {{name}}, {{student_name}} or {{email}}: "
+            "each recipient gets their own copy"
+        )
         self.body_edit.setMinimumHeight(200)
         if self.preset_body:
             self.body_edit.setHtml(self.preset_body)
@@ -222,21 +251,16 @@ class EmailComposerDialog(QDialog):
     def load_recipients(self):
         """Load recipients based on type"""
         try:
-            email_service = EmailService(self.db_connection)
-            
             # Clear existing items
             self.recipient_list.clear()
             
             recipient_type = self.recipient_type_combo.currentText().lower()
+            self.audience_combo.setEnabled(recipient_type in ("students", "classes", "grades"))
             
-            if recipient_type == "students":
-                self.load_students()
-            elif recipient_type == "teachers":
-                self.load_teachers()
-            elif recipient_type == "parents":
-                self.load_parents()
-            elif recipient_type == "custom":
+            if recipient_type == "custom":
                 self.load_custom_emails()
+            else:
+                self.load_entries(RECIPIENT_TYPES[self.recipient_type_combo.currentText()])
                 
             # Preselect if recipient IDs were provided
             if self.recipient_ids and self.recipient_type:
@@ -245,125 +269,22 @@ class EmailComposerDialog(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to load recipients: {str(e)}")
     
-    def load_teachers(self):
-        """Load teachers from database"""
+    def load_entries(self, kind):
+        """List the teachers, students, parents, classes or grades that have email addresses"""
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT id, first_name, surname, email 
-                FROM teachers 
-                WHERE is_active = TRUE AND email IS NOT NULL
-                ORDER BY first_name, surname
-            """)
-            
-            teachers = cursor.fetchall()
-            
-            for teacher in teachers:
-                display_text = f"{teacher['first_name']} {teacher['surname']} - {teacher['email']}"
-                
-                item = QListWidgetItem(display_text)
+            for scope_id, label, count in self.resolver.entries(kind, self.current_audience()):
+                addresses = "1 address" if count == 1 else f"{count} addresses"
+                item = QListWidgetItem(f"{label} ({addresses})")
                 item.setData(Qt.UserRole, {
-                    'id': teacher['id'],
-                    'type': 'teacher',
-                    'emails': [teacher['email']] if teacher['email'] else []
+                    'id': scope_id,
+                    'type': kind,
+                    'name': label
                 })
                 self.recipient_list.addItem(item)
                 
         except Exception as e:
-            print(f"Error loading teachers: {e}")
-            QMessageBox.warning(self, "Error", f"Failed to load teachers: {str(e)}")
-    
-    def load_students(self):
-        """Load students from database using your existing schema"""
-        try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT s.id, s.full_name, s.email, 
-                       COALESCE(GROUP_CONCAT(DISTINCT p.email SEPARATOR ', '), '') as parent_emails
-                FROM students s
-                LEFT JOIN student_parent sp ON s.id = sp.student_id
-                LEFT JOIN parents p ON sp.parent_id = p.id
-                WHERE s.is_active = TRUE AND (s.email IS NOT NULL OR p.email IS NOT NULL)
-                GROUP BY s.id
-                ORDER BY s.full_name
-            """)
-            
-            students = cursor.fetchall()
-            
-            for student in students:
-                # Create a more readable display
-                display_text = student['full_name']
-                emails = []
-                
-                if student['email']:
-                    emails.append(f"Student: {student['email']}")
-                
-                # Now parent_emails will always be a string (empty if no parents)
-                parent_emails = student['parent_emails']
-                if parent_emails:  # This will be empty string if no parent emails
-                    parent_email_list = parent_emails.split(', ')
-                    for parent_email in parent_email_list:
-                        if parent_email and parent_email != 'None' and parent_email != 'NULL':
-                            emails.append(f"Parent: {parent_email}")
-                
-                if emails:
-                    display_text += f" ({'; '.join(emails)})"
-                
-                item = QListWidgetItem(display_text)
-                
-                # Build email list
-                email_list = []
-                if student['email']:
-                    email_list.append(student['email'])
-                
-                if parent_emails:  # Process parent emails
-                    for email in parent_emails.split(', '):
-                        if email and email != 'None' and email != 'NULL':
-                            email_list.append(email)
-                
-                item.setData(Qt.UserRole, {
-                    'id': student['id'],
-                    'type': 'student',
-                    'emails': email_list
-                })
-                self.recipient_list.addItem(item)
-                
-        except Exception as e:
-            print(f"Error loading students: {e}")
-            QMessageBox.warning(self, "Error", f"Failed to load students: {str(e)}")
-    
-    def load_parents(self):
-        """Load parents from database using your existing student_parent table"""
-        try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT p.id, p.full_name, p.email, 
-                       GROUP_CONCAT(s.full_name SEPARATOR ', ') as student_names
-                FROM parents p
-                LEFT JOIN student_parent sp ON p.id = sp.parent_id
-                LEFT JOIN students s ON sp.student_id = s.id
-                WHERE p.is_active = TRUE AND p.email IS NOT NULL
-                GROUP BY p.id
-                ORDER BY p.full_name
-            """)
-            
-            parents = cursor.fetchall()
-            
-            for parent in parents:
-                student_info = f" (Parent of {parent['student_names']})" if parent['student_names'] else ""
-                display_text = f"{parent['full_name']}{student_info} - {parent['email']}"
-                
-                item = QListWidgetItem(display_text)
-                item.setData(Qt.UserRole, {
-                    'id': parent['id'],
-                    'type': 'parent',
-                    'emails': [parent['email']] if parent['email'] else []
-                })
-                self.recipient_list.addItem(item)
-                
-        except Exception as e:
-            print(f"Error loading parents: {e}")
-            QMessageBox.warning(self, "Error", f"Failed to load parents: {str(e)}")
+            print(f"Error loading {kind} recipients: {e}")
+            QMessageBox.warning(self, "Error", f"Failed to load recipients: {str(e)}")
     
     def load_custom_emails(self):
         """Load custom email entry"""
@@ -376,11 +297,12 @@ class EmailComposerDialog(QDialog):
     
     def select_preset_recipients(self):
         """Select recipients based on preset IDs"""
+        preset_kind = recipient_kind(self.recipient_type)
         for i in range(self.recipient_list.count()):
             item = self.recipient_list.item(i)
             item_data = item.data(Qt.UserRole)
             
-            if (item_data.get('type') == self.recipient_type and 
+            if (item_data.get('type') == preset_kind and 
                 item_data.get('id') in self.recipient_ids):
                 item.setSelected(True)
         
@@ -390,15 +312,25 @@ class EmailComposerDialog(QDialog):
         """Handle recipient type change"""
         self.load_recipients()
     
+    def on_audience_changed(self):
+        """Recount the listed recipients, keeping the selection"""
+        selected = {(item.data(Qt.UserRole).get('type'), item.data(Qt.UserRole).get('id'))
+                    for item in self.recipient_list.selectedItems()}
+        self.load_recipients()
+        for i in range(self.recipient_list.count()):
+            item = self.recipient_list.item(i)
+            if (item.data(Qt.UserRole).get('type'), item.data(Qt.UserRole).get('id')) in selected:
+                item.setSelected(True)
+        self.update_selection_count()
+    
+    def current_audience(self):
+        """Who mail to students, classes or grades goes to"""
+        return self.audience_combo.currentData() or AUDIENCE_ALL
+    
     def update_selection_count(self):
         """Update selection count label"""
         selected_count = len(self.recipient_list.selectedItems())
-        total_emails = 0
-        
-        for item in self.recipient_list.selectedItems():
-            item_data = item.data(Qt.UserRole)
-            total_emails += len(item_data.get('emails', []))
-            print(f"DEBUG: Selected item {item_data}")  # Add this for debugging
+        total_emails = len(self.get_selected_recipients())
         
         self.selection_label.setText(f"{selected_count} recipients selected ({total_emails} email addresses)")
     
@@ -495,15 +427,27 @@ class EmailComposerDialog(QDialog):
     
     def get_selected_emails(self):
         """Get all selected email addresses"""
-        all_emails = set()
-        
+        return [recipient['email'] for recipient in self.get_selected_recipients()]
+    
+    def get_selected_recipients(self):
+        """Selected addresses with their mail-merge fields (one entry per address)"""
+        ids_by_kind = {}
+        custom_emails = []
         for item in self.recipient_list.selectedItems():
             item_data = item.data(Qt.UserRole)
-            for email in item_data.get('emails', []):
-                if email and email.strip():
-                    all_emails.add(email.strip())
-        
-        return list(all_emails)
+            if item_data.get('type') == 'custom':
+                custom_emails.extend(item_data.get('emails', []))
+            else:
+                ids_by_kind.setdefault(item_data['type'], []).append(item_data['id'])
+        
+        recipients = {}
+        for kind, ids in ids_by_kind.items():
+            for recipient in self.resolver.resolve(kind, ids, self.current_audience()):
+                recipients.setdefault(recipient['email'].lower(), recipient)
+        for email in custom_emails:
+            if valid_email(email) and email.strip().lower() not in recipients:
+                recipients[email.strip().lower()] = {'email': email.strip(), 'name': '', 'student_name': ''}
+        return list(recipients.values())
     
     def validate_form(self):
         """Validate the email form"""
@@ -626,9 +570,10 @@ class EmailComposerDialog(QDialog):
         if not self.validate_form():
             return
         
-        selected_emails = self.get_selected_emails()
-        if not selected_emails:
+        recipients = self.get_selected_recipients()
+        if not recipients:
             return
+        selected_emails = [recipient['email'] for recipient in recipients]
         
         # Confirm before sending
         reply = QMessageBox.question(
@@ -644,11 +589,6 @@ class EmailComposerDialog(QDialog):
         if reply != QMessageBox.Yes:
             return
         
-        # Show progress dialog
-        progress = QProgressDialog("Sending emails...", "Cancel", 0, len(selected_emails), self)
-        progress.setWindowModality(Qt.WindowModal)
-        progress.show()
-        
         try:
             email_service = EmailService(self.db_connection)
             
@@ -664,28 +604,28 @@ class EmailComposerDialog(QDialog):
                 # For plain text emails, preserve line breaks
                 email_body = self.body_edit.toPlainText()
             
-            success, message = email_service.send_email(
-                selected_emails,
+            # Queued in the outbox, one personalized message per recipient; sent in the background
+            success, result = email_service.queue_merge(
+                recipients,
                 self.subject_edit.text(),
                 email_body,  # Use the properly formatted body
                 self.attachments,
                 self.html_checkbox.isChecked()
             )
             
-            progress.close()
-            
             if success:
+                self.batch_id = result
                 QMessageBox.information(
                     self,
-                    "Success", 
-                    f"Email sent successfully to {len(selected_emails)} recipients!"
+                    "Queued", 
+                    f"Email queued for {len(selected_emails)} recipients.\n"
+                    "It is being sent in the background; you can keep working."
                 )
                 self.accept()
             else:
-                QMessageBox.warning(self, "Failed", f"Failed to send email: {message}")
+                QMessageBox.warning(self, "Failed", f"Failed to send email: {result}")
                 
         except Exception as e:
-            progress.close()
             QMessageBox.critical(self, "Error", f"Failed to send email: {str(e)}")
 
     
@@ -0,0 +1,126 @@
+# ui/incremental_search.py
+"""
+Debounced, cancellable incremental search for search boxes.
+
+IncrementalSearch watches a QLineEdit and waits until typing pauses before
+searching. A query still running on the shared query executor is cancelled
+as soon as the text changes again. When the new term extends the previous
+one (e.g. "jo" -> "joh") and the previous result was complete, matches are
+narrowed from the previous rows in memory instead of going back to the
+database or rescanning the whole list.
+
+Three ways to use it:
+- fetch=func(conn, term) -> rows: rows come from the database (background)
+- source=func() -> rows: rows come from memory (e.g. a loaded list)
+- neither: just connect to search_requested and use can_narrow()/note_results()
+"""
+import os
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from services.query_executor import get_query_executor
+
+# Milliseconds of typing pause before a search runs
+SEARCH_DEBOUNCE_MS = int(os.getenv('SEARCH_DEBOUNCE_MS', '300'))
+
+
+class IncrementalSearch(QObject):
+    """Debounce + cancel + local narrowing for one search box"""
+    search_requested = Signal(str)        # debounced term (stripped)
+    results_ready = Signal(str, object)   # term, rows (fetch/source modes)
+    search_failed = Signal(str)
+
+    def __init__(self, line_edit, fetch=None, source=None, match=None, limit=None,
+                 delay_ms=SEARCH_DEBOUNCE_MS, parent=None):
+        """
+        match(row, term) -> bool tests a row against a lowercased term; without
+        it results are never narrowed locally. limit is the fetch's row cap:
+        a capped result is incomplete and cannot be narrowed.
+        """
+        super().__init__(parent or line_edit)
+        self.line_edit = line_edit
+        self.fetch = fetch
+        self.source = source
+        self.match = match
+        self.limit = limit
+        self.key = f"search.{id(self)}"
+        self.future = None
+
+        # Last complete result: term it answered, its rows, and whether complete
+        self._term = None
+        self._rows = None
+        self._complete = False
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay_ms)
+        self.timer.timeout.connect(self.run)
+        line_edit.textChanged.connect(self.on_text_changed)
+
+    def on_text_changed(self, *args):
+        # Anything in flight answers a term the user has moved past
+        self.cancel()
+        self.timer.start()
+
+    def cancel(self):
+        if self.future is not None:
+            get_query_executor().cancel(self.key)
+            self.future = None
+
+    def current_term(self):
+        return self.line_edit.text().strip()
+
+    def can_narrow(self, term):
+        """True if term's matches are a subset of the last complete result"""
+        if not self._complete or not self._term:
+            return False
+        return self._term.lower() in term.lower()
+
+    def note_results(self, term, complete, rows=None):
+        """Record the result the caller displayed for term"""
+        self._term = term
+        self._rows = rows
+        self._complete = complete
+
+    def invalidate(self):
+        """Forget cached results (call after the underlying data changes)"""
+        self._term, self._rows, self._complete = None, None, False
+
+    def refresh(self):
+        """Search immediately with the current text, ignoring cached results"""
+        self.invalidate()
+        self.timer.stop()
+        self.run()
+
+    def run(self):
+        term = self.current_term()
+        self.search_requested.emit(term)
+        if self.fetch is None and self.source is None:
+            return
+
+        lowered = term.lower()
+        if self.match is not None and self._rows is not None and self.can_narrow(term):
+            # Keep the cached base result so backspacing can still narrow from it
+            self.results_ready.emit(term, [row for row in self._rows if self.match(row, lowered)])
+            return
+
+        if self.source is not None:
+            rows = list(self.source())
+            if term and self.match is not None:
+                rows = [row for row in rows if self.match(row, lowered)]
+            self.note_results(term, True, rows)
+            self.results_ready.emit(term, rows)
+            return
+
+        def on_result(rows):
+            rows = list(rows)
+            self.note_results(term, self.limit is None or len(rows) < self.limit, rows)
+            self.results_ready.emit(term, rows)
+
+        def on_finished():
+            self.future = None
+
+        self.future = get_query_executor().submit_call(
+            lambda conn: self.fetch(conn, term), key=self.key,
+            on_result=on_result, on_error=self.search_failed.emit, on_finished=on_finished
+        )
@@ -0,0 +1,92 @@
+# ui/jobs_panel.py
+"""Small panel listing background jobs (exports, reports) with progress and cancel"""
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton
+from PySide6.QtCore import Signal
+
+from services.job_runner import get_job_runner
+
+
+class JobRow(QWidget):
+    """One job: title, progress bar and cancel button"""
+
+    def __init__(self, job_id, title, runner, parent=None):
+        super().__init__(parent)
+        self.job_id = job_id
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(4, 2, 4, 2)
+
+        self.title_label = QLabel(title)
+        self.title_label.setMinimumWidth(220)
+        layout.addWidget(self.title_label)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)  # Indeterminate until a total is known
+        self.progress_bar.setFormat("Queued")
+        self.progress_bar.setTextVisible(True)
+        layout.addWidget(self.progress_bar, 1)
+
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setStyleSheet("QPushButton { background-color: #dc3545; color: white; padding: 2px 10px; }")
+        self.cancel_btn.clicked.connect(lambda: self.cancel(runner))
+        layout.addWidget(self.cancel_btn)
+
+    def cancel(self, runner):
+        runner.cancel(self.job_id)
+        self.cancel_btn.setEnabled(False)
+        self.progress_bar.setFormat("Cancelling...")
+
+    def set_progress(self, done, total):
+        if total > 0:
+            self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(min(done, total))
+            self.progress_bar.setFormat(f"{done:,} / {total:,} rows")
+        else:
+            self.progress_bar.setRange(0, 0)
+            self.progress_bar.setFormat(f"{done:,} rows")
+
+
+class JobsPanel(QWidget):
+    """Lists running/queued jobs from the shared JobRunner"""
+    jobs_changed = Signal(int)  # number of active jobs
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.runner = get_job_runner()
+        self.rows = {}
+
+        self.jobs_layout = QVBoxLayout(self)
+        self.jobs_layout.setContentsMargins(6, 6, 6, 6)
+        self.empty_label = QLabel("No background jobs")
+        self.empty_label.setStyleSheet("color: #6c757d;")
+        self.jobs_layout.addWidget(self.empty_label)
+        self.jobs_layout.addStretch()
+
+        self.runner.job_added.connect(self.add_job)
+        self.runner.job_started.connect(self.mark_started)
+        self.runner.job_progress.connect(self.update_progress)
+        self.runner.job_removed.connect(self.remove_job)
+
+    def add_job(self, job_id, title):
+        row = JobRow(job_id, title, self.runner, self)
+        self.rows[job_id] = row
+        self.jobs_layout.insertWidget(self.jobs_layout.count() - 1, row)
+        self.empty_label.hide()
+        self.jobs_changed.emit(len(self.rows))
+
+    def mark_started(self, job_id):
+        row = self.rows.get(job_id)
+        if row:
+            row.progress_bar.setFormat("Starting...")
+
+    def update_progress(self, job_id, done, total):
+        row = self.rows.get(job_id)
+        if row:
+            row.set_progress(done, total)
+
+    def remove_job(self, job_id):
+        row = self.rows.pop(job_id, None)
+        if row:
+            self.jobs_layout.removeWidget(row)
+            row.deleteLater()
+        self.empty_label.setVisible(not self.rows)
+        self.jobs_changed.emit(len(self.rows))
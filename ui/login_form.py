@@ -385,6 +385,13 @@ class LoginForm(QDialog):
             }
     
             print(f"✅ Login successful for user: {user_session['username']}")
+
+            # Preload the permission snapshot so later checks stay in memory
+            try:
+                from utils.permissions import load_permission_snapshot
+                load_permission_snapshot(user_session, force=True)
+            except Exception as e:
+                print(f"Failed to preload permissions: {e}")
     
             # ✅ Emit session
             try:
@@ -9,9 +9,9 @@ from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
     QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
     QMessageBox, QFileDialog, QScrollArea, QFrame, QSizePolicy,
-    QGroupBox, QGridLayout, QComboBox, QTabWidget, QDateEdit
+    QGroupBox, QGridLayout, QComboBox, QTabWidget, QDateEdit, QTableView
 )
-from PySide6.QtGui import QFont, QIcon
+from PySide6.QtGui import QFont, QIcon, QColor
 from PySide6.QtCore import Qt, QDate
 
 import mysql.connector
@@ -22,6 +22,14 @@ from utils.permissions import has_permission
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.models import get_db_connection
 from ui.audit_base_form import AuditBaseForm
+from models.log_partitions import month_start
+from services.job_runner import get_job_runner
+from services.log_retention import LOG_ARCHIVE_DIR, purge_logs_before
+from services.log_search import user_condition
+from ui.table_models import DataTableModel, DataTableProxyModel, KeysetPageLoader, attach_data_table
+
+# Login rows fetched per page as the log table is scrolled (older pages load on scroll)
+LOGIN_LOG_PAGE_SIZE = 1000
 
 
 
@@ -159,7 +167,7 @@ class LoginLogsForm(AuditBaseForm):
         layout.setContentsMargins(10, 10, 10, 10)
 
         # Table
-        self.logs_table = QTableWidget()
+        self.logs_table = QTableView()
         self.setup_table()
         layout.addWidget(self.logs_table, 1)
 
@@ -167,13 +175,15 @@ class LoginLogsForm(AuditBaseForm):
         """Setup the login logs table"""
         headers = ["ID", "Username", "Login Time", "Logout Time", "Status",
                    "Failure Reason", "IP Address", "Device", "User Agent"]
-        self.logs_table.setColumnCount(len(headers))
-        self.logs_table.setHorizontalHeaderLabels(headers)
+        self.logs_model = DataTableModel(headers, parent=self)
+        self.logs_model.set_role_handler(Qt.ItemDataRole.ForegroundRole, self.log_foreground)
+        self.logs_proxy = DataTableProxyModel(self)
+        attach_data_table(self.logs_table, self.logs_model, self.logs_proxy)
 
         self.logs_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.logs_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
         self.logs_table.setAlternatingRowColors(True)
-        self.logs_table.setSortingEnabled(True)
+        self.logs_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.logs_table.setFont(self.fonts['table'])
 
         header = self.logs_table.horizontalHeader()
@@ -214,75 +224,85 @@ class LoginLogsForm(AuditBaseForm):
 
     def load_login_logs(self):
         try:
-            query = '''
+            conditions, params = self.log_filter_conditions()
+            query = f'''
                 SELECT ll.id, u.username, ll.login_time, ll.logout_time, 
                        ll.login_status, ll.failure_reason, ll.ip_address, 
                        ll.device, ll.user_agent
                 FROM login_logs ll
                 LEFT JOIN users u ON ll.user_id = u.id
-                WHERE 1=1
+                WHERE 1=1{conditions}{{seek}}
+                ORDER BY ll.login_time DESC, ll.id DESC
             '''
-            params = []
-
-            from_date = self.from_date.date().toString("yyyy-MM-dd")
-            to_date = self.to_date.date().addDays(1).toString("yyyy-MM-dd")
-            query += " AND ll.login_time >= %s AND ll.login_time < %s"
-            params.extend([from_date, to_date])
-
-            status = self.status_combo.currentText()
-            if status != "All":
-                if status == "Success":
-                    query += " AND ll.login_status = 'success'"
-                elif status == "Failed":
-                    query += " AND ll.login_status = 'failed'"
-                elif status == "Locked":
-                    query += " AND ll.login_status = 'locked'"
-
-            username_filter = self.user_filter.text().strip()
-            if username_filter:
-                query += " AND u.username LIKE %s"
-                params.append(f"%{username_filter}%")
 
-            query += " ORDER BY ll.login_time DESC LIMIT 1000"
-
-            self.cursor.execute(query, params)
-            logs = self.cursor.fetchall()
-            self.update_logs_table(logs)
-            self.update_statistics(logs)
+            # Newest first; older pages seek past the last (login_time, id) served
+            self.logs_loader = KeysetPageLoader(
+                self.cursor, query,
+                seek_columns=[("ll.login_time", lambda log: log[2]),
+                              ("ll.id", lambda log: log[0])],
+                params=params,
+                page_size=LOGIN_LOG_PAGE_SIZE,
+                convert=lambda logs: (self.build_log_rows(logs), None),
+                descending=True
+            )
+            self.logs_loader.load_into(self.logs_model)
+            self.load_statistics(conditions, params)
 
         except Error as e:
             QMessageBox.critical(self, "Error", f"Failed to load login logs: {e}")
 
-    def update_logs_table(self, logs):
-        self.logs_table.setRowCount(len(logs))
-        for row, log in enumerate(logs):
-            row_data = [
-                str(log[0]), log[1] or 'N/A',
-                log[2].strftime('%Y-%m-%d %H:%M:%S') if log[2] else 'N/A',
-                log[3].strftime('%Y-%m-%d %H:%M:%S') if log[3] else 'N/A',
-                log[4] or 'N/A', log[5] or 'N/A',
-                log[6] or 'N/A', log[7] or 'N/A', log[8] or 'N/A'
-            ]
-            for col, data in enumerate(row_data):
-                item = QTableWidgetItem(str(data))
-                item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                if col == 4:  # Status
-                    if data.lower() == 'success':
-                        item.setData(Qt.ItemDataRole.ForegroundRole, self.colors['success'])
-                    elif data.lower() in ['failed', 'locked']:
-                        item.setData(Qt.ItemDataRole.ForegroundRole, self.colors['danger'])
-                self.logs_table.setItem(row, col, item)
-
-    def update_statistics(self, logs):
-        total = len(logs)
-        successful = sum(1 for log in logs if log[4] and log[4].lower() == 'success')
-        failed = sum(1 for log in logs if log[4] and log[4].lower() == 'failed')
-        locked = sum(1 for log in logs if log[4] and log[4].lower() == 'locked')
-
-        self.total_logins_label.setText(f"Total Logins: {total}")
-        self.successful_logins_label.setText(f"Successful: {successful}")
-        self.failed_logins_label.setText(f"Failed: {failed}")
-        self.locked_logins_label.setText(f"Locked: {locked}")
+    def log_filter_conditions(self):
+        """WHERE conditions for the current filters, on indexed login_logs columns"""
+        from_date = self.from_date.date().toString("yyyy-MM-dd")
+        to_date = self.to_date.date().addDays(1).toString("yyyy-MM-dd")
+        sql = " AND ll.login_time >= %s AND ll.login_time < %s"
+        params = [from_date, to_date]
+
+        status = self.status_combo.currentText()
+        if status != "All":
+            sql += " AND ll.login_status = %s"
+            params.append(status.lower())
+
+        condition, condition_params = user_condition(self.db_connection, "ll.user_id",
+                                                     self.user_filter.text().strip())
+        return sql + condition, params + condition_params
+
+    def build_log_rows(self, logs):
+        """Convert login log rows into table model rows"""
+        return [(
+            log[0], log[1] or 'N/A',
+            log[2].strftime('%Y-%m-%d %H:%M:%S') if log[2] else 'N/A',
+            log[3].strftime('%Y-%m-%d %H:%M:%S') if log[3] else 'N/A',
+            log[4] or 'N/A', log[5] or 'N/A',
+            log[6] or 'N/A', log[7] or 'N/A', log[8] or 'N/A'
+        ) for log in logs]
+
+    def log_foreground(self, row, col):
+        """Color coding for the Status column"""
+        if col != 4:
+            return None
+        status = str(self.logs_model.value(row, col)).lower()
+        if status == 'success':
+            return QColor(self.colors['success'])
+        if status in ('failed', 'locked'):
+            return QColor(self.colors['danger'])
+        return None
+
+    def load_statistics(self, conditions, params):
+        """Count logins per status over the whole filtered range"""
+        self.run_query_async(
+            f"SELECT ll.login_status, COUNT(*) FROM login_logs ll WHERE 1=1{conditions} GROUP BY ll.login_status",
+            params, key='statistics',
+            on_result=self.update_statistics,
+            on_error=lambda error: print(f"⚠️ Failed to load login statistics: {error}")
+        )
+
+    def update_statistics(self, status_counts):
+        counts = {(status or '').lower(): count for status, count in status_counts}
+        self.total_logins_label.setText(f"Total Logins: {sum(counts.values())}")
+        self.successful_logins_label.setText(f"Successful: {counts.get('success', 0)}")
+        self.failed_logins_label.setText(f"Failed: {counts.get('failed', 0)}")
+        self.locked_logins_label.setText(f"Locked: {counts.get('locked', 0)}")
 
     def apply_filters(self):
         self.load_login_logs()
@@ -305,26 +325,8 @@ class LoginLogsForm(AuditBaseForm):
                 LEFT JOIN users u ON ll.user_id = u.id
                 WHERE 1=1
             '''
-            params = []
-    
-            from_date = self.from_date.date().toString("yyyy-MM-dd")
-            to_date = self.to_date.date().addDays(1).toString("yyyy-MM-dd")
-            query += " AND ll.login_time >= %s AND ll.login_time < %s"
-            params.extend([from_date, to_date])
-    
-            status = self.status_combo.currentText()
-            if status != "All":
-                if status == "Success":
-                    query += " AND ll.login_status = 'success'"
-                elif status == "Failed":
-                    query += " AND ll.login_status = 'failed'"
-                elif status == "Locked":
-                    query += " AND ll.login_status = 'locked'"
-    
-            username_filter = self.user_filter.text().strip()
-            if username_filter:
-                query += " AND u.username LIKE %s"
-                params.append(f"%{username_filter}%")
+            conditions, params = self.log_filter_conditions()
+            query += conditions
     
             query += " ORDER BY ll.login_time DESC"
     
@@ -380,37 +382,35 @@ class LoginLogsForm(AuditBaseForm):
         if not has_permission(self.user_session, 'delete_login_logs'):
             QMessageBox.warning(self, "Permission Denied", "You don't have permission to delete login logs.")
             return
-
+        # Whole months are removed: everything before the month 90 days ago
+        cutoff = month_start(datetime.now() - timedelta(days=90))
         reply = QMessageBox.question(
             self, "Confirm Delete",
-            "Are you sure you want to delete login logs older than 90 days?\n\n"
+            f"Are you sure you want to delete login logs from before {cutoff:%B %Y}?\n\n"
+            f"Each month is archived to {LOG_ARCHIVE_DIR} (compressed CSV) before it is removed.\n"
             "This action is irreversible!",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.No
         )
         if reply == QMessageBox.StandardButton.Yes:
-            try:
-                cutoff_date = (datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d')
-                query = "DELETE FROM login_logs WHERE login_time < %s"
-                self.cursor.execute(query, (cutoff_date,))
-                deleted_count = self.cursor.rowcount
-                self.db_connection.commit()
-
-                if self.user_session:
-                    audit_query = """
-                        INSERT INTO audit_log (user_id, action, table_name, description)
-                        VALUES (%s, 'DELETE', 'login_logs', %s)
-                    """
-                    self.cursor.execute(audit_query, (
-                        self.user_session.get('user_id'),
-                        f"Deleted {deleted_count} login logs older than {cutoff_date}"
-                    ))
-                    self.db_connection.commit()
-
-                QMessageBox.information(self, "Success", f"Deleted {deleted_count} old login logs!")
-                self.load_login_logs()
-            except Error as e:
-                QMessageBox.critical(self, "Error", f"Failed to delete old logs: {e}")
+            get_job_runner().submit(
+                "Archive old login logs",
+                lambda job: purge_logs_before('login_logs', cutoff, job=job),
+                on_done=lambda result: self.on_old_logs_deleted(cutoff, *result),
+                on_error=lambda message: QMessageBox.critical(self, "Error", f"Failed to delete old logs: {message}")
+            )
+
+    def on_old_logs_deleted(self, cutoff, files, deleted_count):
+        if self.user_session:
+            self.log_audit_action(
+                action="DELETE",
+                table_name="login_logs",
+                record_id=None,
+                description=f"Deleted {deleted_count} login logs older than {cutoff:%Y-%m-%d} "
+                            f"(archived to {len(files)} file(s) in {LOG_ARCHIVE_DIR})"
+            )
+        QMessageBox.information(self, "Success", f"Archived and deleted {deleted_count} old login logs!")
+        self.load_login_logs()
 
     def refresh_data(self):
         """Refresh data from database"""
@@ -1,12 +1,13 @@
 # ui/main_window.py
 import os
+import time
 import mysql.connector
 from PySide6.QtWidgets import (
     QMainWindow, QMessageBox, QToolBar, QWidget,
     QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFrame, QStackedWidget,
     QSizePolicy, QScrollArea, QTabWidget, QInputDialog, QGraphicsDropShadowEffect,
     QDialog, QFileDialog, QGroupBox, QRadioButton, QComboBox, QProgressDialog, QLineEdit,
-    QButtonGroup, QApplication, QListWidget, QMenu
+    QButtonGroup, QApplication, QListWidget, QMenu, QDockWidget
 )
 from datetime import datetime
 from PySide6.QtGui import QIcon, QPixmap, QPainter, QBrush, QColor, QLinearGradient, QAction, QFont, QCursor 
@@ -37,9 +38,15 @@ from ui.ribbon_handlers import RibbonHandlers
 
 # Email imports
 from services.email_service import EmailService, EmailTemplates
+from services.email_outbox import get_email_outbox
 from services.email_notification_service import EmailNotificationService
 from ui.notification_center import NotificationCenter
 from ui.email_composer_dialog import EmailComposerDialog
+from ui.jobs_panel import JobsPanel
+from services.job_runner import get_job_runner
+from services.query_executor import get_query_executor
+from services.change_feed import get_change_feed
+from services.audit_sink import get_audit_sink
 
 # Other imports
 from utils.permissions import has_permission
@@ -131,6 +138,14 @@ class MainWindow(QMainWindow):
         self.current_file_type = None
         self.visible_nested_tabs = {}
 
+        # Lazy page construction / optional idle-time prewarm
+        self.loaded_pages = {}
+        self.page_build_times = {}
+        self.prewarm_queue = []
+        self.prewarm_pages = os.getenv('PREWARM_PAGES', 'False').lower() == 'true'
+        self.prewarm_delay_ms = int(os.getenv('PREWARM_DELAY_MS', '1500'))
+        self.prewarm_interval_ms = 250
+
         self.init_ui()
         self.setup_window()
         
@@ -138,6 +153,11 @@ class MainWindow(QMainWindow):
         self.email_service = EmailService(self.db_connection)
         self.email_notifier = EmailNotificationService(self.db_connection, self.email_service)
         
+        # Outgoing mail is queued and sent by background workers
+        self.email_outbox = get_email_outbox()
+        self.email_outbox.batch_finished.connect(self.on_email_batch_finished)
+        self.email_outbox.start()
+
         # Connect email notification signals
         self.email_notifier.new_notification.connect(self.show_new_notification)
         self.email_notifier.notification_count_changed.connect(self.update_notification_badge)
@@ -287,6 +307,12 @@ class MainWindow(QMainWindow):
         # Update status bar with user info
         user_info = f"Ready - CBCentra School Management System | User: {self.user_session.get('full_name', 'Unknown')}"
         self.statusBar().showMessage(user_info)
+
+        self.create_jobs_panel()
+
+        # One table_versions poll serves every open form
+        get_change_feed().start()
+        get_audit_sink().versions_recorded.connect(get_change_feed().note_versions)
     
         self.sidebar_animation = QPropertyAnimation(self.sidebar_frame, b"geometry")
         self.sidebar_animation.setDuration(300)
@@ -365,36 +391,121 @@ class MainWindow(QMainWindow):
     # CONTENT PAGES CREATION (NESTED TABS)
     # =====================================
     def create_content_pages(self):
-        """Create content pages only for visible tabs with their nested tabs"""
+        """
+        Create content pages only for visible tabs.
+        Pages are built lazily: each visible tab gets a lightweight placeholder
+        and the real page (with its form, queries and charts) is constructed the
+        first time the tab is activated. Only the first tab is built up front.
+        """
         # Use the stored visible tabs instead of querying again
         visible_main_tabs = self.visible_main_tabs
-        
+
+        self.loaded_pages = {}
+        self.page_build_times = {}
+
         for tab_name in visible_main_tabs:
-            if tab_name == 'Dashboard':
-                dashboard_page = self.create_dashboard_page()
-                self.stacked_widget.addWidget(dashboard_page)
-            elif tab_name == 'Schools':
-                schools_page = self.create_schools_page()
-                self.stacked_widget.addWidget(schools_page)
-            elif tab_name == 'Staff':
-                staff_page = self.create_staff_page()
-                self.stacked_widget.addWidget(staff_page)
-            elif tab_name == 'Classes':
-                classes_page = self.create_classes_page()
-                self.stacked_widget.addWidget(classes_page)
-            elif tab_name == 'Parents':
-                parents_page = self.create_parents_page()
-                self.stacked_widget.addWidget(parents_page)
-            elif tab_name == 'Students':
-                students_page = self.create_students_page()
-                self.stacked_widget.addWidget(students_page)
-            elif tab_name == 'Others':  # REPLACE THIS
-                others_page = self.create_others_page()  # Use the actual Others page
-                self.stacked_widget.addWidget(others_page)
-            else:
-                # Placeholder for other tabs (Exams, Activities, Finance)
-                placeholder_page = self.create_placeholder_page(tab_name)
-                self.stacked_widget.addWidget(placeholder_page)
+            self.stacked_widget.addWidget(self.create_loading_page(tab_name))
+
+        # Build the page the user lands on immediately
+        if visible_main_tabs:
+            self.ensure_page_loaded(visible_main_tabs[0])
+
+    def get_page_builder(self, tab_name):
+        """Return the function that builds the content page for a main tab"""
+        page_builders = {
+            'Dashboard': self.create_dashboard_page,
+            'Schools': self.create_schools_page,
+            'Staff': self.create_staff_page,
+            'Classes': self.create_classes_page,
+            'Parents': self.create_parents_page,
+            'Students': self.create_students_page,
+            'Others': self.create_others_page,
+        }
+        # Placeholder for other tabs (Exams, Activities, Finance)
+        return page_builders.get(tab_name, lambda: self.create_placeholder_page(tab_name))
+
+    def create_loading_page(self, tab_name):
+        """Lightweight stub shown in place of a page that has not been built yet"""
+        page = QWidget()
+        layout = QVBoxLayout(page)
+        layout.setContentsMargins(20, 20, 20, 20)
+        page_label = QLabel(f"Loading {tab_name}...")
+        page_label.setStyleSheet("""
+            font-size: 16px;
+            color: #6c757d;
+            padding: 40px;
+        """)
+        page_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(page_label)
+        return page
+
+    def ensure_page_loaded(self, tab_name):
+        """
+        Build the real page for tab_name if it is still a placeholder.
+        Returns True if the page was built by this call.
+        """
+        if tab_name in self.loaded_pages or tab_name not in self.tab_to_index:
+            return False
+
+        page_index = self.tab_to_index[tab_name]
+        stub = self.stacked_widget.widget(page_index)
+        was_current = self.stacked_widget.currentIndex() == page_index
+
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        start = time.perf_counter()
+        try:
+            page = self.get_page_builder(tab_name)()
+        except Exception as e:
+            print(f"Error building page '{tab_name}': {e}")
+            page = self.create_placeholder_page(tab_name)
+        finally:
+            QApplication.restoreOverrideCursor()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # Swap the placeholder for the real page at the same index
+        self.stacked_widget.insertWidget(page_index, page)
+        if stub is not None:
+            self.stacked_widget.removeWidget(stub)
+            stub.deleteLater()
+        if was_current:
+            self.stacked_widget.setCurrentIndex(page_index)
+
+        self.loaded_pages[tab_name] = page
+        self.page_build_times[tab_name] = elapsed_ms
+        print(f"⏱️ Page '{tab_name}' built in {elapsed_ms:.0f} ms")
+        return True
+
+    def ensure_page_at_index_loaded(self, page_index):
+        """Build the page shown at a stacked widget index, if needed"""
+        for tab_name, index in self.tab_to_index.items():
+            if index == page_index:
+                return self.ensure_page_loaded(tab_name)
+        return False
+
+    def start_page_prewarm(self):
+        """Build remaining pages one at a time while the event loop is idle"""
+        self.prewarm_queue = [t for t in self.visible_main_tabs if t not in self.loaded_pages]
+        if self.prewarm_queue:
+            QTimer.singleShot(0, self.prewarm_next_page)
+
+    def prewarm_next_page(self):
+        """Build the next queued page, then yield back to the event loop"""
+        while self.prewarm_queue:
+            tab_name = self.prewarm_queue.pop(0)
+            if tab_name not in self.loaded_pages:
+                self.ensure_page_loaded(tab_name)
+                break
+        if self.prewarm_queue:
+            QTimer.singleShot(self.prewarm_interval_ms, self.prewarm_next_page)
+        else:
+            print(f"Page prewarm complete: {self.page_build_times}")
+
+    def showEvent(self, event):
+        """Kick off optional page prewarm once the window is on screen"""
+        super().showEvent(event)
+        if self.prewarm_pages and not getattr(self, 'prewarm_started', False):
+            self.prewarm_started = True
+            QTimer.singleShot(self.prewarm_delay_ms, self.start_page_prewarm)
 
     def create_others_page(self):
         """Create Others page with nested tabs"""
@@ -714,33 +825,8 @@ class MainWindow(QMainWindow):
                     widget.setParent(None)
                     widget.deleteLater()
     
-            # Recreate content pages for visible tabs
-            for tab_name in self.visible_main_tabs:
-                if tab_name == 'Dashboard':
-                    dashboard_page = self.create_dashboard_page()
-                    self.stacked_widget.addWidget(dashboard_page)
-                elif tab_name == 'Schools':
-                    schools_page = self.create_schools_page()
-                    self.stacked_widget.addWidget(schools_page)
-                elif tab_name == 'Staff':
-                    staff_page = self.create_staff_page()
-                    self.stacked_widget.addWidget(staff_page)
-                elif tab_name == 'Classes':
-                    classes_page = self.create_classes_page()
-                    self.stacked_widget.addWidget(classes_page)
-                elif tab_name == 'Parents':
-                    parents_page = self.create_parents_page()
-                    self.stacked_widget.addWidget(parents_page)
-                elif tab_name == 'Students':
-                    students_page = self.create_students_page()
-                    self.stacked_widget.addWidget(students_page)
-                elif tab_name == 'Others':  # REPLACE THIS
-                    others_page = self.create_others_page()  # Use the actual Others page
-                    self.stacked_widget.addWidget(others_page)
-                else:
-                    # Placeholder for other tabs
-                    placeholder_page = self.create_placeholder_page(tab_name)
-                    self.stacked_widget.addWidget(placeholder_page)
+            # Recreate content pages for visible tabs (lazily)
+            self.create_content_pages()
     
         except Exception as e:
             print(f"Error recreating content pages: {e}")
@@ -759,6 +845,9 @@ class MainWindow(QMainWindow):
         # Update ribbon panel
         self.update_ribbon_panel(tab_name)
         
+        # Build the page on first activation
+        just_built = self.ensure_page_loaded(tab_name)
+
         # Use dynamic mapping instead of hardcoded
         if tab_name in self.tab_to_index:
             page_index = self.tab_to_index[tab_name]
@@ -767,7 +856,9 @@ class MainWindow(QMainWindow):
         # Update status bar
         self.statusBar().showMessage(f"Current Section: {tab_name}")
         
-        # Special handling for specific tabs
+        # Special handling for specific tabs (a freshly built form already loaded its data)
+        if just_built:
+            return
         if tab_name == "Staff" and hasattr(self, 'staff_form'):
             self.staff_form.load_teachers()
             self.staff_form.load_schools()
@@ -1417,60 +1508,17 @@ class MainWindow(QMainWindow):
         )
         
         if dialog.exec() == QDialog.Accepted:
-            email_data = dialog.get_email_data()
-            
-            # Get selected emails directly from the dialog
-            selected_emails = dialog.get_selected_emails()
-            
-            if not selected_emails:
-                QMessageBox.warning(self, "No Recipients", "No email addresses were selected.")
-                return
-                
-            # Show progress dialog for sending
-            progress = QProgressDialog("Sending emails...", "Cancel", 0, len(selected_emails), self)
-            progress.setWindowModality(Qt.WindowModal)
-            progress.show()
-            
-            success_count = 0
-            failed_emails = []
-            
-            for i, email in enumerate(selected_emails):
-                if progress.wasCanceled():
-                    break
-                    
-                progress.setValue(i)
-                progress.setLabelText(f"Sending to {email}...")
-                QApplication.processEvents()
-                
-                success, message = self.email_service.send_email(
-                    [email],  # Send to one recipient at a time for better error handling
-                    email_data['subject'],
-                    email_data['body'],
-                    email_data.get('attachments'),
-                    email_data.get('is_html', True)
-                )
-                
-                if success:
-                    success_count += 1
-                else:
-                    failed_emails.append((email, message))
-            
-            progress.close()
-            
-            # Show results
-            if success_count > 0:
-                if failed_emails:
-                    result_msg = f"Successfully sent to {success_count} recipients.\n\nFailed to send to {len(failed_emails)} recipients:\n"
-                    for email, error in failed_emails[:5]:  # Show first 5 errors
-                        result_msg += f"\n• {email}: {error}"
-                    if len(failed_emails) > 5:
-                        result_msg += f"\n\n... and {len(failed_emails) - 5} more failures."
-                    
-                    QMessageBox.warning(self, "Partial Success", result_msg)
-                else:
-                    QMessageBox.information(self, "Success", f"Email sent to {success_count} recipients!")
-            else:
-                QMessageBox.warning(self, "Failed", "Failed to send email to any recipients.")
+            # The dialog queued the messages; the outbox reports when they are all sent
+            if getattr(dialog, 'batch_id', None):
+                self.show_temp_message("Email queued - sending in the background...", color="#17a2b8")
+
+    def on_email_batch_finished(self, batch_id, sent, failed):
+        """Every message of a queued email has been sent (or given up on)"""
+        if failed:
+            self.show_temp_message(f"Email sent to {sent} recipients; {failed} could not be delivered",
+                                   duration=8000, color="#dc3545")
+        else:
+            self.show_temp_message(f"Email sent to {sent} recipients", duration=5000)
 
     def email_selected_students(self, student_ids):
         """Quick email for selected students"""
@@ -1811,6 +1859,7 @@ class MainWindow(QMainWindow):
     # SIDEBAR ACTIONS
     # =====================================
     def home_action(self):
+        self.ensure_page_at_index_loaded(0)
         self.stacked_widget.setCurrentIndex(0)
         self.update_ribbon_panel("Dashboard")
         for btn in self.tab_buttons:
@@ -1818,6 +1867,7 @@ class MainWindow(QMainWindow):
         self.toggle_sidebar()
 
     def dashboard_action(self):
+        self.ensure_page_at_index_loaded(0)
         self.stacked_widget.setCurrentIndex(0)
         self.update_ribbon_panel("Dashboard")
         for btn in self.tab_buttons:
@@ -1842,6 +1892,31 @@ class MainWindow(QMainWindow):
         QMessageBox.information(self, "Options", "Configure application options")
         self.toggle_sidebar()
 
+    def create_jobs_panel(self):
+        """Dock listing background exports/reports, toggled from the status bar"""
+        self.jobs_panel = JobsPanel(self)
+        self.jobs_dock = QDockWidget("Background Jobs", self)
+        self.jobs_dock.setObjectName("jobsDock")
+        self.jobs_dock.setWidget(self.jobs_panel)
+        self.jobs_dock.setAllowedAreas(Qt.BottomDockWidgetArea)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.jobs_dock)
+        self.jobs_dock.hide()
+
+        self.jobs_button = QPushButton("Jobs: 0")
+        self.jobs_button.setFlat(True)
+        self.jobs_button.setToolTip("Show background exports and reports")
+        self.jobs_button.clicked.connect(lambda: self.jobs_dock.setVisible(not self.jobs_dock.isVisible()))
+        self.statusBar().addPermanentWidget(self.jobs_button)
+
+        self.jobs_panel.jobs_changed.connect(self.on_jobs_changed)
+        get_job_runner().job_added.connect(lambda job_id, title: self.jobs_dock.show())
+
+    def on_jobs_changed(self, count):
+        self.jobs_button.setText(f"Jobs: {count}")
+        if count == 0:
+            # Leave the finished state visible briefly before tucking the dock away
+            QTimer.singleShot(1500, lambda: self.jobs_dock.hide() if not self.jobs_panel.rows else None)
+
     def closeEvent(self, event):
         """Handle application closing with proper cleanup"""
         reply = QMessageBox.question(
@@ -1857,6 +1932,23 @@ class MainWindow(QMainWindow):
             # Force UI update
             QApplication.processEvents()
             
+            # Cancel background exports/reports and give them a moment to stop
+            runner = get_job_runner()
+            if runner.active_jobs():
+                print("Cancelling background jobs...")
+                runner.cancel_all()
+                runner.wait_for_done(3000)
+
+            # Stop the change feed and drop queued/running background queries
+            get_change_feed().stop()
+            get_query_executor().shutdown()
+
+            # Write out queued audit events (spilled to disk if the DB is down)
+            get_audit_sink().shutdown()
+
+            # Stop the email senders; unsent mail stays queued for next time
+            get_email_outbox().shutdown()
+
             # Stop email monitoring with timeout
             if hasattr(self, 'email_notifier'):
                 print("Stopping email services...")
@@ -10,7 +10,8 @@ import json
 import os
 import shutil
 import tempfile
-import base64
+
+from services.attachment_store import resolve_attachment
 
 
 class AttachmentWidget(QWidget):
@@ -958,28 +959,14 @@ class NotificationCenter(QDialog):
     def open_attachment(self, attachment_data):
         """Open attachment using system default app"""
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT filename, file_data FROM email_attachments WHERE id = %s", (attachment_data['id'],))
-            result = cursor.fetchone()
-            if not result:
+            resolved = resolve_attachment(self.db_connection, attachment_data['id'])
+            if not resolved:
                 QMessageBox.warning(self, "Not Found", "Attachment not found.")
                 return
     
-            filename = result['filename']
-            raw_data = result['file_data']
-    
-            # Normalize to bytes
-            if isinstance(raw_data, str):
-                try:
-                    file_data = base64.b64decode(raw_data)
-                except Exception as e:
-                    raise ValueError(f"Failed to decode Base64: {e}")
-            elif isinstance(raw_data, (bytes, bytearray)):
-                file_data = bytes(raw_data)
-            else:
-                raise ValueError("Unsupported binary type")
+            filename, stored_path = resolved
     
-            # Write to temp file with proper extension
+            # Copy to temp file with proper extension
             temp_dir = tempfile.gettempdir()
             safe_filename = "".join(c for c in filename if c.isalnum() or c in "._()- ")
             
@@ -997,9 +984,8 @@ class NotificationCenter(QDialog):
                 temp_path = os.path.join(temp_dir, f"{base_name}_{counter}{ext}")
                 counter += 1
     
-            # Write the file
-            with open(temp_path, 'wb') as f:
-                f.write(file_data)
+            # Copy the stored file (streamed, never loaded whole)
+            shutil.copyfile(stored_path, temp_path)
     
             # Try to open with system default app
             import subprocess
@@ -1033,26 +1019,12 @@ class NotificationCenter(QDialog):
     def save_attachment(self, attachment_data):
         """Save attachment to user-selected location"""
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT filename, file_data FROM email_attachments WHERE id = %s", (attachment_data['id'],))
-            result = cursor.fetchone()
-            if not result:
+            resolved = resolve_attachment(self.db_connection, attachment_data['id'])
+            if not resolved:
                 QMessageBox.warning(self, "Not Found", "Attachment not found.")
                 return
     
-            filename = result['filename']
-            raw_data = result['file_data']
-    
-            # Normalize to bytes
-            if isinstance(raw_data, str):
-                try:
-                    file_data = base64.b64decode(raw_data)
-                except Exception as e:
-                    raise ValueError(f"Decode error: {e}")
-            elif isinstance(raw_data, (bytes, bytearray)):
-                file_data = bytes(raw_data)
-            else:
-                raise TypeError("Invalid data format")
+            filename, stored_path = resolved
     
             # Get file extension for filter
             file_ext = filename.split('.')[-1].upper() if '.' in filename else 'ALL'
@@ -1069,12 +1041,11 @@ class NotificationCenter(QDialog):
             if not save_path:
                 return  # User canceled
     
-            # Write the file
+            # Copy the stored file (streamed, never loaded whole)
             try:
-                with open(save_path, 'wb') as f:
-                    f.write(file_data)
+                shutil.copyfile(stored_path, save_path)
                 
-                file_size = len(file_data)
+                file_size = os.path.getsize(save_path)
                 self.show_temp_message(
                     f"Saved: {os.path.basename(save_path)} ({self.format_file_size(file_size)})", 
                     4000, 
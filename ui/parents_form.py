@@ -6,15 +6,18 @@ from datetime import datetime
 from typing import Optional, Dict, Any
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
-    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
+    QTableWidget, QTableWidgetItem, QTableView, QHeaderView, QAbstractItemView,
     QMessageBox, QFileDialog, QTabWidget, QGroupBox, QFormLayout,
     QTextEdit, QCheckBox, QMenu, QComboBox, QScrollArea, QFrame, QDialog,
     QSplitter, QProgressBar, QSpinBox, QDateEdit, QApplication
 )
-from PySide6.QtCore import Qt, QDate, Signal, QThread, QTimer
-from PySide6.QtGui import QPixmap, QIcon, QFont, QAction, QCursor
+from PySide6.QtCore import Qt, QDate, Signal, QTimer
+from PySide6.QtGui import QPixmap, QIcon, QFont, QAction, QCursor, QColor
 
 from ui.audit_base_form import AuditBaseForm
+from ui.table_models import DataTableModel, DataTableProxyModel, KeysetPageLoader, attach_data_table
+from ui.incremental_search import IncrementalSearch
+from services.change_feed import get_change_feed
 from models.models import get_db_connection
 from fpdf import FPDF
 from openpyxl import Workbook
@@ -27,35 +30,8 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from utils.permissions import has_permission
 
-
-class DatabaseWorker(QThread):
-    """Background thread for database operations"""
-    data_loaded = Signal(list)
-    error_occurred = Signal(str)
-    progress_updated = Signal(int)
-    
-    def __init__(self, query, params=None):
-        super().__init__()
-        self.query = query
-        self.params = params or ()
-    
-    def run(self):
-        try:
-            connection = get_db_connection()
-            if not connection:
-                self.error_occurred.emit("Failed to connect to database")
-                return
-                
-            cursor = connection.cursor(buffered=True)
-            cursor.execute(self.query, self.params)
-            results = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
-            
-            self.data_loaded.emit(results)
-        except Exception as e:
-            self.error_occurred.emit(str(e))
+# Parents fetched per page as the list is scrolled
+PARENT_PAGE_SIZE = 500
 
 
 class ParentDetailsPopup(QDialog):
@@ -66,6 +42,7 @@ class ParentDetailsPopup(QDialog):
         self.user_session = user_session
         self.db_connection = None
         self.cursor = None
+        self.finished.connect(self.release_connection)
 
         self.setWindowTitle(f"Parent Details - ID: {parent_id}")
         self.resize(1100, 750)
@@ -235,6 +212,7 @@ class ParentDetailsPopup(QDialog):
 
     def load_parent_details(self):
         try:
+            self.release_connection()
             self.db_connection = get_db_connection()
             if not self.db_connection:
                 QMessageBox.critical(self, "Error", "Failed to connect to database")
@@ -366,11 +344,17 @@ class ParentDetailsPopup(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Export failed: {str(e)}")
 
-    def closeEvent(self, event):
+    def release_connection(self):
+        """Give the database connection back when the dialog closes (accept/reject or X)"""
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.db_connection and self.db_connection.is_connected():
             self.db_connection.close()
+        self.db_connection = None
+
+    def closeEvent(self, event):
+        self.release_connection()
         event.accept()
 
 
@@ -384,10 +368,8 @@ class ParentsForm(AuditBaseForm):
         self.current_parent_id = None
         self.db_connection = None
         self.cursor = None
-        self.db_worker = None
-        self.search_timer = QTimer()
-        self.search_timer.setSingleShot(True)
-        self.search_timer.timeout.connect(self.perform_search)
+        self.parents_future = None
+        self.parents_search_term = ""
 
         # Connect to database
         try:
@@ -626,8 +608,10 @@ class ParentsForm(AuditBaseForm):
         search_layout.addWidget(QLabel("Search:"))
         self.search_entry = QLineEdit()
         self.search_entry.setPlaceholderText("Search by name, phone, email, or relation...")
-        self.search_entry.textChanged.connect(self.on_search_text_changed)
         search_layout.addWidget(self.search_entry)
+        # Debounced search; narrows the loaded rows when the term is extended
+        self.parents_search = IncrementalSearch(self.search_entry, parent=self)
+        self.parents_search.search_requested.connect(self.perform_search)
     
         # Filter by relation
         relation_filter = QComboBox()
@@ -675,12 +659,15 @@ class ParentsForm(AuditBaseForm):
         layout.addLayout(action_layout)
     
         # Enhanced table (rest of the method stays the same)
-        self.parents_table = QTableWidget()
-        self.parents_table.setColumnCount(10)
-        self.parents_table.setHorizontalHeaderLabels([
+        self.parents_model = DataTableModel([
             "ID", "Name", "Relation", "Phone", "Email", "Students", 
             "Fee Payer", "Emergency", "Status", "Created"
-        ])
+        ], parent=self)
+        self.parents_model.set_role_handler(Qt.BackgroundRole, self.parent_status_background)
+        self.parents_model.set_role_handler(Qt.ForegroundRole, self.parent_status_foreground)
+        self.parents_proxy = DataTableProxyModel(self)
+        self.parents_loader = None
+        self.parents_table = attach_data_table(QTableView(), self.parents_model, self.parents_proxy)
         
         # Set column widths
         header = self.parents_table.horizontalHeader()
@@ -702,9 +689,8 @@ class ParentsForm(AuditBaseForm):
         self.parents_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.parents_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.parents_table.setAlternatingRowColors(True)
-        self.parents_table.setSortingEnabled(True)
-        self.parents_table.cellClicked.connect(self.on_parent_select)
-        self.parents_table.cellDoubleClicked.connect(self.view_parent_details)
+        self.parents_table.clicked.connect(self.on_parent_select)
+        self.parents_table.doubleClicked.connect(lambda index: self.view_parent_details())
     
         # Context menu
         self.parents_table.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -720,13 +706,12 @@ class ParentsForm(AuditBaseForm):
         full_name = f"{first} {last}".strip()
         self.full_name_entry.setText(full_name)
 
-    def on_search_text_changed(self):
-        """Handle search text changes with debounce"""
-        self.search_timer.stop()
-        self.search_timer.start(500)  # 500ms delay
-
-    def perform_search(self):
-        """Perform the actual search"""
+    def perform_search(self, search_term):
+        """Perform the actual search (debounced by IncrementalSearch)"""
+        if self.parents_search.can_narrow(search_term):
+            # Every match is already loaded: filter in memory instead of re-querying
+            self.parents_proxy.set_filter_text(search_term, columns=[1, 2, 3, 4])
+            return
         self.apply_filters()
 
     def apply_filters(self):
@@ -736,50 +721,31 @@ class ParentsForm(AuditBaseForm):
         status_filter = self.status_filter.currentText()
         
         try:
-            # Enhanced query with accurate student counting
-            query = """
-                SELECT p.id, p.full_name, p.relation, p.phone, p.email,
-                       COALESCE(student_counts.student_count, 0) as student_count,
-                       CASE WHEN p.is_payer THEN 'Yes' ELSE 'No' END as is_payer,
-                       CASE WHEN p.is_emergency_contact THEN 'Yes' ELSE 'No' END as is_emergency,
-                       CASE WHEN p.is_active THEN 'Active' ELSE 'Inactive' END as status,
-                       DATE_FORMAT(p.created_at, '%Y-%m-%d') as created_date
-                FROM parents p
-                LEFT JOIN (
-                    SELECT sp.parent_id, COUNT(DISTINCT s.id) as student_count
-                    FROM student_parent sp
-                    INNER JOIN students s ON sp.student_id = s.id
-                    WHERE s.is_active = TRUE
-                    GROUP BY sp.parent_id
-                ) student_counts ON p.id = student_counts.parent_id
-                WHERE 1=1
-            """
+            conditions = ""
             params = []
             
             # Add search filter
             if search_term:
-                query += """ AND (p.full_name LIKE %s OR p.phone LIKE %s 
+                conditions += """ AND (p.full_name LIKE %s OR p.phone LIKE %s 
                                OR p.email LIKE %s OR p.relation LIKE %s)"""
                 like_term = f"%{search_term}%"
                 params.extend([like_term, like_term, like_term, like_term])
             
             # Add relation filter
             if relation_filter != "All Relations":
-                query += " AND p.relation = %s"
+                conditions += " AND p.relation = %s"
                 params.append(relation_filter)
             
             # Add status filter
             if status_filter == "Active":
-                query += " AND p.is_active = TRUE"
+                conditions += " AND p.is_active = TRUE"
             elif status_filter == "Inactive":
-                query += " AND p.is_active = FALSE"
-            
-            query += " ORDER BY p.full_name LIMIT 200"
-            
-            self.cursor.execute(query, params)
-            parents = self.cursor.fetchall()
+                conditions += " AND p.is_active = FALSE"
             
-            self.populate_parents_table(parents)
+            self.parents_proxy.set_filter_text("")
+            self.parents_search_term = search_term
+            self.parents_loader = self.create_parents_loader(conditions, params)
+            self.load_first_parents_page()
             
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Filter failed: {str(e)}")
@@ -825,79 +791,110 @@ class ParentsForm(AuditBaseForm):
     def load_parents(self, show_success_message=False):
         """Load all parents with enhanced information and proper count calculation"""
         try:
-            self.show_loading(True)
-            query = """
-                SELECT p.id, p.full_name, p.relation, p.phone, p.email,
-                       COALESCE(student_counts.student_count, 0) as student_count,
-                       CASE WHEN p.is_payer THEN 'Yes' ELSE 'No' END as is_payer,
-                       CASE WHEN p.is_emergency_contact THEN 'Yes' ELSE 'No' END as is_emergency,
-                       CASE WHEN p.is_active THEN 'Active' ELSE 'Inactive' END as status,
-                       DATE_FORMAT(p.created_at, '%Y-%m-%d') as created_date
-                FROM parents p
-                LEFT JOIN (
-                    SELECT sp.parent_id, COUNT(DISTINCT s.id) as student_count
-                    FROM student_parent sp
-                    INNER JOIN students s ON sp.student_id = s.id
-                    WHERE s.is_active = TRUE
-                    GROUP BY sp.parent_id
-                ) student_counts ON p.id = student_counts.parent_id
-                WHERE p.is_active = TRUE
-                ORDER BY p.full_name
-                LIMIT 200
-            """
-            self.db_worker = DatabaseWorker(query)
-            self.db_worker.data_loaded.connect(self.populate_parents_table)
-            self.db_worker.error_occurred.connect(self.handle_database_error)
+            self.parents_proxy.set_filter_text("")
+            self.parents_search_term = ""
+            self.parents_loader = self.create_parents_loader(" AND p.is_active = TRUE")
             
             def on_finished():
-                self.show_loading(False)
                 # Only show success message if explicitly requested (manual refresh)
                 if show_success_message and (not hasattr(self, '_last_error') or not self._last_error):
                     QMessageBox.information(self, "Success", "Data refreshed successfully!")
                 elif hasattr(self, '_last_error') and self._last_error:
                     self._last_error = False  # Reset
     
-            self.db_worker.finished.connect(on_finished)
-            self.db_worker.start()
+            self.load_first_parents_page(on_finished)
         except Exception as e:
             self.show_loading(False)
             QMessageBox.critical(self, "Error", f"Failed to load parents: {str(e)}")
     
+    def load_first_parents_page(self, on_finished=None):
+        """
+        Read the loader's first page on the shared query executor; later pages
+        load on scroll. A newer load supersedes one still in flight.
+        """
+        if self.parents_future is not None and not self.parents_future.done:
+            self.show_loading(False)  # Superseded request never finishes
+        self.show_loading(True)
+
+        def finished():
+            self.parents_future = None
+            self.show_loading(False)
+            if on_finished:
+                on_finished()
+
+        query, params = self.parents_loader.page_query()
+        self.parents_future = self.run_query_async(
+            query, params, key='parents.list',
+            on_result=self.populate_parents_table,
+            on_error=self.handle_database_error,
+            on_finished=finished
+        )
+
     def refresh_all_data(self):
         """Manually refresh all data with success message"""
         self.load_parents(show_success_message=True)
         self.setup_permissions_ui()  # Keep UI in sync
 
+    def create_parents_loader(self, conditions, params=()):
+        """
+        Keyset pager over parents ordered by (surname, first_name, id).
+        Student counts are computed per page row rather than for every parent.
+        """
+        query = """
+            SELECT p.id, p.full_name, p.relation, p.phone, p.email,
+                   (SELECT COUNT(DISTINCT s.id)
+                    FROM student_parent sp
+                    INNER JOIN students s ON sp.student_id = s.id
+                    WHERE sp.parent_id = p.id AND s.is_active = TRUE) as student_count,
+                   CASE WHEN p.is_payer THEN 'Yes' ELSE 'No' END as is_payer,
+                   CASE WHEN p.is_emergency_contact THEN 'Yes' ELSE 'No' END as is_emergency,
+                   CASE WHEN p.is_active THEN 'Active' ELSE 'Inactive' END as status,
+                   DATE_FORMAT(p.created_at, '%Y-%m-%d') as created_date,
+                   p.surname, p.first_name
+            FROM parents p
+            WHERE 1=1 """ + conditions + """ {seek}
+            ORDER BY p.surname, p.first_name, p.id
+        """
+        return KeysetPageLoader(
+            self.cursor, query,
+            seek_columns=[("p.surname", lambda r: r[10]),
+                          ("p.first_name", lambda r: r[11]),
+                          ("p.id", lambda r: r[0])],
+            params=params,
+            page_size=PARENT_PAGE_SIZE,
+            convert=lambda rows: (self.build_parent_rows(rows), None),
+            count_query="SELECT COUNT(*) FROM parents p WHERE 1=1" + conditions,
+            count_params=params
+        )
+
+    def build_parent_rows(self, parents):
+        """Convert parent query rows into table model rows"""
+        rows = []
+        for parent in parents:
+            rows.append(tuple("N/A" if data is None else data for data in parent[:10]))
+        return rows
+
     def populate_parents_table(self, parents):
-        """Populate the parents table with data"""
-        self.parents_table.setRowCount(len(parents))
-        self.parents_table.setSortingEnabled(False)  # Disable during population
-        
-        for row_idx, parent in enumerate(parents):
-            for col_idx, data in enumerate(parent):
-                if data is None:
-                    text = "N/A"
-                elif col_idx == 5:  # Student count
-                    text = str(data) if data > 0 else "0"
-                else:
-                    text = str(data)
-                    
-                item = QTableWidgetItem(text)
-                
-                # Color coding for status
-                if col_idx == 8:  # Status column
-                    if text == "Active":
-                        item.setBackground(Qt.green)
-                        item.setForeground(Qt.white)
-                    else:
-                        item.setBackground(Qt.red)
-                        item.setForeground(Qt.white)
-                
-                self.parents_table.setItem(row_idx, col_idx, item)
-        
-        self.parents_table.setSortingEnabled(True)
+        """Populate the parents table with the first page read by the worker"""
+        if self.parents_loader is not None:
+            rows, _ = self.parents_loader.accept_page(parents)
+            fetch_more = self.parents_loader if self.parents_loader.has_more() else None
+        else:
+            rows, fetch_more = self.build_parent_rows(parents), None
+        self.parents_model.set_rows(rows, fetch_more=fetch_more)
+        # Only a result held in full can be narrowed locally
+        self.parents_search.note_results(self.parents_search_term, complete=fetch_more is None)
         self.update_statistics()
 
+    def parent_status_background(self, row, col):
+        """Color coding for the Status column"""
+        if col != 8:
+            return None
+        return QColor(Qt.green) if self.parents_model.value(row, col) == "Active" else QColor(Qt.red)
+
+    def parent_status_foreground(self, row, col):
+        return QColor(Qt.white) if col == 8 else None
+
     def show_loading(self, show):
         """Show/hide loading indicator"""
         self.progress_bar.setVisible(show)
@@ -909,7 +906,6 @@ class ParentsForm(AuditBaseForm):
 
     def handle_database_error(self, error_message):
         """Handle database errors"""
-        self.show_loading(False)
         self._last_error = True
         QMessageBox.critical(self, "Database Error", error_message)
 
@@ -938,11 +934,11 @@ class ParentsForm(AuditBaseForm):
 
             menu.exec_(self.parents_table.mapToGlobal(position))
 
-    def on_parent_select(self, row, col):
+    def on_parent_select(self, index):
         """Handle parent selection"""
-        item = self.parents_table.item(row, 0)
-        if item:
-            self.current_parent_id = int(item.text())
+        if index.isValid():
+            row = self.parents_proxy.mapToSource(index).row()
+            self.current_parent_id = int(self.parents_model.id_at(row))
             self.update_btn.setEnabled(True)
             self.delete_btn.setEnabled(True)
 
@@ -1416,11 +1412,7 @@ class ParentsForm(AuditBaseForm):
             self.show_loading(True)
             
             # Get all parent IDs currently displayed
-            parent_ids = []
-            for row in range(self.parents_table.rowCount()):
-                item = self.parents_table.item(row, 0)  # ID column
-                if item:
-                    parent_ids.append(int(item.text()))
+            parent_ids = [self.parents_model.id_at(row) for row in range(self.parents_model.rowCount())]
             
             if not parent_ids:
                 return
@@ -1441,15 +1433,9 @@ class ParentsForm(AuditBaseForm):
             updated_counts = dict(self.cursor.fetchall())
             
             # Update the table
-            for row in range(self.parents_table.rowCount()):
-                parent_id_item = self.parents_table.item(row, 0)
-                if parent_id_item:
-                    parent_id = int(parent_id_item.text())
-                    count = updated_counts.get(parent_id, 0)
-                    
-                    # Update the count column (index 5)
-                    count_item = QTableWidgetItem(str(count))
-                    self.parents_table.setItem(row, 5, count_item)
+            for row, parent_id in enumerate(parent_ids):
+                # Update the count column (index 5)
+                self.parents_model.set_value(row, 5, updated_counts.get(parent_id, 0))
             
             QMessageBox.information(self, "Success", "Student counts refreshed successfully!")
             
@@ -1517,51 +1503,28 @@ class ParentsForm(AuditBaseForm):
             self.show_loading(False)
     
     def setup_auto_refresh(self):
-        """Setup automatic refresh of student counts"""
-        # Add a timer to periodically refresh counts
-        self.refresh_timer = QTimer()
-        self.refresh_timer.timeout.connect(self.check_for_updates)
-        self.refresh_timer.start(30000)  # Check every 30 seconds
-        
-    def check_for_updates(self):
-        """Check if parent-student relationships have been modified"""
+        """Refresh student counts when the change feed reports related changes"""
+        self.auto_refresh_enabled = True
+        if not hasattr(self, 'auto_refresh_subscription'):
+            self.auto_refresh_subscription = get_change_feed().subscribe(
+                ('student_parent', 'students', 'parents'), self.check_for_updates, owner=self
+            )
+
+    def check_for_updates(self, changed_tables):
+        """Called by the change feed when parent-student data changed"""
+        if not getattr(self, 'auto_refresh_enabled', False):
+            return
         try:
-            # Get the latest modification timestamp from student_parent table
-            self.cursor.execute("""
-                SELECT MAX(GREATEST(
-                    COALESCE(sp.created_at, '1970-01-01'),
-                    COALESCE(sp.updated_at, '1970-01-01'),
-                    COALESCE(s.updated_at, '1970-01-01'),
-                    COALESCE(p.updated_at, '1970-01-01')
-                )) as last_modified
-                FROM student_parent sp
-                LEFT JOIN students s ON sp.student_id = s.id
-                LEFT JOIN parents p ON sp.parent_id = p.id
-            """)
-            
-            result = self.cursor.fetchone()
-            if result and result[0]:
-                last_modified = result[0]
-                
-                # Check if we need to refresh (compare with stored timestamp)
-                if not hasattr(self, 'last_refresh_time') or last_modified > self.last_refresh_time:
-                    self.refresh_student_counts()
-                    self.last_refresh_time = last_modified
-                    
+            self.refresh_student_counts()
         except Exception as e:
-            print(f"Auto-refresh check failed: {e}")
+            print(f"Auto-refresh failed: {e}")
 
-    
     def toggle_auto_refresh(self, enabled):
         """Toggle automatic refresh on/off"""
         if enabled:
-            if not hasattr(self, 'refresh_timer'):
-                self.setup_auto_refresh()
-            else:
-                self.refresh_timer.start(30000)
+            self.setup_auto_refresh()
         else:
-            if hasattr(self, 'refresh_timer'):
-                self.refresh_timer.stop()
+            self.auto_refresh_enabled = False
     
     def validate_parent_student_integrity(self):
         """Validate data integrity between parents and students"""
@@ -2261,9 +2224,10 @@ class ParentsForm(AuditBaseForm):
     def closeEvent(self, event):
         """Clean up database connections on close"""
         try:
-            if hasattr(self, 'db_worker') and self.db_worker and self.db_worker.isRunning():
-                self.db_worker.terminate()
-                self.db_worker.wait()
+            if self.parents_future is not None:
+                self.parents_future.cancel()
+                self.parents_future = None
+                self.show_loading(False)
             
             if self.cursor:
                 self.cursor.close()
@@ -2285,6 +2249,7 @@ class StudentLinkDialog(QDialog):
         self.parent_name = parent_name
         self.db_connection = None
         self.cursor = None
+        self.finished.connect(self.release_connection)
         
         self.setWindowTitle(f"Link Students to {parent_name}")
         self.resize(800, 600)
@@ -2349,6 +2314,7 @@ class StudentLinkDialog(QDialog):
         """Load students that can be linked to this parent"""
         try:
             from models.models import get_db_connection
+            self.release_connection()
             self.db_connection = get_db_connection()
             self.cursor = self.db_connection.cursor(buffered=True)
             
@@ -2453,12 +2419,18 @@ class StudentLinkDialog(QDialog):
                 self.db_connection.rollback()
             QMessageBox.critical(self, "Error", f"Failed to link students: {str(e)}")
 
-    def closeEvent(self, event):
-        """Clean up database connections"""
+    def release_connection(self):
+        """Give the database connection back when the dialog closes (accept/reject or X)"""
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.db_connection and self.db_connection.is_connected():
             self.db_connection.close()
+        self.db_connection = None
+
+    def closeEvent(self, event):
+        """Clean up database connections"""
+        self.release_connection()
         event.accept()
 
 
@@ -9,7 +9,7 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Qt, QMetaObject, Slot
 from PySide6.QtGui import QFont
 from ui.audit_base_form import AuditBaseForm
-from utils.permissions import has_permission
+from utils.permissions import has_permission, invalidate_permission_cache
 from models.models import get_db_connection
 from mysql.connector import Error
 import traceback
@@ -283,6 +283,7 @@ class PermissionsForm(AuditBaseForm):
                 )
             conn.commit()
             conn.close()
+            invalidate_permission_cache()
 
             # Update original state
             self.original_permissions = set(self.current_permissions)
@@ -0,0 +1,253 @@
+# ui/searchable_combo.py
+"""
+Searchable combo box backed by an indexed item model.
+
+ComboItemsModel holds (display_text, value) items once and builds a search
+index over them on first use. Each SearchableComboBox views the model through
+its own ComboFilterProxy, so typing only changes which rows the proxy lets
+through: the item list is never cleared and rebuilt. Dropdowns that show the
+same list pass setData() a shared_name and all use the one model (and its
+index) returned by get_shared_items_model(), across forms and reopened tabs.
+"""
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel
+from PySide6.QtWidgets import QComboBox
+
+from services.people_search import TrigramIndex
+
+
+class ComboSearchIndex(TrigramIndex):
+    """TrigramIndex that also posts 1- and 2-character grams for short terms"""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.short_postings = {}
+        for row_id, text in self.texts.items():
+            for i in range(len(text)):
+                self.short_postings.setdefault(text[i], set()).add(row_id)
+                if i + 1 < len(text):
+                    self.short_postings.setdefault(text[i:i + 2], set()).add(row_id)
+
+    def _candidates(self, word):
+        if len(word) < 3:
+            return set(self.short_postings.get(word, ()))
+        return super()._candidates(word)
+
+
+class ComboItemsModel(QAbstractListModel):
+    """List model of (display_text, value) items with a lazily built search index"""
+
+    def __init__(self, items=None, parent=None):
+        super().__init__(parent)
+        self._texts = []
+        self._values = []
+        self._row_by_text = {}
+        self._index = None
+        if items:
+            self.set_items(items)
+
+    def set_items(self, items):
+        """Replace the items; returns False if they are unchanged"""
+        items = [(str(display), value) for display, value in items]
+        if items == list(zip(self._texts, self._values)):
+            return False
+        self.beginResetModel()
+        self._texts = [display for display, _ in items]
+        self._values = [value for _, value in items]
+        self._row_by_text = {}
+        for row, text in enumerate(self._texts):
+            self._row_by_text.setdefault(text, row)
+        self._index = None
+        self.endResetModel()
+        return True
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._texts)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self._texts[index.row()]
+        if role == Qt.UserRole:
+            return self._values[index.row()]
+        return None
+
+    def value_at(self, row):
+        return self._values[row]
+
+    def row_for_text(self, text):
+        return self._row_by_text.get(text)
+
+    def row_for_value(self, value):
+        for row, row_value in enumerate(self._values):
+            if row_value == value:
+                return row
+        return None
+
+    def matching_rows(self, text):
+        """Rows whose display text contains text (None means all rows)"""
+        term = (text or "").strip().lower()
+        if not term:
+            return None
+        if self._index is None:
+            self._index = ComboSearchIndex(enumerate(self._texts))
+        rows = self._index.matching_ids(term)
+        if ' ' in term:
+            # The index matches words; keep the whole-phrase semantics
+            rows = {row for row in rows if term in self._index.texts[row]}
+        return rows
+
+
+_shared_models = {}
+
+
+def get_shared_items_model(name):
+    """ComboItemsModel shared by every dropdown showing the list called name"""
+    model = _shared_models.get(name)
+    if model is None:
+        model = _shared_models[name] = ComboItemsModel()
+    return model
+
+
+class ComboFilterProxy(QSortFilterProxyModel):
+    """Lets through a given set of source rows (None: all rows)"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = None
+
+    def set_rows(self, rows):
+        self._rows = rows
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self._rows is None or source_row in self._rows
+
+
+class SearchableComboBox(QComboBox):
+    """Editable ComboBox that filters its items as you type"""
+
+    def __init__(self, parent=None, items_model=None):
+        super().__init__(parent)
+        self.setEditable(True)
+        self.own_model = items_model if items_model is not None else ComboItemsModel(parent=self)
+        self.items_model = self.own_model
+        self.proxy = ComboFilterProxy(self)
+        self.proxy.setSourceModel(self.items_model)
+        self.setModel(self.proxy)
+
+        # Configure line edit for better UX
+        line_edit = self.lineEdit()
+        line_edit.textEdited.connect(self.filter_values)
+        line_edit.returnPressed.connect(self.on_return_pressed)
+        line_edit.setPlaceholderText("Type to search...")
+
+        # Set properties for better dropdown behavior
+        self.setMaxVisibleItems(10)
+        self.setInsertPolicy(QComboBox.InsertPolicy.NoInsert)
+
+        # Connect signals for better interaction
+        self.activated.connect(self.on_item_selected)
+
+    def setData(self, data_list, shared_name=None):
+        """
+        Set the data for the combobox - list of (display_text, value) tuples.
+        With shared_name the items go into that shared model, whose search
+        index is kept while the list is unchanged; otherwise into this
+        combo's own model (placeholders, messages).
+        """
+        model = get_shared_items_model(shared_name) if shared_name else self.own_model
+        if model is not self.items_model:
+            self.items_model = model
+            self.proxy.setSourceModel(model)
+        model.set_items(data_list)
+        self.proxy.set_rows(None)
+
+    def setValues(self, values, shared_name=None):
+        """Set plain text values (each value is its own data)"""
+        self.setData([(value, value) for value in values], shared_name)
+
+    def filter_values(self, text):
+        """Filter values based on typed text using the model's index"""
+        line_edit = self.lineEdit()
+        current_text = line_edit.text()
+        cursor_position = line_edit.cursorPosition()
+
+        self.proxy.set_rows(self.items_model.matching_rows(text))
+
+        # Filtering may move the current index; keep what the user typed
+        self.blockSignals(True)
+        line_edit.setText(current_text)
+        line_edit.setCursorPosition(cursor_position)
+        self.blockSignals(False)
+
+        if self.count() > 0 and not self.view().isVisible():
+            self.showPopup()
+        elif self.count() == 0 and self.view().isVisible():
+            self.hidePopup()
+
+    def on_return_pressed(self):
+        """Handle return pressed to select the first matching item"""
+        if self.count() > 0:
+            self.setCurrentIndex(0)
+            self.on_item_selected(0)
+            self.hidePopup()
+
+    def on_item_selected(self, index):
+        """Handle item selection"""
+        if index >= 0:
+            self.lineEdit().setText(self.itemText(index))
+            self.hidePopup()
+
+    def getCurrentValue(self):
+        """Get the current selected value (not display text)"""
+        row = self.items_model.row_for_text(self.lineEdit().text())
+        if row is not None:
+            return self.items_model.value_at(row)
+
+        # If no exact match and we have a current index, use that
+        current_index = self.currentIndex()
+        if 0 <= current_index < self.count():
+            return self.itemData(current_index)
+        return None
+
+    def _select_source_row(self, row):
+        self.proxy.set_rows(None)
+        self.setCurrentIndex(self.proxy.mapFromSource(self.items_model.index(row, 0)).row())
+
+    def setCurrentValue(self, value):
+        """Set current selection by value"""
+        row = self.items_model.row_for_value(value)
+        if row is None:
+            return False
+        self._select_source_row(row)
+        return True
+
+    def setCurrentTextValue(self, text):
+        """Set current selection by display text"""
+        row = self.items_model.row_for_text(text)
+        if row is None:
+            return False
+        self._select_source_row(row)
+        self.lineEdit().setText(text)
+        return True
+
+    def keyPressEvent(self, event):
+        """Handle key press events for better navigation"""
+        if event.key() == Qt.Key.Key_Down and not self.view().isVisible():
+            self.showPopup()
+        elif event.key() == Qt.Key.Key_Escape:
+            self.hidePopup()
+        else:
+            super().keyPressEvent(event)
+
+    def focusInEvent(self, event):
+        """Handle focus in event"""
+        super().focusInEvent(event)
+        # Select all text when focused for easy replacement
+        self.lineEdit().selectAll()
+
+    def showPopup(self):
+        """Override to ensure proper popup behavior"""
+        if self.count() > 0:
+            super().showPopup()
@@ -9,7 +9,7 @@ from PySide6.QtWidgets import (
     QMessageBox, QFileDialog, QScrollArea, QFrame, QSizePolicy,
     QGroupBox, QGridLayout, QSpacerItem, QComboBox, QFormLayout, 
     QTabWidget, QMenu, QCheckBox, QDateEdit, QTextEdit, QApplication,
-    QSplitter, QListWidget, QListWidgetItem, QProgressDialog
+    QSplitter, QListWidget, QListWidgetItem, QProgressDialog, QTableView
 )
 from PySide6.QtGui import QFont, QPalette, QIcon, QPixmap, QPainter, QAction, QColor, QTextCursor
 from PySide6.QtCore import Qt, Signal, QSize, QDate, QTimer, QDateTime
@@ -19,7 +19,11 @@ from fpdf import FPDF
 import platform
 import subprocess
 from ui.audit_base_form import AuditBaseForm
+from ui.searchable_combo import SearchableComboBox
+from ui.table_models import DataTableModel, DataTableProxyModel, attach_data_table
 from models.models import get_db_connection
+from services.people_search import PeopleSearch
+from services.reference_cache import get_reference_cache
 import pandas as pd
 import openpyxl
 # Add this import at the top with other imports
@@ -28,42 +32,11 @@ from utils.permissions import has_permission
 from services.email_service import EmailService, EmailTemplates
 
 
+# Values of the student_class_assignments.status ENUM
+ASSIGNMENT_STATUSES = ('Promoted', 'Completed', 'Repeated')
 
-class SearchableComboBox(QComboBox):
-    """Enhanced ComboBox with search functionality"""
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setEditable(True)
-        self.original_values = []
-        self.lineEdit().textEdited.connect(self.filter_values)
-        self.lineEdit().returnPressed.connect(self.on_return_pressed)
-        
-    def setValues(self, values):
-        """Set the values for the combobox"""
-        self.original_values = values
-        self.clear()
-        self.addItems(values)
-        
-    def filter_values(self, text):
-        """Filter values based on typed text"""
-        if not text:
-            self.clear()
-            self.addItems(self.original_values)
-            return
-            
-        filtered_values = [
-            value for value in self.original_values 
-            if text.lower() in value.lower()
-        ]
-        
-        self.clear()
-        self.addItems(filtered_values)
-        self.showPopup()
-        
-    def on_return_pressed(self):
-        """Handle return pressed to select the first item"""
-        if self.count() > 0:
-            self.setCurrentIndex(0)
+# Most students matched by name when searching assignments
+SEARCH_STUDENT_LIMIT = 500
 
 
 class StudentClassAssignmentForm(AuditBaseForm):
@@ -579,13 +552,17 @@ class StudentClassAssignmentForm(AuditBaseForm):
         table_layout.addWidget(search_group)
         
         # Table - SET CORRECT NUMBER OF COLUMNS
-        self.table_widget = QTableWidget()
-        self.table_widget.setColumnCount(7)  # 7 columns for all headers
-        self.table_widget.setHorizontalHeaderLabels(["Student Name", "Grade", "Class/Stream", "Term", "Year", "Status", "Current"])
+        # Assignment rows don't show their id; the model keys rows by assignment[0]
+        self.assignments_model = DataTableModel(
+            ["Student Name", "Grade", "Class/Stream", "Term", "Year", "Status", "Current"],
+            id_key=lambda assignment: assignment[0], parent=self
+        )
+        self.assignments_proxy = DataTableProxyModel(self)
+        self.table_widget = attach_data_table(QTableView(), self.assignments_model, self.assignments_proxy)
         self.table_widget.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table_widget.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table_widget.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.table_widget.cellClicked.connect(self.on_table_row_click)
+        self.table_widget.clicked.connect(self.on_table_row_click)
         self.table_widget.setAlternatingRowColors(True)
         self.table_widget.setProperty("class", "data-table")
         
@@ -697,14 +674,12 @@ class StudentClassAssignmentForm(AuditBaseForm):
     def load_dropdown_data(self):
         """Load all dropdown data with the new structure"""
         try:
-            # Load distinct education levels (O-Level/A-Level)
-            self.cursor.execute("""
-                SELECT DISTINCT level 
-                FROM classes 
-                WHERE level IS NOT NULL AND level != ''
-                ORDER BY level
-            """)
-            levels = [row[0] for row in self.cursor.fetchall()]
+            # Lookups come from the shared reference-data cache (preloaded at login)
+            cache = get_reference_cache()
+            classes = cache.rows('classes')
+            
+            # Distinct education levels (O-Level/A-Level)
+            levels = sorted({cls[3] for cls in classes if cls[3]})
             self.level_dropdown.clear()
             if levels:
                 self.level_dropdown.addItems(levels)
@@ -712,53 +687,21 @@ class StudentClassAssignmentForm(AuditBaseForm):
                 self.level_dropdown.addItem("No levels found")
             self.all_grade_levels = levels
             
-            # Load only ACTIVE students with their grade information
-            self.cursor.execute("""
-                SELECT id, full_name, grade_applied_for 
-                FROM students 
-                WHERE full_name IS NOT NULL AND full_name != '' AND is_active = 1
-                ORDER BY full_name
-            """)
-            self.all_students = self.cursor.fetchall()
-            
-            print(f"DEBUG: Loaded {len(self.all_students)} ACTIVE students from database:")
-            for i, student in enumerate(self.all_students[:10]):  # Show first 10
-                print(f"DEBUG: Student {i+1}: ID={student[0]}, Name='{student[1]}', Grade='{student[2]}'")
-
-            # Load only ACTIVE students with their grade information
-            self.cursor.execute("""
-                SELECT id, full_name, grade_applied_for 
-                FROM students 
-                WHERE full_name IS NOT NULL AND full_name != '' AND is_active = 1
-                ORDER BY full_name
-            """)
-            self.all_students = self.cursor.fetchall()
+            # Only ACTIVE students with their grade information
+            self.all_students = [(student[0], student[1], student[4])
+                                 for student in cache.rows('active_students') if student[1]]
+            print(f"DEBUG: Loaded {len(self.all_students)} ACTIVE students")
             
             # Clean up duplicate students (optional)
             self.cleanup_inactive_students()
             
-            # Load all classes with their details
-            self.cursor.execute("""
-                SELECT id, class_name, stream, level 
-                FROM classes 
-                WHERE class_name IS NOT NULL AND class_name != ''
-                ORDER BY 
-                    level,
-                    CASE 
-                        WHEN class_name LIKE 'S%' THEN CAST(SUBSTR(class_name, 2) AS SIGNED)
-                        ELSE 999 
-                    END,
-                    stream
-            """)
-            self.all_classes = self.cursor.fetchall()
+            # All classes with their details, ordered by level, form number and stream
+            self.all_classes = [cls[:4] for cls in classes]
+            print(f"DEBUG: Loaded {len(self.all_classes)} classes")
             
-            print(f"DEBUG: Loaded {len(self.all_classes)} classes from database:")
-            for i, cls in enumerate(self.all_classes[:10]):  # Show first 10
-                print(f"DEBUG: Class {i+1}: ID={cls[0]}, Name='{cls[1]}', Stream='{cls[2]}', Level='{cls[3]}'")
-            
-            # Load terms
-            self.cursor.execute("SELECT id, term_name FROM terms ORDER BY term_name")
-            self.all_terms = self.cursor.fetchall()
+            # Terms
+            self.all_terms = sorted((term[:2] for term in cache.rows('terms')),
+                                    key=lambda term: (term[1] or "").lower())
             self.term_dropdown.clear()
             if self.all_terms:
                 terms = [row[1] for row in self.all_terms]
@@ -766,9 +709,8 @@ class StudentClassAssignmentForm(AuditBaseForm):
             else:
                 self.term_dropdown.addItem("No terms found")
             
-            # Load academic years
-            self.cursor.execute("SELECT id, year_name FROM academic_years ORDER BY year_name DESC")
-            self.all_academic_years = self.cursor.fetchall()
+            # Academic years
+            self.all_academic_years = [year[:2] for year in cache.rows('academic_years')]
             self.academic_year_dropdown.clear()
             if self.all_academic_years:
                 academic_years = [row[1] for row in self.all_academic_years]
@@ -963,7 +905,7 @@ class StudentClassAssignmentForm(AuditBaseForm):
             print(f"DEBUG: Found {len(student_list)} ACTIVE students for class {class_name}")
             
             if student_list:
-                self.student_dropdown.setValues(student_list)
+                self.student_dropdown.setValues(student_list, shared_name=f"class_students:{class_name}")
                 status_msg = f"{class_name}: {len(student_list)} active students ({unassigned_count} unassigned, {assigned_count} already assigned)"
             else:
                 self.student_dropdown.setValues([f"No active students found for {class_name}"])
@@ -1699,7 +1641,7 @@ class StudentClassAssignmentForm(AuditBaseForm):
         
         # Show all students when form is cleared
         student_values = [f"{s[1]} (ID: {s[0]})" for s in self.all_students]
-        self.student_dropdown.setValues(student_values)
+        self.student_dropdown.setValues(student_values, shared_name="all_students")
         self.student_dropdown.setCurrentIndex(-1)
         
         self.academic_year_dropdown.setCurrentIndex(-1)
@@ -1803,17 +1745,10 @@ class StudentClassAssignmentForm(AuditBaseForm):
             
     def update_assignments_table(self, assignments):
         """Update the assignments table with new data"""
-        self.table_widget.setRowCount(0)
         self.current_assignments_data = assignments
         
-        # Ensure we have the correct number of columns
-        if self.table_widget.columnCount() != 7:
-            self.table_widget.setColumnCount(7)
-            self.table_widget.setHorizontalHeaderLabels(["Student Name", "Grade", "Class/Stream", "Term", "Year", "Status", "Current"])
-        
-        for row, assignment in enumerate(assignments):
-            self.table_widget.insertRow(row)
-            
+        rows = []
+        for assignment in assignments:
             # Format data for display
             # assignment structure: [id, full_name, grade_applied_for, class_name, stream, term_name, year_name, status, is_current, ...]
             student_name = assignment[1] or "N/A"
@@ -1825,9 +1760,6 @@ class StudentClassAssignmentForm(AuditBaseForm):
             status = assignment[7] or "Active"
             is_current = assignment[8]
             
-            # DEBUG: Print what we're working with
-            print(f"DEBUG: Class='{class_name}', Stream='{stream}'")
-            
             # Create proper Class/Stream display - FIXED
             if stream and stream.strip() and stream != class_name:
                 # If stream exists and is different from class name, show "Class Stream"
@@ -1847,17 +1779,18 @@ class StudentClassAssignmentForm(AuditBaseForm):
                 # Fix patterns like "S1 S1 EAST" -> "S1 EAST"
                 class_stream = class_stream.replace(class_name + " " + class_name, class_name, 1)
             
-            # Add items to table - ALL 7 COLUMNS
-            self.table_widget.setItem(row, 0, QTableWidgetItem(self.truncate_text(student_name, 20)))
-            self.table_widget.setItem(row, 1, QTableWidgetItem(self.truncate_text(grade, 10)))
-            self.table_widget.setItem(row, 2, QTableWidgetItem(self.truncate_text(class_stream, 15)))
-            self.table_widget.setItem(row, 3, QTableWidgetItem(self.truncate_text(term, 10)))
-            self.table_widget.setItem(row, 4, QTableWidgetItem(self.truncate_text(year, 10)))
-            self.table_widget.setItem(row, 5, QTableWidgetItem(self.truncate_text(status, 15)))
-            self.table_widget.setItem(row, 6, QTableWidgetItem("Yes" if is_current else "No"))
+            # ALL 7 COLUMNS
+            rows.append((
+                self.truncate_text(student_name, 20),
+                self.truncate_text(grade, 10),
+                self.truncate_text(class_stream, 15),
+                self.truncate_text(term, 10),
+                self.truncate_text(year, 10),
+                self.truncate_text(status, 15),
+                "Yes" if is_current else "No"
+            ))
         
-        # Resize columns to fit content nicely
-        self.table_widget.resizeColumnsToContents()
+        self.assignments_model.set_rows(rows, assignments)
         
         # Make some columns a bit wider for better readability
         self.table_widget.setColumnWidth(0, 200)  # Student Name
@@ -1875,15 +1808,15 @@ class StudentClassAssignmentForm(AuditBaseForm):
         text_str = str(text)
         return text_str[:max_length] + "..." if len(text_str) > max_length else text_str
         
-    def on_table_row_click(self, row, column):
+    def on_table_row_click(self, index):
         """Handle row selection from table"""
         try:
-            if row < 0 or row >= len(self.current_assignments_data):
+            if not index.isValid():
                 return
                 
-            # Get assignment data
-            assignment_data = self.current_assignments_data[row]
-            assignment_id = assignment_data[0]
+            # Get assignment id (rows may be sorted/filtered in the view)
+            source_row = self.assignments_proxy.source_row(index.row())
+            assignment_id = self.assignments_model.id_at(source_row)
             
             # Switch to the assignment tab
             self.tab_widget.setCurrentIndex(0)
@@ -2012,7 +1945,28 @@ class StudentClassAssignmentForm(AuditBaseForm):
                 self.load_data()
                 return
             
-            self.cursor.execute("""
+            # Student names go through the FULLTEXT / trigram search; the other
+            # searchable columns live in small lookup tables or are enums
+            student_ids = PeopleSearch(self.db_connection).search_student_ids(
+                search_term, limit=SEARCH_STUDENT_LIMIT, include_parents=False
+            )
+            like_term = f'%{search_term}%'
+            conditions = [
+                "c.id IN (SELECT id FROM classes WHERE LOWER(class_name) LIKE %s OR LOWER(stream) LIKE %s)",
+                "t.id IN (SELECT id FROM terms WHERE LOWER(term_name) LIKE %s)",
+                "ay.id IN (SELECT id FROM academic_years WHERE LOWER(year_name) LIKE %s)",
+                "s.grade_applied_for = %s",
+            ]
+            params = [like_term, like_term, like_term, like_term, search_term]
+            if student_ids:
+                conditions.append(f"sca.student_id IN ({','.join(['%s'] * len(student_ids))})")
+                params.extend(student_ids)
+            statuses = [status for status in ASSIGNMENT_STATUSES if search_term in status.lower()]
+            if statuses:
+                conditions.append(f"sca.status IN ({','.join(['%s'] * len(statuses))})")
+                params.extend(statuses)
+
+            self.cursor.execute(f"""
                 SELECT sca.id, s.full_name, s.grade_applied_for,
                        c.class_name, 
                        c.stream,
@@ -2024,15 +1978,9 @@ class StudentClassAssignmentForm(AuditBaseForm):
                 JOIN classes c ON sca.class_id = c.id
                 JOIN terms t ON sca.term_id = t.id
                 JOIN academic_years ay ON sca.academic_year_id = ay.id
-                WHERE LOWER(s.full_name) LIKE %s 
-                   OR LOWER(c.class_name) LIKE %s
-                   OR LOWER(c.stream) LIKE %s
-                   OR LOWER(sca.status) LIKE %s
-                   OR LOWER(s.grade_applied_for) LIKE %s
-                   OR LOWER(t.term_name) LIKE %s
-                   OR LOWER(ay.year_name) LIKE %s
+                WHERE {' OR '.join(conditions)}
                 ORDER BY s.full_name, c.class_name, c.stream
-            """, tuple([f'%{search_term}%'] * 7))
+            """, tuple(params))
             
             assignments = self.cursor.fetchall()
             self.update_assignments_table(assignments)
@@ -2,6 +2,7 @@
 import sys
 import os
 import csv
+import numbers
 import traceback
 from datetime import datetime
 from typing import Optional, Dict, Any, List
@@ -11,7 +12,7 @@ from PySide6.QtWidgets import (
     QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QMessageBox,
     QFileDialog, QScrollArea, QFrame, QGroupBox, QGridLayout, QComboBox,
     QFormLayout, QTabWidget, QMenu, QCheckBox, QDateEdit, QTextEdit, QApplication,
-    QSizePolicy
+    QSizePolicy, QTableView
 )
 from PySide6.QtCore import Qt, QDate, QTimer
 from PySide6.QtGui import QPixmap, QIcon, QFont, QAction 
@@ -19,7 +20,9 @@ from PySide6.QtWidgets import QProgressDialog, QVBoxLayout, QHBoxLayout, QTextEd
 
 # Import from your existing structure
 from ui.audit_base_form import AuditBaseForm
-from utils.permissions import has_permission
+from ui.table_models import DataTableModel, DataTableProxyModel, KeysetPageLoader, attach_data_table
+from services.people_search import PeopleSearch, invalidate_search_index
+from utils.permissions import has_permission, has_permissions
 from models.models import get_db_connection  # Centralized DB connection
 from fpdf import FPDF
 from openpyxl import Workbook
@@ -43,6 +46,35 @@ STUDENT_PERMISSIONS = {
     'import': 'import_students',
     'manage_parents': 'manage_student_parents'
 }
+
+# Rows fetched per page as the students list is scrolled
+STUDENT_PAGE_SIZE = 500
+
+# Rows inserted and committed together by the bulk importer
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '500'))
+
+# Date formats accepted in import files, tried in order
+IMPORT_DATE_FORMATS = [
+    '%Y-%m-%d',      # 2024-05-15
+    '%d/%m/%Y',      # 15/05/2024
+    '%m/%d/%Y',      # 05/15/2024
+    '%d-%m-%Y',      # 15-05-2024
+    '%m-%d-%Y',      # 05-15-2024
+    '%Y/%m/%d',      # 2024/05/15
+    '%d.%m.%Y',      # 15.05.2024
+    '%m.%d.%Y',      # 05.15.2024
+    '%B %d, %Y',     # May 15, 2024
+    '%b %d, %Y',     # May 15, 2024
+    '%Y-%m-%d %H:%M:%S',  # 2024-05-15 10:30:00
+    '%Y-%m-%d %H:%M',     # 2024-05-15 10:30
+]
+
+# Import value normalization (anything else: sex -> Male, grade kept as typed)
+IMPORT_SEX_VALUES = {
+    'm': 'Male', 'male': 'Male', 'boy': 'Male',
+    'f': 'Female', 'female': 'Female', 'girl': 'Female',
+}
+IMPORT_GRADE_VALUES = {grade: grade for grade in ('S1', 'S2', 'S3', 'S4', 'S5', 'S6')}
     
 
 class StudentDetailsPopup(QDialog):
@@ -199,6 +231,7 @@ class StudentDetailsPopup(QDialog):
         self.user_session = user_session
         self.db_connection = None
         self.cursor = None
+        self.finished.connect(self.release_connection)
 
         # Initialize UI widgets
         self.full_name_lbl = QLabel()
@@ -236,6 +269,7 @@ class StudentDetailsPopup(QDialog):
     def load_student_details(self):
         """Load student details from database"""
         try:
+            self.release_connection()
             self.db_connection = get_db_connection()
             if not self.db_connection:
                 QMessageBox.critical(self, "Error", "Failed to connect to database")
@@ -382,12 +416,18 @@ class StudentDetailsPopup(QDialog):
             print(f"Error removing parent: {e}")
             QMessageBox.critical(self, "Error", f"Failed to remove parent: {str(e)}")
 
-    def closeEvent(self, event):
-        """Clean up database connection"""
+    def release_connection(self):
+        """Give the database connection back when the dialog closes (accept/reject or X)"""
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.db_connection and self.db_connection.is_connected():
             self.db_connection.close()
+        self.db_connection = None
+
+    def closeEvent(self, event):
+        """Clean up database connection"""
+        self.release_connection()
         event.accept()
 
 
@@ -836,23 +876,32 @@ class StudentsForm(AuditBaseForm):
         table_layout = QVBoxLayout(table_container)
         table_layout.setContentsMargins(0, 0, 0, 0)
         
-        self.students_table = QTableWidget()
-        self.students_table.setColumnCount(10)
-        self.students_table.setHorizontalHeaderLabels([
+        # Model-backed view: only visible cells are rendered, more rows load on scroll
+        self.students_model = DataTableModel([
             "ID", "Reg No", "Name", "Sex", "Grade", "Class Year",
             "Status", "Email", "Enrollment", "Parent"
-        ])
+        ], parent=self)
+        self.students_proxy = DataTableProxyModel(self)
+        self.students_table = attach_data_table(QTableView(), self.students_model, self.students_proxy)
     
         header = self.students_table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Stretch)
     
         self.students_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.students_table.setSelectionBehavior(QAbstractItemView.SelectRows)
-        self.students_table.cellClicked.connect(self.on_student_select)
+        self.students_table.clicked.connect(self.on_student_select)
         self.students_table.setContextMenuPolicy(Qt.CustomContextMenu)
         self.students_table.customContextMenuRequested.connect(self.show_context_menu)
     
         table_layout.addWidget(self.students_table)
+
+        self.students_loader = None
+        self.students_count_label = QLabel("")
+        self.students_count_label.setStyleSheet("color: #6c757d; padding: 2px;")
+        table_layout.addWidget(self.students_count_label)
+        self.students_model.modelReset.connect(self.update_students_count_label)
+        self.students_model.rowsInserted.connect(self.update_students_count_label)
+
         table_scroll.setWidget(table_container)
         container_layout.addWidget(table_scroll)
 
@@ -886,11 +935,12 @@ class StudentsForm(AuditBaseForm):
 
     def apply_button_permissions(self):
         """Enable/disable buttons based on user permissions"""
-        can_create = has_permission(self.user_session, STUDENT_PERMISSIONS['create'])
-        can_edit = has_permission(self.user_session, STUDENT_PERMISSIONS['edit'])
-        can_delete = has_permission(self.user_session, STUDENT_PERMISSIONS['delete'])
-        can_import = has_permission(self.user_session, STUDENT_PERMISSIONS['import'])
-        can_manage_parents = has_permission(self.user_session, STUDENT_PERMISSIONS['manage_parents'])
+        granted = has_permissions(self.user_session, STUDENT_PERMISSIONS.values())
+        can_create = granted[STUDENT_PERMISSIONS['create']]
+        can_edit = granted[STUDENT_PERMISSIONS['edit']]
+        can_delete = granted[STUDENT_PERMISSIONS['delete']]
+        can_import = granted[STUDENT_PERMISSIONS['import']]
+        can_manage_parents = granted[STUDENT_PERMISSIONS['manage_parents']]
     
         # --- Form Tab Buttons ---
         self.save_btn.setEnabled(can_create)
@@ -943,65 +993,68 @@ class StudentsForm(AuditBaseForm):
     def load_students(self):
         """Load students into the table"""
         try:
+            # Parents are looked up per page row, so the page is read straight
+            # off idx_students_active_name without grouping the whole table
             query = '''
                 SELECT s.id, s.regNo, s.first_name, s.surname, s.sex, 
                        s.grade_applied_for, s.class_year, s.is_active, 
                        s.email, s.enrollment_date,
-                       GROUP_CONCAT(DISTINCT p.full_name SEPARATOR ', ') as parents
+                       (SELECT GROUP_CONCAT(DISTINCT p.full_name SEPARATOR ', ')
+                        FROM student_parent sp
+                        JOIN parents p ON sp.parent_id = p.id AND p.is_active = TRUE
+                        WHERE sp.student_id = s.id) as parents
                 FROM students s
-                LEFT JOIN student_parent sp ON s.id = sp.student_id
-                LEFT JOIN parents p ON sp.parent_id = p.id AND p.is_active = TRUE
-                WHERE s.is_active = TRUE
-                GROUP BY s.id
-                ORDER BY s.surname, s.first_name
-                LIMIT 200
+                WHERE s.is_active = TRUE {seek}
+                ORDER BY s.surname, s.first_name, s.id
             '''
-            self.cursor.execute(query)
-            students = self.cursor.fetchall()
-            
-            self.update_students_table(students)
+            # Keyset paging: each page seeks past the last (surname, first_name, id)
+            self.students_loader = KeysetPageLoader(
+                self.cursor, query,
+                seek_columns=[("s.surname", lambda r: r[3]),
+                              ("s.first_name", lambda r: r[2]),
+                              ("s.id", lambda r: r[0])],
+                page_size=STUDENT_PAGE_SIZE,
+                convert=lambda rows: (self.build_student_rows(rows), None),
+                count_query="SELECT COUNT(*) FROM students WHERE is_active = TRUE"
+            )
+            self.students_loader.load_into(self.students_model)
             
         except Exception as e:
             print(f"Error loading students: {e}")
             QMessageBox.critical(self, "Error", f"Failed to load students: {str(e)}")
 
+    def build_student_rows(self, students):
+        """Convert student query rows into table model rows"""
+        rows = []
+        for student in students:
+            full_name = f"{student[2] or ''} {student[3] or ''}".strip()
+            rows.append((
+                student[0],                                  # ID
+                student[1] or "",                            # Reg No
+                full_name,                                   # Full Name
+                student[4] or "",                            # Sex
+                student[5] or "",                            # Grade
+                student[6] or "",                            # Class Year
+                "Active" if student[7] else "Inactive",      # Status
+                student[8] or "",                            # Email
+                student[9],                                  # Enrollment Date
+                student[10] or ""                            # Parents
+            ))
+        return rows
+
     def update_students_table(self, students):
         """Update the students table with data"""
-        self.students_table.setRowCount(len(students))
-        
-        for row_idx, student in enumerate(students):
-            # ID
-            self.students_table.setItem(row_idx, 0, QTableWidgetItem(str(student[0])))
-            
-            # Reg No
-            self.students_table.setItem(row_idx, 1, QTableWidgetItem(student[1] or ""))
-            
-            # Full Name
-            full_name = f"{student[2] or ''} {student[3] or ''}".strip()
-            self.students_table.setItem(row_idx, 2, QTableWidgetItem(full_name))
-            
-            # Sex
-            self.students_table.setItem(row_idx, 3, QTableWidgetItem(student[4] or ""))
-            
-            # Grade
-            self.students_table.setItem(row_idx, 4, QTableWidgetItem(student[5] or ""))
-            
-            # Class Year
-            self.students_table.setItem(row_idx, 5, QTableWidgetItem(student[6] or ""))
-            
-            # Status
-            status = "Active" if student[7] else "Inactive"
-            self.students_table.setItem(row_idx, 6, QTableWidgetItem(status))
-            
-            # Email
-            self.students_table.setItem(row_idx, 7, QTableWidgetItem(student[8] or ""))
-            
-            # Enrollment Date
-            enrollment_date = str(student[9]) if student[9] else ""
-            self.students_table.setItem(row_idx, 8, QTableWidgetItem(enrollment_date))
-            
-            # Parents
-            self.students_table.setItem(row_idx, 9, QTableWidgetItem(student[10] or ""))
+        self.students_loader = None
+        self.students_model.set_rows(self.build_student_rows(students))
+
+    def update_students_count_label(self, *args):
+        """Show how many students are loaded out of the estimated total"""
+        loaded = self.students_model.rowCount()
+        total = self.students_loader.total_estimate() if self.students_loader else None
+        if total is not None and total > loaded:
+            self.students_count_label.setText(f"Showing {loaded:,} of {total:,} students (scroll to load more)")
+        else:
+            self.students_count_label.setText(f"Showing {loaded:,} students")
 
     def update_full_name(self):
         """Update full name when first name or surname changes"""
@@ -1326,23 +1379,27 @@ class StudentsForm(AuditBaseForm):
     def search_students_common(self, search_term):
         """Common search functionality"""
         try:
-            query = '''
+            # Ranked ids from the FULLTEXT / trigram search (name, reg no, email, parent)
+            student_ids = PeopleSearch(self.db_connection).search_student_ids(search_term, limit=100,
+                                                                             active_only=True)
+            if not student_ids:
+                self.update_students_table([])
+                return
+
+            placeholders = ','.join(['%s'] * len(student_ids))
+            query = f'''
                 SELECT s.id, s.regNo, s.first_name, s.surname, s.sex, 
                        s.grade_applied_for, s.class_year, s.is_active, 
                        s.email, s.enrollment_date,
-                       GROUP_CONCAT(DISTINCT p.full_name SEPARATOR ', ') as parents
+                       (SELECT GROUP_CONCAT(DISTINCT p.full_name SEPARATOR ', ')
+                        FROM student_parent sp
+                        JOIN parents p ON sp.parent_id = p.id AND p.is_active = TRUE
+                        WHERE sp.student_id = s.id) as parents
                 FROM students s
-                LEFT JOIN student_parent sp ON s.id = sp.student_id
-                LEFT JOIN parents p ON sp.parent_id = p.id AND p.is_active = TRUE
-                WHERE s.is_active = TRUE
-                AND (s.first_name LIKE %s OR s.surname LIKE %s OR s.regNo LIKE %s 
-                     OR p.full_name LIKE %s)
-                GROUP BY s.id
-                ORDER BY s.surname, s.first_name
-                LIMIT 100
+                WHERE s.is_active = TRUE AND s.id IN ({placeholders})
+                ORDER BY FIELD(s.id, {placeholders})
             '''
-            like_term = f"%{search_term}%"
-            self.cursor.execute(query, (like_term, like_term, like_term, like_term))
+            self.cursor.execute(query, student_ids + student_ids)
             students = self.cursor.fetchall()
             
             self.update_students_table(students)
@@ -1360,12 +1417,12 @@ class StudentsForm(AuditBaseForm):
         self.list_search_entry.clear()
         self.load_students()
 
-    def on_student_select(self, row, col):
+    def on_student_select(self, index):
         """Handle student selection from table"""
         try:
-            item = self.students_table.item(row, 0)  # Get ID from first column
-            if item:
-                self.current_student_id = int(item.text())
+            if index.isValid():
+                source_row = self.students_proxy.source_row(index.row())
+                self.current_student_id = int(self.students_model.id_at(source_row))
                 print(f"Selected student ID: {self.current_student_id}")
         except Exception as e:
             print(f"Error selecting student: {e}")
@@ -1407,6 +1464,7 @@ class StudentsForm(AuditBaseForm):
             
             # Set current student ID
             self.current_student_id = student_id
+            self.remember_record('students', student_id, dict(zip(self.cursor.column_names, student)))
             
             # Populate form fields
             self.first_name_entry.setText(student[0] or "")
@@ -1618,6 +1676,7 @@ class StudentsForm(AuditBaseForm):
     
             # ✅ Commit first
             self.db_connection.commit()
+            invalidate_search_index('students')
     
             # ✅ Log audit AFTER successful commit
             if self.user_session:
@@ -1671,17 +1730,32 @@ class StudentsForm(AuditBaseForm):
                     photo_path = %s
                 WHERE id = %s
             '''
+            new_values = {
+                'first_name': first_name, 'surname': surname, 'sex': self.sex_combo.currentText(),
+                'date_of_birth': dob, 'email': self.email_entry.text().strip(),
+                'grade_applied_for': self.grade_combo.currentText(),
+                'class_year': self.class_year_entry.text().strip(), 'enrollment_date': enrollment,
+                'regNo': reg_no, 'religion': self.religion_entry.text().strip(),
+                'citizenship': self.citizenship_entry.text().strip(),
+                'last_school': self.last_school_entry.text().strip(),
+                'medical_conditions': self.medical_text.toPlainText(),
+                'allergies': self.allergies_text.toPlainText(),
+                'is_active': self.is_active_check.isChecked(), 'photo_path': self.photo_path
+            }
+            # Values as loaded into the form (read again only if they were not)
+            old_values = self.loaded_record('students', self.current_student_id, new_values)
             values = (
-                first_name, surname, full_name, self.sex_combo.currentText(),
-                dob, self.email_entry.text().strip(), self.grade_combo.currentText(),
-                self.class_year_entry.text().strip(), enrollment, reg_no,
-                self.religion_entry.text().strip(), self.citizenship_entry.text().strip(),
-                self.last_school_entry.text().strip(), self.medical_text.toPlainText(),
-                self.allergies_text.toPlainText(), self.is_active_check.isChecked(),
+                first_name, surname, full_name, new_values['sex'],
+                dob, new_values['email'], new_values['grade_applied_for'],
+                new_values['class_year'], enrollment, reg_no,
+                new_values['religion'], new_values['citizenship'],
+                new_values['last_school'], new_values['medical_conditions'],
+                new_values['allergies'], new_values['is_active'],
                 self.photo_path, self.current_student_id
             )
             self.cursor.execute(query, values)
             self.db_connection.commit()
+            invalidate_search_index('students')
     
             # ✅ Audit log
             if self.user_session:
@@ -1689,7 +1763,9 @@ class StudentsForm(AuditBaseForm):
                     action="UPDATE",
                     table_name="students",
                     record_id=self.current_student_id,
-                    description=f"Updated student: {full_name} (RegNo: {reg_no})"
+                    description=f"Updated student: {full_name} (RegNo: {reg_no})",
+                    old_values=old_values or {},
+                    new_values=new_values
                 )
     
             QMessageBox.information(self, "Success", "Student updated successfully!")
@@ -1853,8 +1929,8 @@ class StudentsForm(AuditBaseForm):
     def export_students_data(self):
         """Export students data using shared export_with_green_header method"""
         try:
-            # Fetch data from database with comprehensive student information
-            self.cursor.execute('''
+            # Comprehensive student information, streamed by the exporter
+            query = '''
                 SELECT 
                     s.regNo, s.first_name, s.surname, s.full_name, s.sex,
                     s.date_of_birth, s.email, s.grade_applied_for, s.class_year,
@@ -1873,12 +1949,7 @@ class StudentsForm(AuditBaseForm):
                 WHERE s.is_active = TRUE
                 GROUP BY s.id
                 ORDER BY s.surname, s.first_name
-            ''')
-            students = self.cursor.fetchall()
-    
-            if not students:
-                QMessageBox.information(self, "No Data", "No student data found to export.")
-                return
+            '''
     
             # Define headers (must match SELECT order exactly)
             headers = [
@@ -1894,12 +1965,13 @@ class StudentsForm(AuditBaseForm):
             school_info = self.get_school_info()
             title = f"{school_info['name']} - STUDENTS DATA"
     
-            # Use shared export method
-            self.export_with_green_header(
-                data=students,
+            # Use shared export method; runs in the background through a server-side cursor
+            self.export_query_with_green_header(
+                query, (),
                 headers=headers,
                 filename_prefix="students_export",
-                title=title
+                title=title,
+                count_query="SELECT COUNT(*) FROM students WHERE is_active = TRUE"
             )
     
         except Exception as e:
@@ -2247,7 +2319,7 @@ class StudentsForm(AuditBaseForm):
                 QMessageBox.warning(self, "Error", "Unsupported file format. Please use CSV or Excel files.")
                 return
             
-            if not students_data:
+            if students_data is None or len(students_data) == 0:
                 QMessageBox.warning(self, "Error", "No valid data found in file.")
                 return
             
@@ -2277,6 +2349,9 @@ class StudentsForm(AuditBaseForm):
             if error_count > 0:
                 result_msg += f"Failed to import: {error_count} students\n"
                 result_msg += f"Check the error log for details."
+                report_path = self.write_import_error_report(import_errors)
+                if report_path:
+                    result_msg += f"\nError report saved to:\n{report_path}"
             
             QMessageBox.information(self, "Import Results", result_msg)
             
@@ -2290,55 +2365,40 @@ class StudentsForm(AuditBaseForm):
             QMessageBox.critical(self, "Import Error", f"Failed to import students: {str(e)}")
     
     def read_csv_file(self, file_path):
-        """Read CSV file and return student data"""
+        """Read CSV file into a DataFrame of text cells (blank rows dropped)"""
         try:
-            students_data = []
-            
-            with open(file_path, 'r', encoding='utf-8') as file:
-                # Try to detect delimiter
-                sample = file.read(1024)
-                file.seek(0)
-                sniffer = csv.Sniffer()
-                delimiter = sniffer.sniff(sample).delimiter
-                
-                reader = csv.DictReader(file, delimiter=delimiter)
-                
-                for row_num, row in enumerate(reader, start=2):  # Start at 2 for header row
-                    if any(row.values()):  # Skip empty rows
-                        row['_row_number'] = row_num
-                        students_data.append(row)
-            
-            return students_data
+            # sep=None lets pandas sniff the delimiter; dtype=str keeps leading zeros
+            df = pd.read_csv(file_path, sep=None, engine='python', dtype=str,
+                             keep_default_na=False, encoding='utf-8')
+            return self.drop_blank_import_rows(df)
             
         except Exception as e:
             QMessageBox.critical(self, "CSV Error", f"Failed to read CSV file: {str(e)}")
-            return []
+            return None
     
     def read_excel_file(self, file_path):
-        """Read Excel file and return student data"""
+        """Read Excel file into a DataFrame (blank rows dropped)"""
         try:
-            students_data = []
-            
-            # Try to read with pandas first
             df = pd.read_excel(file_path, engine='openpyxl')
-            
-            # Convert to list of dictionaries
-            for index, row in df.iterrows():
-                row_dict = row.to_dict()
-                row_dict['_row_number'] = index + 2  # +2 for header and 0-based index
-                
-                # Skip empty rows
-                if any(pd.notna(val) and str(val).strip() for val in row_dict.values() if not str(val).startswith('_')):
-                    students_data.append(row_dict)
-            
-            return students_data
+            return self.drop_blank_import_rows(df)
             
         except Exception as e:
             QMessageBox.critical(self, "Excel Error", f"Failed to read Excel file: {str(e)}")
-            return []
+            return None
+
+    def drop_blank_import_rows(self, df):
+        """Number rows as in the spreadsheet (+2 for header and 0-based index) and drop empty ones"""
+        df = df.reset_index(drop=True)
+        df['_row_number'] = df.index + 2
+        cells = df.drop(columns=['_row_number'])
+        filled = cells.notna() & (cells.astype(str).apply(lambda col: col.str.strip()) != '')
+        return df[filled.any(axis=1)]
     
     def validate_import_data(self, raw_data):
-        """Validate imported data and return processed data with errors"""
+        """
+        Validate imported data and return processed data with errors.
+        Works column-wise on a DataFrame; raw_data may also be a list of row dicts.
+        """
         processed_data = []
         errors = []
         
@@ -2395,110 +2455,122 @@ class StudentsForm(AuditBaseForm):
             'guardian_email': 'parent_email',
         }
         
-        for row_num, row_data in enumerate(raw_data):
-            try:
-                # Normalize column names (lowercase, remove spaces/underscores)
-                normalized_row = {}
-                for key, value in row_data.items():
-                    if not key.startswith('_'):
-                        clean_key = str(key).lower().replace(' ', '_').replace('-', '_')
-                        normalized_row[clean_key] = value
-                
-                # Map to database columns
-                student_data = {'_row_number': row_data.get('_row_number', row_num + 1)}
-                
-                for file_col, db_col in column_mapping.items():
-                    if file_col in normalized_row:
-                        value = normalized_row[file_col]
-                        if pd.notna(value) and str(value).strip():
-                            student_data[db_col] = str(value).strip()
-                
-                # Validate required fields
-                row_errors = []
-                
-                # Check for required fields
-                if not student_data.get('first_name') and not student_data.get('full_name'):
-                    row_errors.append("Missing first name or full name")
-                
-                if not student_data.get('surname') and not student_data.get('full_name'):
-                    row_errors.append("Missing surname or full name")
-                
-                # Generate full name if missing
-                if not student_data.get('full_name'):
-                    first_name = student_data.get('first_name', '').strip()
-                    surname = student_data.get('surname', '').strip()
-                    if first_name or surname:
-                        student_data['full_name'] = f"{first_name} {surname}".strip()
-                
-                # Split full name if individual names missing
-                if student_data.get('full_name') and not student_data.get('first_name'):
-                    name_parts = student_data['full_name'].strip().split()
-                    if len(name_parts) >= 2:
-                        student_data['first_name'] = name_parts[0]
-                        student_data['surname'] = ' '.join(name_parts[1:])
-                    elif len(name_parts) == 1:
-                        student_data['first_name'] = name_parts[0]
-                        student_data['surname'] = ""
-                
-                # Validate email format
-                if student_data.get('email'):
-                    email = student_data['email']
-                    if '@' not in email or '.' not in email.split('@')[-1]:
-                        row_errors.append(f"Invalid email format: {email}")
-                
-                # Validate sex/gender
-                if student_data.get('sex'):
-                    sex = student_data['sex'].lower()
-                    if sex in ['m', 'male', 'boy']:
-                        student_data['sex'] = 'Male'
-                    elif sex in ['f', 'female', 'girl']:
-                        student_data['sex'] = 'Female'
-                    else:
-                        student_data['sex'] = 'Male'  # Default
-                
-                # Parse date of birth
-                if student_data.get('date_of_birth'):
-                    parsed_date = self.parse_date(student_data['date_of_birth'])
-                    if parsed_date:
-                        student_data['date_of_birth'] = parsed_date
-                    else:
-                        row_errors.append(f"Invalid date format: {student_data['date_of_birth']}")
-                
-                # Parse enrollment date
-                if student_data.get('enrollment_date'):
-                    parsed_date = self.parse_date(student_data['enrollment_date'])
-                    if parsed_date:
-                        student_data['enrollment_date'] = parsed_date
-                    else:
-                        student_data['enrollment_date'] = datetime.now().date()
-                else:
-                    student_data['enrollment_date'] = datetime.now().date()
-                
-                # Generate registration number if missing
-                if not student_data.get('regNo'):
-                    student_data['regNo'] = self.generate_import_reg_no()
-                
-                # Set defaults
-                student_data['is_active'] = True
-                student_data['school_id'] = 1  # Default school
-                
-                if row_errors:
-                    errors.append({
-                        'row': student_data['_row_number'],
-                        'errors': row_errors,
-                        'data': student_data
-                    })
-                else:
-                    processed_data.append(student_data)
-                    
-            except Exception as e:
-                errors.append({
-                    'row': row_data.get('_row_number', row_num + 1),
-                    'errors': [f"Processing error: {str(e)}"],
-                    'data': row_data
-                })
+        df = raw_data if isinstance(raw_data, pd.DataFrame) else pd.DataFrame(list(raw_data))
+        if df.empty:
+            return processed_data, errors
+        df = df.reset_index(drop=True)
+
+        default_numbers = pd.Series(range(1, len(df) + 1), index=df.index)
+        if '_row_number' in df.columns:
+            row_numbers = pd.to_numeric(df['_row_number'], errors='coerce').fillna(default_numbers).astype(int)
+        else:
+            row_numbers = default_numbers
+
+        # Normalize column names once (lowercase, spaces/dashes -> underscores)
+        source = df[[col for col in df.columns if not str(col).startswith('_')]].copy()
+        source.columns = [str(col).lower().replace(' ', '_').replace('-', '_') for col in source.columns]
+        source = source.loc[:, ~source.columns.duplicated(keep='last')]
+
+        # Text cells, stripped; blanks become missing
+        text = source.apply(lambda col: col.astype(str).str.strip().where(col.notna()))
+        text = text.where(text != '')
+
+        # Map to database columns; a later alias wins where it has a value
+        data = pd.DataFrame(index=df.index)
+        for file_col, db_col in column_mapping.items():
+            if file_col in text.columns:
+                values = text[file_col]
+                data[db_col] = values.combine_first(data[db_col]) if db_col in data else values
+        for db_col in set(column_mapping.values()):
+            if db_col not in data:
+                data[db_col] = pd.Series(None, index=df.index, dtype=object)
+
+        # Required fields
+        missing_first = data['first_name'].isna() & data['full_name'].isna()
+        missing_surname = data['surname'].isna() & data['full_name'].isna()
+
+        # Generate full name if missing
+        has_part = data['first_name'].notna() | data['surname'].notna()
+        generated = (data['first_name'].fillna('') + ' ' + data['surname'].fillna('')).str.strip()
+        data['full_name'] = data['full_name'].where(data['full_name'].notna() | ~has_part, generated)
+
+        # Split full name if first name missing
+        split_rows = data['full_name'].notna() & data['first_name'].isna()
+        if split_rows.any():
+            parts = data.loc[split_rows, 'full_name'].str.split()
+            data.loc[split_rows, 'first_name'] = parts.str[0]
+            data.loc[split_rows, 'surname'] = parts.str[1:].str.join(' ')
+
+        # Validate email format
+        email = data['email']
+        domain = email.str.rsplit('@', n=1).str[-1]
+        bad_email = email.notna() & (~email.str.contains('@', regex=False, na=False) |
+                                     ~domain.str.contains('.', regex=False, na=False))
+
+        # Normalize sex/gender and grade through fixed category mappings
+        sex = data['sex'].str.lower().map(IMPORT_SEX_VALUES).fillna('Male')
+        data['sex'] = sex.where(data['sex'].notna())
+        grade_key = (data['grade_applied_for'].str.upper()
+                     .str.replace('SENIOR', 'S', regex=False)
+                     .str.replace(r'[\s\-]+', '', regex=True))
+        data['grade_applied_for'] = grade_key.map(IMPORT_GRADE_VALUES).fillna(data['grade_applied_for'])
+
+        # Parse dates
+        dob = self.parse_date_series(data['date_of_birth'])
+        bad_dob = data['date_of_birth'].notna() & dob.isna()
+        data['date_of_birth'] = dob.where(dob.notna(), data['date_of_birth'])
+        enrollment = self.parse_date_series(data['enrollment_date'])
+        data['enrollment_date'] = enrollment.where(enrollment.notna(), datetime.now().date())
+
+        # Generate registration number if missing
+        missing_reg = data['regNo'].isna()
+        if missing_reg.any():
+            data.loc[missing_reg, 'regNo'] = [self.generate_import_reg_no() for _ in range(int(missing_reg.sum()))]
+
+        # Set defaults
+        data['is_active'] = True
+        data['school_id'] = 1  # Default school
+        data['_row_number'] = row_numbers
+
+        has_error = missing_first | missing_surname | bad_email | bad_dob
+        records = data.astype(object).where(data.notna(), None).to_dict('records')
+        for position, record in enumerate(records):
+            student_data = {key: value for key, value in record.items() if value is not None}
+            if not has_error.iat[position]:
+                processed_data.append(student_data)
+                continue
+            row_errors = []
+            if missing_first.iat[position]:
+                row_errors.append("Missing first name or full name")
+            if missing_surname.iat[position]:
+                row_errors.append("Missing surname or full name")
+            if bad_email.iat[position]:
+                row_errors.append(f"Invalid email format: {student_data['email']}")
+            if bad_dob.iat[position]:
+                row_errors.append(f"Invalid date format: {student_data['date_of_birth']}")
+            errors.append({
+                'row': student_data['_row_number'],
+                'errors': row_errors,
+                'data': student_data
+            })
         
         return processed_data, errors
+
+    def parse_date_series(self, values):
+        """
+        Vectorized parse_date: try each of IMPORT_DATE_FORMATS in turn on the
+        values not yet parsed. Returns datetime.date objects (None if unparsed).
+        """
+        parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+        pending = values.notna()
+        for fmt in IMPORT_DATE_FORMATS:
+            if not pending.any():
+                break
+            attempt = pd.to_datetime(values[pending], format=fmt, errors='coerce')
+            hits = attempt[attempt.notna()]
+            parsed.loc[hits.index] = hits
+            pending &= parsed.isna()
+        return parsed.dt.date.astype(object).where(parsed.notna(), None)
     
     def generate_import_reg_no(self):
         """Generate registration number for import"""
@@ -2533,23 +2605,7 @@ class StudentsForm(AuditBaseForm):
             except:
                 return None
     
-        # Common date formats to try
-        formats = [
-            '%Y-%m-%d',      # 2024-05-15
-            '%d/%m/%Y',      # 15/05/2024
-            '%m/%d/%Y',      # 05/15/2024
-            '%d-%m-%Y',      # 15-05-2024
-            '%m-%d-%Y',      # 05-15-2024
-            '%Y/%m/%d',      # 2024/05/15
-            '%d.%m.%Y',      # 15.05.2024
-            '%m.%d.%Y',      # 05.15.2024
-            '%B %d, %Y',     # May 15, 2024
-            '%b %d, %Y',     # May 15, 2024
-            '%Y-%m-%d %H:%M:%S',  # 2024-05-15 10:30:00
-            '%Y-%m-%d %H:%M',     # 2024-05-15 10:30
-        ]
-    
-        for fmt in formats:
+        for fmt in IMPORT_DATE_FORMATS:
             try:
                 return datetime.strptime(str_date, fmt).date()
             except ValueError:
@@ -2559,144 +2615,213 @@ class StudentsForm(AuditBaseForm):
         return None
     
     def import_to_database(self, processed_data, progress_dialog):
-        """Import processed data to database"""
+        """
+        Import processed data to database in chunks.
+
+        Existing regNos and name+DOB keys are loaded once into sets, students
+        and parent links are written with executemany, and every chunk of
+        IMPORT_CHUNK_SIZE rows is committed on its own. A chunk that fails as
+        a batch is retried row by row so only the bad rows are reported.
+        """
         success_count = 0
-        error_count = 0
         import_errors = []
         total_records = len(processed_data)
-    
+
+        def report(idx, student_data, message):
+            import_errors.append({
+                'row': student_data.get('_row_number', idx + 1),
+                'error': message,
+                'student': student_data.get('full_name', 'Unknown')
+            })
+
+        # One query for all duplicate keys instead of two SELECTs per row
+        self.cursor.execute(
+            "SELECT regNo, full_name, date_of_birth FROM students WHERE is_active = TRUE"
+        )
+        existing_reg_nos = set()
+        existing_name_dob = set()
+        for reg_no, full_name, dob in self.cursor.fetchall():
+            if reg_no:
+                existing_reg_nos.add(str(reg_no).casefold())
+            if full_name and dob:
+                existing_name_dob.add((full_name.casefold(), str(dob)))
+
+        # Drop duplicates (against the database and within the file) up front
+        accepted = []
         for idx, student_data in enumerate(processed_data):
-            try:
-                reg_no = student_data.get('regNo')
-                if not reg_no:
-                    error_count += 1
-                    import_errors.append({
-                        'row': student_data.get('_row_number', idx + 1),
-                        'error': "Missing registration number",
-                        'student': student_data.get('full_name', 'Unknown')
-                    })
+            reg_no = student_data.get('regNo')
+            if not reg_no:
+                report(idx, student_data, "Missing registration number")
+                continue
+            reg_key = str(reg_no).casefold()
+            if reg_key in existing_reg_nos:
+                report(idx, student_data, f"Student with regNo '{reg_no}' already exists")
+                continue
+            name_dob_key = None
+            if student_data.get('date_of_birth') and student_data.get('full_name'):
+                name_dob_key = (student_data['full_name'].casefold(), str(student_data['date_of_birth']))
+                if name_dob_key in existing_name_dob:
+                    report(idx, student_data, "Student with same name and DOB already exists")
                     continue
-    
-                # 🔍 CHECK: Does an active student with this regNo already exist?
-                self.cursor.execute(
-                    "SELECT id FROM students WHERE regNo = %s AND is_active = TRUE",
-                    (reg_no,)
-                )
-                if self.cursor.fetchone():
-                    # 🟡 Skip duplicate
-                    import_errors.append({
-                        'row': student_data.get('_row_number', idx + 1),
-                        'error': f"Student with regNo '{reg_no}' already exists",
-                        'student': student_data.get('full_name', 'Unknown')
-                    })
-                    error_count += 1
-                    continue  # 🔴 Skip insertion
-
-                # Optional: Add this after regNo check
-                elif student_data.get('date_of_birth') and student_data.get('full_name'):
-                    self.cursor.execute("""
-                        SELECT id FROM students 
-                        WHERE full_name = %s AND date_of_birth = %s AND is_active = TRUE
-                    """, (student_data['full_name'], student_data['date_of_birth']))
-                    if self.cursor.fetchone():
-                        import_errors.append({
-                            'row': student_data.get('_row_number'),
-                            'error': "Student with same name and DOB already exists",
-                            'student': student_data['full_name']
-                        })
-                        error_count += 1
-                        continue
-    
-                # ✅ No duplicate — proceed with insert
-                current_time = datetime.now()
-                insert_query = '''
-                    INSERT INTO students (
-                        school_id, first_name, surname, full_name, sex, date_of_birth,
-                        religion, citizenship, email, last_school, grade_applied_for, 
-                        class_year, enrollment_date, regNo, is_active, medical_conditions, 
-                        allergies, created_at, updated_at
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                    )
-                '''
-                values = (
-                    student_data.get('school_id', 1),
-                    student_data.get('first_name', ''),
-                    student_data.get('surname', ''),
-                    student_data.get('full_name', ''),
-                    student_data.get('sex', 'Male'),
-                    student_data.get('date_of_birth'),
-                    student_data.get('religion'),
-                    student_data.get('citizenship'),
-                    student_data.get('email'),
-                    student_data.get('last_school'),
-                    student_data.get('grade_applied_for'),
-                    student_data.get('class_year'),
-                    student_data.get('enrollment_date'),
-                    reg_no,
-                    student_data.get('is_active', True),
-                    student_data.get('medical_conditions'),
-                    student_data.get('allergies'),
-                    current_time,
-                    current_time
-                )
-                self.cursor.execute(insert_query, values)
-                student_id = self.cursor.lastrowid
-    
-                # Link parent if provided
-                if student_data.get('parent_name'):
-                    self.create_parent_from_import(student_id, student_data)
-    
-                success_count += 1
-    
+                existing_name_dob.add(name_dob_key)
+            existing_reg_nos.add(reg_key)
+            accepted.append((idx, student_data))
+
+        parent_ids = {}  # parent full_name (casefolded) -> id, shared by all chunks
+        for start in range(0, len(accepted), IMPORT_CHUNK_SIZE):
+            chunk = accepted[start:start + IMPORT_CHUNK_SIZE]
+            # Parents created by a rolled-back chunk must not be reused
+            chunk_parent_ids = dict(parent_ids)
+            try:
+                self.insert_student_chunk([data for _, data in chunk], chunk_parent_ids)
+                self.db_connection.commit()
+                parent_ids = chunk_parent_ids
+                success_count += len(chunk)
             except Exception as e:
-                error_count += 1
-                import_errors.append({
-                    'row': student_data.get('_row_number', idx + 1),
-                    'error': str(e),
-                    'student': student_data.get('full_name', 'Unknown')
-                })
-    
+                self.db_connection.rollback()
+                print(f"Import chunk failed, retrying row by row: {e}")
+                for idx, student_data in chunk:
+                    row_parent_ids = dict(parent_ids)
+                    try:
+                        self.insert_student_chunk([student_data], row_parent_ids)
+                        self.db_connection.commit()
+                        parent_ids = row_parent_ids
+                        success_count += 1
+                    except Exception as row_error:
+                        self.db_connection.rollback()
+                        report(idx, student_data, str(row_error))
+
             # Update progress
-            progress = int((idx + 1) / total_records * 40) + 60
-            if progress_dialog:
-                progress_dialog.setValue(progress)
-    
-        # Commit all changes
-        self.db_connection.commit()
-        return success_count, error_count, import_errors
-    
+            if progress_dialog and accepted:
+                done = min(start + IMPORT_CHUNK_SIZE, len(accepted))
+                progress_dialog.setValue(int(done / len(accepted) * 40) + 60)
+
+        invalidate_search_index()
+        import_errors.sort(key=lambda error: int(error['row']) if isinstance(error['row'], numbers.Integral) else 0)
+        return success_count, total_records - success_count, import_errors
+
+    def insert_student_chunk(self, chunk, parent_ids):
+        """Insert one chunk of students and their parent links (no commit)"""
+        current_time = datetime.now()
+        insert_query = '''
+            INSERT INTO students (
+                school_id, first_name, surname, full_name, sex, date_of_birth,
+                religion, citizenship, email, last_school, grade_applied_for, 
+                class_year, enrollment_date, regNo, is_active, medical_conditions, 
+                allergies, created_at, updated_at
+            ) VALUES (
+                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+            )
+        '''
+        values = [(
+            student_data.get('school_id', 1),
+            student_data.get('first_name', ''),
+            student_data.get('surname', ''),
+            student_data.get('full_name', ''),
+            student_data.get('sex', 'Male'),
+            student_data.get('date_of_birth'),
+            student_data.get('religion'),
+            student_data.get('citizenship'),
+            student_data.get('email'),
+            student_data.get('last_school'),
+            student_data.get('grade_applied_for'),
+            student_data.get('class_year'),
+            student_data.get('enrollment_date'),
+            student_data.get('regNo'),
+            student_data.get('is_active', True),
+            student_data.get('medical_conditions'),
+            student_data.get('allergies'),
+            current_time,
+            current_time
+        ) for student_data in chunk]
+        self.cursor.executemany(insert_query, values)
+
+        with_parent = [data for data in chunk if (data.get('parent_name') or '').strip()]
+        if not with_parent:
+            return
+
+        # regNo is unique, so read the new ids back by regNo
+        reg_nos = [data.get('regNo') for data in with_parent]
+        placeholders = ','.join(['%s'] * len(reg_nos))
+        self.cursor.execute(
+            f"SELECT regNo, id FROM students WHERE regNo IN ({placeholders})", reg_nos
+        )
+        student_ids = {str(reg_no).casefold(): student_id for reg_no, student_id in self.cursor.fetchall()}
+
+        self.create_parents_from_import(with_parent, parent_ids)
+
+        link_query = '''
+            INSERT INTO student_parent (student_id, parent_id, relation_type, is_primary_contact, is_fee_payer, is_emergency_contact)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE relation_type = VALUES(relation_type)
+        '''
+        links = []
+        for data in with_parent:
+            student_id = student_ids.get(str(data.get('regNo')).casefold())
+            parent_id = parent_ids.get(data['parent_name'].strip().casefold())
+            if student_id and parent_id:
+                links.append((student_id, parent_id, 'Guardian', True, True, True))
+        if links:
+            self.cursor.executemany(link_query, links)
+
+    def create_parents_from_import(self, chunk, parent_ids):
+        """
+        Resolve parent ids for a chunk, creating missing parents in one batch.
+        parent_ids (casefolded full_name -> id) is updated in place.
+        """
+        new_names = {}
+        for data in chunk:
+            name = data['parent_name'].strip()
+            key = name.casefold()
+            if key not in parent_ids and key not in new_names:
+                new_names[key] = (name, data)
+        if not new_names:
+            return
+
+        # Existing active parents with the same name are reused
+        names = [name for name, _ in new_names.values()]
+        placeholders = ','.join(['%s'] * len(names))
+        self.cursor.execute(
+            f"SELECT full_name, id FROM parents WHERE is_active = TRUE AND full_name IN ({placeholders}) ORDER BY id",
+            names
+        )
+        for full_name, parent_id in self.cursor.fetchall():
+            parent_ids.setdefault(full_name.casefold(), parent_id)
+
+        missing = [(key, name, data) for key, (name, data) in new_names.items() if key not in parent_ids]
+        if not missing:
+            return
+
+        parent_query = '''
+            INSERT INTO parents (full_name, phone, email, relation, is_active)
+            VALUES (%s, %s, %s, %s, %s)
+        '''
+        self.cursor.executemany(parent_query, [
+            (name, data.get('parent_phone'), data.get('parent_email'), 'Guardian', True)
+            for _, name, data in missing
+        ])
+
+        names = [name for _, name, _ in missing]
+        placeholders = ','.join(['%s'] * len(names))
+        self.cursor.execute(
+            f"SELECT full_name, id FROM parents WHERE is_active = TRUE AND full_name IN ({placeholders}) ORDER BY id",
+            names
+        )
+        for full_name, parent_id in self.cursor.fetchall():
+            parent_ids.setdefault(full_name.casefold(), parent_id)
+
     def create_parent_from_import(self, student_id, student_data):
         """Create parent record from import data"""
         try:
-            parent_name = student_data.get('parent_name', '').strip()
+            parent_name = (student_data.get('parent_name') or '').strip()
             if not parent_name:
                 return
-            
-            # Check if parent already exists
-            self.cursor.execute(
-                "SELECT id FROM parents WHERE full_name = %s AND is_active = TRUE",
-                (parent_name,)
-            )
-            existing_parent = self.cursor.fetchone()
-            
-            if existing_parent:
-                parent_id = existing_parent[0]
-            else:
-                # Create new parent
-                parent_query = '''
-                    INSERT INTO parents (full_name, phone, email, relation, is_active)
-                    VALUES (%s, %s, %s, %s, %s)
-                '''
-                parent_values = (
-                    parent_name,
-                    student_data.get('parent_phone'),
-                    student_data.get('parent_email'),
-                    'Guardian',
-                    True
-                )
-                self.cursor.execute(parent_query, parent_values)
-                parent_id = self.cursor.lastrowid
+
+            parent_ids = {}
+            self.create_parents_from_import([student_data], parent_ids)
+            parent_id = parent_ids.get(parent_name.casefold())
+            if not parent_id:
+                return
             
             # Link student to parent
             link_query = '''
@@ -2708,6 +2833,23 @@ class StudentsForm(AuditBaseForm):
             
         except Exception as e:
             print(f"Error creating parent from import: {e}")
+
+    def write_import_error_report(self, import_errors):
+        """Write per-row import errors to a CSV in the exports folder; returns the path"""
+        try:
+            export_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exports")
+            os.makedirs(export_dir, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            report_path = os.path.join(export_dir, f"student_import_errors_{timestamp}.csv")
+            with open(report_path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(['Row', 'Student', 'Error'])
+                for error in import_errors:
+                    writer.writerow([error.get('row', ''), error.get('student', ''), error.get('error', '')])
+            return report_path
+        except Exception as e:
+            print(f"Error writing import error report: {e}")
+            return None
     
     def show_import_errors(self, errors, processed_data):
         """Show import errors and warnings dialog"""
@@ -2780,6 +2922,9 @@ class StudentsForm(AuditBaseForm):
             result_msg += f"Successfully imported: {success_count} students\n"
             if error_count > 0:
                 result_msg += f"Failed to import: {error_count} students"
+                report_path = self.write_import_error_report(import_errors)
+                if report_path:
+                    result_msg += f"\nError report saved to:\n{report_path}"
             
             QMessageBox.information(self, "Import Results", result_msg)
             self.load_students()
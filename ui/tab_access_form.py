@@ -15,7 +15,9 @@ from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QIcon, QFont, QPalette, QColor
 
 from models.models import get_db_connection
+from utils.permissions import invalidate_permission_cache
 from ui.audit_base_form import AuditBaseForm
+from ui.incremental_search import IncrementalSearch
 
 
 class CheckBoxDelegate(QStyledItemDelegate):
@@ -321,8 +323,16 @@ class TabAccessManagementForm(AuditBaseForm):
 
         self.user_search = QLineEdit()
         self.user_search.setPlaceholderText("Search by name, username, or role...")
-        self.user_search.textChanged.connect(self.filter_users)
         search_layout.addWidget(self.user_search)
+        # Rows are (table row, lowercased row text), rebuilt by load_users
+        self.user_search_texts = []
+        self.users_search = IncrementalSearch(
+            self.user_search,
+            source=lambda: enumerate(self.user_search_texts),
+            match=lambda row, text: text in row[1],
+            delay_ms=150, parent=self
+        )
+        self.users_search.results_ready.connect(self.filter_users)
         left_layout.addWidget(search_group)
 
         # Users table
@@ -634,6 +644,14 @@ class TabAccessManagementForm(AuditBaseForm):
                         last_login_text = str(last_login)
                 self.users_table.setItem(row, 4, QTableWidgetItem(last_login_text))
 
+            self.user_search_texts = [
+                " ".join(self.users_table.item(row, col).text() or ""
+                         for col in range(self.users_table.columnCount())
+                         if self.users_table.item(row, col)).lower()
+                for row in range(self.users_table.rowCount())
+            ]
+            self.users_search.refresh()
+
             header = self.users_table.horizontalHeader()
             header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
             header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
@@ -645,17 +663,11 @@ class TabAccessManagementForm(AuditBaseForm):
             print(f"Error loading users: {e}")
             QMessageBox.warning(self, "Error", "Failed to load users from database")
 
-    def filter_users(self, text):
-        text_lower = (text or "").lower()
+    def filter_users(self, text, matches):
+        """Show only the matching rows (matches come from users_search)"""
+        visible = {row for row, _ in matches}
         for row in range(self.users_table.rowCount()):
-            show_row = not text_lower
-            if not show_row:
-                for col in range(self.users_table.columnCount()):
-                    item = self.users_table.item(row, col)
-                    if item and text_lower in (item.text() or "").lower():
-                        show_row = True
-                        break
-            self.users_table.setRowHidden(row, not show_row)
+            self.users_table.setRowHidden(row, row not in visible)
 
     def load_role_permissions(self, role_name):
         """Load role permissions and properly initialize checkboxes"""
@@ -854,6 +866,7 @@ class TabAccessManagementForm(AuditBaseForm):
                     self.save_user_overrides(cursor, user_id, granted_by)
     
             self.db_connection.commit()
+            invalidate_permission_cache()
             QMessageBox.information(self, "Success", "Permissions saved successfully!")
             self.save_btn.setEnabled(False)
             self.access_changed.emit()
@@ -0,0 +1,478 @@
+# ui/table_models.py
+"""
+Shared table model for large lists.
+
+DataTableModel keeps rows column-wise and only renders the cells the view asks
+for, so a QTableView over tens of thousands of rows costs no more to populate
+than one over a hundred. More rows can be pulled on scroll through
+canFetchMore()/fetchMore(), and DataTableProxyModel sorts and filters the
+loaded rows in memory without going back to the database.
+"""
+from datetime import date, datetime
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+
+from services.query_executor import get_query_executor
+
+
+class DataTableModel(QAbstractTableModel):
+    """
+    Column-backed, read-only table model.
+
+    - headers: list of column titles
+    - id_column: column holding the row's unique id (used by row_for_id)
+    - id_key: alternatively, callable(record) -> id for tables that do not
+      display their id
+    - fetch_more: optional callable returning the next batch of rows (an
+      empty batch means the source is exhausted)
+    """
+
+    def __init__(self, headers, id_column=0, id_key=None, parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.id_column = id_column
+        self.id_key = id_key
+        self._columns = [[] for _ in self.headers]
+        self._records = []
+        self._ids = []
+        self._id_to_row = {}
+        self._role_handlers = {}
+        self._fetch_more = None
+        self._exhausted = True
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def set_rows(self, rows, records=None, fetch_more=None):
+        """
+        Replace the model contents.
+        rows: sequence of row value sequences (one value per column)
+        records: optional original objects (e.g. dict rows) kept alongside
+        fetch_more: optional callable -> (rows, records) for the next batch
+        """
+        self.beginResetModel()
+        self._columns = [[] for _ in self.headers]
+        self._records = []
+        self._ids = []
+        self._id_to_row = {}
+        self._store(rows, records)
+        self._fetch_more = fetch_more
+        self._exhausted = fetch_more is None
+        self.endResetModel()
+
+    def append_rows(self, rows, records=None):
+        """Append rows to the end of the model"""
+        rows = list(rows)
+        if not rows:
+            return
+        start = len(self._records)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self._store(rows, records)
+        self.endInsertRows()
+
+    def _store(self, rows, records):
+        rows = list(rows)
+        records = list(records) if records is not None else rows
+        base = len(self._records)
+        for offset, (row, record) in enumerate(zip(rows, records)):
+            for col, column in enumerate(self._columns):
+                column.append(row[col] if col < len(row) else None)
+            row_id = self.id_key(record) if self.id_key else row[self.id_column]
+            self._ids.append(row_id)
+            self._id_to_row[row_id] = base + offset
+        self._records.extend(records)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        try:
+            batch = self._fetch_more()
+        except Exception as e:
+            print(f"Error fetching more rows: {e}")
+            batch = None
+        rows, records = batch if batch else ([], None)
+        if not rows:
+            self._exhausted = True
+            return
+        self.append_rows(rows, records)
+
+    def fetch_all(self):
+        """Pull every remaining batch from the source (e.g. before an export)"""
+        while self.canFetchMore():
+            self.fetchMore()
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def row_for_id(self, row_id):
+        """Constant-time row lookup by id; -1 if not loaded"""
+        return self._id_to_row.get(row_id, -1)
+
+    def id_at(self, row):
+        return self._ids[row]
+
+    def value(self, row, col):
+        return self._columns[col][row]
+
+    def record_at(self, row):
+        return self._records[row]
+
+    def record_for_id(self, row_id):
+        row = self.row_for_id(row_id)
+        return self._records[row] if row >= 0 else None
+
+    def records(self):
+        return list(self._records)
+
+    def set_value(self, row, col, value):
+        """Update a single loaded cell in place"""
+        self._columns[col][row] = value
+        index = self.index(row, col)
+        self.dataChanged.emit(index, index)
+
+    def set_role_handler(self, role, handler):
+        """
+        Supply values for extra roles (tooltips, colours...).
+        handler(row, col) returns the role value or None.
+        """
+        self._role_handlers[role] = handler
+
+    # ------------------------------------------------------------------
+    # QAbstractTableModel interface
+    # ------------------------------------------------------------------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            return self.display_text(self._columns[col][row])
+        if role == Qt.UserRole:
+            return self._columns[col][row]
+        handler = self._role_handlers.get(role)
+        if handler:
+            return handler(row, col)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return section + 1
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    @staticmethod
+    def display_text(value):
+        if value is None:
+            return ""
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(value, date):
+            return value.strftime('%Y-%m-%d')
+        return str(value)
+
+
+class DataTableProxyModel(QSortFilterProxyModel):
+    """
+    Sort/filter proxy for DataTableModel.
+    Sorts on the raw column values (numbers sort numerically, dates by date)
+    and filters with a case-insensitive text match plus an optional row predicate.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._filter_text = ""
+        self._filter_columns = None
+        self._row_predicate = None
+        # Source rows known not to contain the current filter text
+        self._text_rejected = set()
+
+    def setSourceModel(self, model):
+        old_model = self.sourceModel()
+        if old_model is not None:
+            old_model.modelReset.disconnect(self._forget_rejected)
+            old_model.dataChanged.disconnect(self._forget_rejected)
+        super().setSourceModel(model)
+        if model is not None:
+            model.modelReset.connect(self._forget_rejected)
+            model.dataChanged.connect(self._forget_rejected)
+        self._text_rejected = set()
+
+    def _forget_rejected(self, *args):
+        self._text_rejected = set()
+
+    def set_filter_text(self, text, columns=None):
+        """
+        Show rows where any of `columns` (default: all) contains text.
+        When text extends the previous filter text, rows it already rejected
+        stay rejected without being scanned again.
+        """
+        text = (text or "").strip().lower()
+        narrowing = (self._filter_text and self._filter_text in text
+                     and columns == self._filter_columns)
+        if not narrowing:
+            self._text_rejected = set()
+        self._filter_text = text
+        self._filter_columns = columns
+        self.invalidateFilter()
+
+    def set_row_predicate(self, predicate):
+        """predicate(source_model, source_row) -> bool; None clears it"""
+        self._row_predicate = predicate
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        model = self.sourceModel()
+        if self._row_predicate and not self._row_predicate(model, source_row):
+            return False
+        if not self._filter_text:
+            return True
+        if source_row in self._text_rejected:
+            return False
+        columns = self._filter_columns if self._filter_columns is not None else range(model.columnCount())
+        for col in columns:
+            if self._filter_text in model.display_text(model.value(source_row, col)).lower():
+                return True
+        self._text_rejected.add(source_row)
+        return False
+
+    def lessThan(self, left, right):
+        model = self.sourceModel()
+        a = model.value(left.row(), left.column())
+        b = model.value(right.row(), right.column())
+        if a is None or b is None:
+            return a is None and b is not None
+        try:
+            return a < b
+        except TypeError:
+            return str(a) < str(b)
+
+    def source_row(self, proxy_row):
+        """Map a row in the view back to the DataTableModel row"""
+        return self.mapToSource(self.index(proxy_row, 0)).row()
+
+
+class OffsetPageLoader:
+    """
+    Callable that returns successive LIMIT/OFFSET pages of a query, for use as
+    a DataTableModel fetch_more source.
+    convert(rows) -> (rows, records) shapes the raw cursor rows for the model.
+    """
+
+    def __init__(self, cursor, query, params=(), page_size=500, convert=None):
+        self.cursor = cursor
+        self.query = query
+        self.params = tuple(params)
+        self.page_size = page_size
+        self.convert = convert
+        self.offset = 0
+        self.exhausted = False
+
+    def __call__(self):
+        if self.exhausted:
+            return [], None
+        self.cursor.execute(f"{self.query} LIMIT %s OFFSET %s",
+                            self.params + (self.page_size, self.offset))
+        rows = self.cursor.fetchall()
+        self.offset += len(rows)
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        return self.convert(rows) if self.convert else (rows, None)
+
+    def load_into(self, model):
+        """Load the first page into model, keeping self as the fetch_more source"""
+        rows, records = self()
+        model.set_rows(rows, records, fetch_more=None if self.exhausted else self)
+
+
+class KeysetPageLoader:
+    """
+    Seek-based pager for a DataTableModel fetch_more source.
+
+    Instead of OFFSET (which reads and discards every earlier row, so page 50
+    costs 50 pages of work) each page continues from the sort key of the last
+    row served, so deep pages are as cheap as the first when the sort columns
+    are indexed.
+
+    - query must contain a `{seek}` placeholder where an extra
+      `AND (...)` condition can go (i.e. inside the WHERE clause, before any
+      GROUP BY) and must already ORDER BY the seek columns, all ascending
+      (or all descending, with descending=True, e.g. newest log rows first)
+    - seek_columns: list of (sql_expression, key) pairs, the last one unique
+      (normally the primary key). key(raw_row) returns that column's value.
+    - count_query: optional cheap COUNT(*) used for total_estimate()
+    - prefetch: read the next page on the query executor's threads so
+      scrolling does not wait; prefetch_key (default: one per cursor, i.e.
+      per form) makes a new loader's prefetch supersede the old loader's
+    """
+
+    def __init__(self, cursor, query, seek_columns, params=(), page_size=500,
+                 convert=None, count_query=None, count_params=(), prefetch=True, descending=False,
+                 prefetch_key=None):
+        self.cursor = cursor
+        self.descending = descending
+        self.query = query
+        self.seek_columns = list(seek_columns)
+        self.params = tuple(params)
+        self.page_size = page_size
+        self.convert = convert
+        self.count_query = count_query
+        self.count_params = tuple(count_params)
+        self.prefetch = prefetch
+        self.prefetch_key = prefetch_key or f"keyset_prefetch.{id(cursor)}"
+        self.last_key = None
+        self.loaded = 0
+        self.exhausted = False
+        self._total = None
+        self._buffer = None
+        self._prefetch_future = None
+        self._dictionary_rows = False
+
+    def _seek_condition(self):
+        """
+        Expand (a, b, c) > (x, y, z) into nested OR/AND comparisons, which
+        MySQL turns into an index range scan. NULLs sort first, as in MySQL
+        (so last when descending).
+        """
+        if self.last_key is None:
+            return "", ()
+
+        def greater(expr, value):
+            # "comes after value" in the sort order
+            if self.descending:
+                return ("FALSE", ()) if value is None else (f"({expr} < %s OR {expr} IS NULL)", (value,))
+            return (f"{expr} IS NOT NULL", ()) if value is None else (f"{expr} > %s", (value,))
+
+        def equal(expr, value):
+            return (f"{expr} IS NULL", ()) if value is None else (f"{expr} = %s", (value,))
+
+        columns = [expr for expr, _ in self.seek_columns]
+        condition, params = greater(columns[-1], self.last_key[-1])
+        for expr, value in reversed(list(zip(columns[:-1], self.last_key[:-1]))):
+            gt_sql, gt_params = greater(expr, value)
+            eq_sql, eq_params = equal(expr, value)
+            condition = f"{gt_sql} OR ({eq_sql} AND ({condition}))"
+            params = gt_params + eq_params + params
+        return f" AND ({condition})", params
+
+    def page_query(self):
+        """(sql, params) for the next page, e.g. to run it on a worker thread"""
+        seek_sql, seek_params = self._seek_condition()
+        return (f"{self.query.format(seek=seek_sql)} LIMIT %s",
+                self.params + seek_params + (self.page_size,))
+
+    def accept_page(self, rows):
+        """Record a page read elsewhere (see page_query) and return it converted"""
+        rows = self._advance(rows)
+        self.loaded += len(rows)
+        self._schedule_prefetch()
+        return self.convert(rows) if self.convert else (rows, None)
+
+    def _advance(self, rows):
+        rows = list(rows)
+        if rows:
+            last = rows[-1]
+            self._dictionary_rows = isinstance(last, dict)
+            self.last_key = tuple(key(last) for _, key in self.seek_columns)
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        return rows
+
+    def _read_page(self):
+        sql, params = self.page_query()
+        self.cursor.execute(sql, params)
+        return self._advance(self.cursor.fetchall())
+
+    def _schedule_prefetch(self):
+        if not self.prefetch or self.exhausted or self._buffer is not None or self._prefetch_future is not None:
+            return
+        sql, params = self.page_query()
+        future = get_query_executor().submit(
+            sql, params, key=self.prefetch_key, dictionary=self._dictionary_rows,
+            on_result=lambda rows: self._prefetched(future, rows),
+            on_error=lambda error: self._prefetch_failed(future, error)
+        )
+        self._prefetch_future = future
+
+    def _prefetched(self, future, rows):
+        # A page read in the meantime (or a newer prefetch) makes this one stale
+        if future is not self._prefetch_future:
+            return
+        self._prefetch_future = None
+        self._buffer = self._advance(rows)
+
+    def _prefetch_failed(self, future, error):
+        if future is self._prefetch_future:
+            self._prefetch_future = None
+        print(f"Error prefetching page: {error}")
+
+    def _cancel_prefetch(self):
+        future, self._prefetch_future = self._prefetch_future, None
+        if future is not None:
+            future.cancel()
+
+    def has_more(self):
+        return self._buffer is not None or not self.exhausted
+
+    def __call__(self):
+        if self._buffer is not None:
+            rows, self._buffer = self._buffer, None
+        elif self.exhausted:
+            return [], None
+        else:
+            # Needed now: read it here rather than wait for a prefetch in flight
+            self._cancel_prefetch()
+            rows = self._read_page()
+        self.loaded += len(rows)
+        self._schedule_prefetch()
+        return self.convert(rows) if self.convert else (rows, None)
+
+    def load_into(self, model):
+        """Load the first page into model, keeping self as the fetch_more source"""
+        rows, records = self()
+        model.set_rows(rows, records, fetch_more=self if self.has_more() else None)
+
+    def total_estimate(self):
+        """Total row count from count_query (cached); None if unavailable"""
+        if self._total is None and self.count_query:
+            try:
+                self.cursor.execute(self.count_query, self.count_params)
+                row = self.cursor.fetchone()
+                self._total = int(row[0]) if row and row[0] is not None else None
+            except Exception as e:
+                print(f"Error estimating row count: {e}")
+        if self._total is not None and self.exhausted and self._buffer is None:
+            return self.loaded
+        return self._total
+
+
+def attach_data_table(view, model, proxy=None, sortable=True):
+    """
+    Wire a QTableView to a DataTableModel (optionally through a proxy).
+    Rows keep the query's order until the user clicks a header to sort.
+    """
+    if proxy is not None:
+        proxy.setSourceModel(model)
+        view.setModel(proxy)
+    else:
+        view.setModel(model)
+    if sortable and proxy is not None:
+        view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        view.setSortingEnabled(True)
+    view.verticalHeader().setVisible(False)
+    return view
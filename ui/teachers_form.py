@@ -9,7 +9,7 @@ from datetime import datetime
 from typing import Optional, Dict, Any
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QDialog,
-    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
+    QTableWidget, QTableWidgetItem, QTableView, QHeaderView, QAbstractItemView,
     QMessageBox, QFileDialog, QScrollArea, QFrame, QSizePolicy,
     QGroupBox, QGridLayout, QSpacerItem, QComboBox, QFormLayout, 
     QTabWidget, QMenu, QCheckBox, QDateEdit, QTextEdit, QApplication, QLineEdit
@@ -21,13 +21,18 @@ from mysql.connector import Error
 from PIL import Image, ImageQt
 from utils.permissions import has_permission
 from ui.audit_base_form import AuditBaseForm
+from services.reference_cache import get_reference_cache
+from services.audit_diff import diff_values
 from ui.departments_form import DepartmentsForm
+from ui.table_models import DataTableModel, DataTableProxyModel, KeysetPageLoader, attach_data_table
 from utils.pdf_utils import view_pdf
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from models.models import get_db_connection
 
+# Teachers fetched per page as the list is scrolled
+TEACHER_PAGE_SIZE = 500
 
 # Change class definition
 class TeachersForm(AuditBaseForm):
@@ -481,21 +486,23 @@ class TeachersForm(AuditBaseForm):
         table_group = QGroupBox("Teachers List")
         table_layout = QVBoxLayout(table_group)
         
-        # Create table
-        self.teachers_table = QTableWidget()
-        self.teachers_table.setAlternatingRowColors(True)
-        self.teachers_table.setSelectionBehavior(QAbstractItemView.SelectRows)
-        self.teachers_table.setSelectionMode(QAbstractItemView.SingleSelection)
-        self.teachers_table.setSortingEnabled(True)
-        
         # Set headers
         self.teachers_table_headers = [
             "ID", "Teacher ID", "Full Name", "Email", "Phone", 
             "Subject", "Staff Type", "Emp. Status", "Active", "Position",
             "Date Joined", "Qualification", "Gender", "Curr. Address"
         ]
-        self.teachers_table.setColumnCount(len(self.teachers_table_headers))
-        self.teachers_table.setHorizontalHeaderLabels(self.teachers_table_headers)
+
+        # Create table
+        self.teachers_model = DataTableModel(self.teachers_table_headers, parent=self)
+        self.teachers_model.set_role_handler(Qt.TextAlignmentRole, self.teacher_cell_alignment)
+        self.teachers_proxy = DataTableProxyModel(self)
+        self.teachers_loader = None
+        self.teachers_table = attach_data_table(QTableView(), self.teachers_model, self.teachers_proxy)
+        self.teachers_table.setAlternatingRowColors(True)
+        self.teachers_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.teachers_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.teachers_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         
         # Configure table
         header = self.teachers_table.horizontalHeader()
@@ -503,8 +510,8 @@ class TeachersForm(AuditBaseForm):
         header.setStretchLastSection(True)
         
         # Connect selection signal
-        self.teachers_table.itemSelectionChanged.connect(self.on_teacher_select)
-        self.teachers_table.itemDoubleClicked.connect(self.edit_selected_teacher)
+        self.teachers_table.selectionModel().selectionChanged.connect(self.on_teacher_select)
+        self.teachers_table.doubleClicked.connect(self.edit_selected_teacher)
         
         table_layout.addWidget(self.teachers_table)
         parent_layout.addWidget(table_group)
@@ -613,8 +620,8 @@ class TeachersForm(AuditBaseForm):
     def load_schools(self):
         """Load schools for dropdown"""
         try:
-            self.cursor.execute("SELECT id, school_name FROM schools ORDER BY school_name")
-            schools = self.cursor.fetchall()
+            schools = sorted((school[:2] for school in get_reference_cache().rows('schools')),
+                             key=lambda school: (school[1] or "").lower())
             
             self.school_combo.clear()
             self.school_combo.addItem("", None)  # Empty option
@@ -870,51 +877,6 @@ class TeachersForm(AuditBaseForm):
         try:
             school_id = self.get_school_id_from_selection()
     
-            # --- Step 1: Get current (old) values ---
-            self.cursor.execute("""
-                SELECT school_id, teacher_id_code, salutation, first_name, surname, full_name,
-                       email, gender, phone_contact_1, day_phone, current_address, home_district,
-                       subject_specialty, qualification, date_joined, emergency_contact_1,
-                       emergency_contact_2, national_id_number, birth_date, bank_account_number,
-                       next_of_kin, employment_status, is_active, staff_type, position, monthly_salary, department_id
-                FROM teachers WHERE id = %s
-            """, (self.current_teacher_id,))
-            old_data = self.cursor.fetchone()
-            if not old_data:
-                QMessageBox.warning(self, "Error", "Teacher not found.")
-                return
-    
-            # Map old values
-            old_fields = {
-                'school_id': old_data[0],
-                'teacher_id_code': old_data[1],
-                'salutation': old_data[2],
-                'first_name': old_data[3],
-                'surname': old_data[4],
-                'full_name': f"{old_data[3]} {old_data[4]}".strip(),
-                'email': old_data[6],
-                'gender': old_data[7],
-                'phone_contact_1': old_data[8],
-                'day_phone': old_data[9],
-                'current_address': old_data[10],
-                'home_district': old_data[11],
-                'subject_specialty': old_data[12],
-                'qualification': old_data[13],
-                'date_joined': old_data[14].strftime('%Y-%m-%d') if old_data[14] else None,
-                'emergency_contact_1': old_data[15],
-                'emergency_contact_2': old_data[16],
-                'national_id_number': old_data[17],
-                'birth_date': old_data[18].strftime('%Y-%m-%d') if old_data[18] else None,
-                'bank_account_number': old_data[19],
-                'next_of_kin': old_data[20],
-                'employment_status': old_data[21],
-                'is_active': bool(old_data[22]),
-                'staff_type': old_data[23],
-                'position': old_data[24],
-                'monthly_salary': float(old_data[25]) if old_data[25] else 0.0,
-                'department_id': old_data[26]
-            }
-    
             # --- Step 2: Get new values ---
             first_name = self.first_name_entry.text().strip()
             surname = self.surname_entry.text().strip()
@@ -955,7 +917,15 @@ class TeachersForm(AuditBaseForm):
                 'department_id': self.get_department_id_from_selection()
             }
     
-            # --- Step 3: Compare and build changes ---
+            # --- Step 3: Compare with the values loaded into the form ---
+            old_fields = self.loaded_record('teachers', self.current_teacher_id, new_fields)
+            if not old_fields:
+                QMessageBox.warning(self, "Error", "Teacher not found.")
+                return
+            # An empty salary field saves 0.0, so a NULL stored salary is the same value
+            old_fields = dict(old_fields, monthly_salary=float(old_fields.get('monthly_salary') or 0))
+            old_changed, new_changed = diff_values(old_fields, new_fields)
+
             changes = []
             field_labels = {
                 'teacher_id_code': 'Teacher ID',
@@ -978,12 +948,9 @@ class TeachersForm(AuditBaseForm):
                 'department_id': 'Department'
             }
     
-            for field in old_fields:
-                old_val = old_fields[field]
-                new_val = new_fields[field]
-                if old_val != new_val:
-                    label = field_labels.get(field, field.replace('_', ' ').title())
-                    changes.append(f"{label} changed from '{old_val}' to '{new_val}'")
+            for field, new_val in new_changed.items():
+                label = field_labels.get(field, field.replace('_', ' ').title())
+                changes.append(f"{label} changed from '{old_changed[field]}' to '{new_val}'")
     
             if not changes:
                 QMessageBox.information(self, "No Changes", "No data was changed.")
@@ -1021,7 +988,9 @@ class TeachersForm(AuditBaseForm):
                 action="UPDATE",
                 table_name="teachers",
                 record_id=self.current_teacher_id,
-                description=f"Updated teacher {full_name} (ID: {new_fields['teacher_id_code']}): {change_desc}"
+                description=f"Updated teacher {full_name} (ID: {new_fields['teacher_id_code']}): {change_desc}",
+                old_values=old_changed,
+                new_values=new_changed
             )
     
             QMessageBox.information(self, "Success", "Teacher updated successfully!")
@@ -1108,13 +1077,7 @@ class TeachersForm(AuditBaseForm):
     def load_departments_combo(self):
         """Load departments into department combo box"""
         try:
-            self.cursor.execute("""
-                SELECT id, department_name 
-                FROM departments 
-                WHERE is_active = 1 
-                ORDER BY department_name
-            """)
-            departments = self.cursor.fetchall()
+            departments = [dept[:2] for dept in get_reference_cache().rows('departments') if dept[2]]
             self.department_combo.clear()
             self.department_combo.addItem("", None)  # No department
             for dept in departments:
@@ -1191,50 +1154,8 @@ class TeachersForm(AuditBaseForm):
     def load_teachers(self):
         """Load teachers data into the table"""
         try:
-            # Update query to include the new fields
-            query = '''
-                SELECT
-                    t.id, t.teacher_id_code, t.full_name, t.email, t.phone_contact_1,
-                    t.subject_specialty, t.staff_type, t.employment_status, t.is_active,
-                    t.position, t.date_joined, t.qualification, t.gender, t.current_address
-                FROM teachers t
-                ORDER BY t.full_name
-            '''
-            self.cursor.execute(query)
-            teachers = self.cursor.fetchall()
-    
-            # Set table dimensions
-            self.teachers_table.setRowCount(len(teachers))
-            self.teachers_table.setColumnCount(len(self.teachers_table_headers))
-            
-            # Populate table
-            for row_idx, teacher in enumerate(teachers):
-                items = [
-                    str(teacher[0]),                              # id
-                    teacher[1] or "",                             # teacher_id_code
-                    teacher[2] or "",                             # full_name
-                    teacher[3] or "",                             # email
-                    teacher[4] or "",                             # phone_contact_1
-                    teacher[5] or "",                             # subject_specialty
-                    teacher[6] or "",                             # staff_type
-                    teacher[7] or "",                             # employment_status
-                    "Yes" if teacher[8] else "No",                # is_active
-                    teacher[9] or "",                             # position
-                    str(teacher[10] or ""),                       # date_joined
-                    teacher[11] or "",                            # qualification
-                    teacher[12] or "",                            # gender
-                    teacher[13] or ""                             # current_address
-                ]
-                
-                for col_idx, item in enumerate(items):
-                    table_item = QTableWidgetItem(str(item))
-                    table_item.setData(Qt.UserRole, teacher[0])  # Store teacher ID
-                    
-                    #Right-align current address column
-                    if col_idx == 13:  # current address column
-                        table_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-                    
-                    self.teachers_table.setItem(row_idx, col_idx, table_item)
+            self.teachers_loader = self.create_teachers_loader()
+            self.teachers_loader.load_into(self.teachers_model)
     
             # Configure column sizing
             self.configure_table_columns()
@@ -1243,6 +1164,56 @@ class TeachersForm(AuditBaseForm):
             print(f"Error loading teachers: {e}")
             QMessageBox.critical(self, "Error", f"Error loading teachers: {str(e)}")
 
+    def create_teachers_loader(self, conditions="", params=()):
+        """Keyset pager over teachers ordered by (surname, first_name, id)"""
+        query = '''
+            SELECT
+                t.id, t.teacher_id_code, t.full_name, t.email, t.phone_contact_1,
+                t.subject_specialty, t.staff_type, t.employment_status, t.is_active,
+                t.position, t.date_joined, t.qualification, t.gender, t.current_address,
+                t.surname, t.first_name
+            FROM teachers t
+            WHERE 1=1 ''' + conditions + ''' {seek}
+            ORDER BY t.surname, t.first_name, t.id
+        '''
+        return KeysetPageLoader(
+            self.cursor, query,
+            seek_columns=[("t.surname", lambda r: r[14]),
+                          ("t.first_name", lambda r: r[15]),
+                          ("t.id", lambda r: r[0])],
+            params=params,
+            page_size=TEACHER_PAGE_SIZE,
+            convert=lambda rows: (self.build_teacher_rows(rows), None)
+        )
+
+    def build_teacher_rows(self, teachers):
+        """Convert teacher query rows into table model rows"""
+        rows = []
+        for teacher in teachers:
+            rows.append((
+                teacher[0],                                   # id
+                teacher[1] or "",                             # teacher_id_code
+                teacher[2] or "",                             # full_name
+                teacher[3] or "",                             # email
+                teacher[4] or "",                             # phone_contact_1
+                teacher[5] or "",                             # subject_specialty
+                teacher[6] or "",                             # staff_type
+                teacher[7] or "",                             # employment_status
+                "Yes" if teacher[8] else "No",                # is_active
+                teacher[9] or "",                             # position
+                teacher[10] or "",                            # date_joined
+                teacher[11] or "",                            # qualification
+                teacher[12] or "",                            # gender
+                teacher[13] or ""                             # current_address
+            ))
+        return rows
+
+    def teacher_cell_alignment(self, row, col):
+        """Right-align current address column"""
+        if col == 13:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
     def configure_table_columns(self):
         """Configure table column sizing policies"""
         header = self.teachers_table.horizontalHeader()
@@ -1277,14 +1248,7 @@ class TeachersForm(AuditBaseForm):
                 self.load_teachers()
                 return
     
-            # Update query to include new fields in search
-            query = '''
-                SELECT  
-                    t.id, t.teacher_id_code, t.full_name, t.email, t.phone_contact_1,
-                    t.subject_specialty, t.staff_type, t.employment_status, t.is_active,
-                    t.position, t.date_joined, t.qualification, t.gender, t.current_address
-                FROM teachers t
-                WHERE  
+            conditions = ''' AND (
                     LOWER(t.full_name) LIKE LOWER(%s) OR  
                     LOWER(t.first_name) LIKE LOWER(%s) OR  
                     LOWER(t.surname) LIKE LOWER(%s) OR
@@ -1296,46 +1260,14 @@ class TeachersForm(AuditBaseForm):
                     LOWER(t.position) LIKE LOWER(%s) OR
                     LOWER(t.qualification) LIKE LOWER(%s) OR
                     LOWER(t.gender) LIKE LOWER(%s) OR
-                    LOWER(t.current_address) LIKE LOWER(%s)
-                ORDER BY t.full_name
-            '''
+                    LOWER(t.current_address) LIKE LOWER(%s))'''
     
             search_pattern = f"%{search_term}%"
             params = tuple([search_pattern] * 12)  # Increased to 12 for the new search fields
-            self.cursor.execute(query, params)
-            teachers = self.cursor.fetchall()
-    
+
             # Update table with search results
-            self.teachers_table.setRowCount(len(teachers))
-            
-            for row_idx, teacher in enumerate(teachers):
-                items = [
-                    str(teacher[0]),                              # id
-                    teacher[1] or "",                             # teacher_id_code
-                    teacher[2] or "",                             # full_name
-                    teacher[3] or "",                             # email
-                    teacher[4] or "",                             # phone_contact_1
-                    teacher[5] or "",                             # subject_specialty
-                    teacher[6] or "",                             # staff_type
-                    teacher[7] or "",                             # employment_status
-                    "Yes" if teacher[8] else "No",                # is_active
-                    teacher[9] or "",                             # position
-                    str(teacher[10] or ""),                       # date_joined
-                    teacher[11] or "",                            # qualification
-                    teacher[12] or "",                            # gender
-                    teacher[13] or ""                             # current_address
-                    #f"{float(teacher[14] or 0):,.2f}" if teacher[14] else "0.00"  # monthly_salary
-                ]
-                
-                for col_idx, item in enumerate(items):
-                    table_item = QTableWidgetItem(str(item))
-                    table_item.setData(Qt.UserRole, teacher[0])
-                    
-                    # Right-align salary column
-                    if col_idx == 13:  # current address column
-                        table_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-                    
-                    self.teachers_table.setItem(row_idx, col_idx, table_item)
+            self.teachers_loader = self.create_teachers_loader(conditions, params)
+            self.teachers_loader.load_into(self.teachers_model)
     
             self.configure_table_columns()
     
@@ -1351,21 +1283,21 @@ class TeachersForm(AuditBaseForm):
     def on_teacher_select(self):
         """Handle teacher selection from table"""
         try:
-            selected_items = self.teachers_table.selectedItems()
-            if not selected_items:
+            selected_rows = self.teachers_table.selectionModel().selectedRows()
+            if not selected_rows:
                 return
                 
-            # Get teacher ID from the first selected item (first column)
-            row = selected_items[0].row()
-            teacher_id_item = self.teachers_table.item(row, 0)
+            # Get teacher ID from the selected row
+            row = self.teachers_proxy.mapToSource(selected_rows[0]).row()
+            teacher_id = self.teachers_model.id_at(row)
             
-            if teacher_id_item:
-                teacher_id = int(teacher_id_item.text())
+            if teacher_id:
+                teacher_id = int(teacher_id)
                 self.current_teacher_id = teacher_id
                 self.load_teacher_data(teacher_id)
                 
                 # Show selection message
-                teacher_name = self.teachers_table.item(row, 2).text()
+                teacher_name = self.teachers_model.value(row, 2)
                 QMessageBox.information(
                     self, 
                     "Teacher Selected",
@@ -1405,6 +1337,7 @@ class TeachersForm(AuditBaseForm):
             
             # Set current teacher ID
             self.current_teacher_id = teacher_id
+            self.remember_record('teachers', teacher_id, dict(zip(self.cursor.column_names, teacher)))
             
             # Populate form fields using tuple indices
             self.teacher_id_entry.setText(teacher[2] or "")        # teacher_id_code
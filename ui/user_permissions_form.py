@@ -6,7 +6,7 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt
 from ui.audit_base_form import AuditBaseForm
-from utils.permissions import has_permission
+from utils.permissions import has_permission, invalidate_permission_cache
 from models.models import get_db_connection
 from mysql.connector import Error
 from PySide6.QtGui import QColor
@@ -226,6 +226,7 @@ class UserPermissionsForm(AuditBaseForm):
 
             conn.commit()
             conn.close()
+            invalidate_permission_cache(user_id)
 
             self.log_audit_action(
                 "GRANT",
@@ -296,6 +297,7 @@ class UserPermissionsForm(AuditBaseForm):
             cursor.execute(delete_query)
             conn.commit()
             conn.close()
+            invalidate_permission_cache()
     
             # Log the action
             self.log_audit_action(
@@ -19,60 +19,9 @@ from mysql.connector import Error
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.models import get_db_connection
 from utils.auth import hash_password
-from utils.permissions import has_permission
+from utils.permissions import has_permission, has_permissions
 from ui.audit_base_form import AuditBaseForm
-
-
-class SearchableComboBox(QComboBox):
-    """Enhanced ComboBox with search functionality"""
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setEditable(True)
-        self.original_data = []  # Store (display_text, value) pairs
-        self.lineEdit().textEdited.connect(self.filter_values)
-        self.lineEdit().returnPressed.connect(self.on_return_pressed)
-        self.setMaxVisibleItems(10)
-        
-    def setData(self, data_list):
-        """Set the data for the combobox - list of (display_text, value) tuples"""
-        self.original_data = data_list
-        self.clear()
-        for display, value in data_list:
-            self.addItem(display, value)
-        
-    def filter_values(self, text):
-        """Filter values based on typed text"""
-        if not text:
-            self.clear()
-            for display, value in self.original_data:
-                self.addItem(display, value)
-            self.showPopup()
-            return
-            
-        filtered_data = [
-            (display, value) for display, value in self.original_data 
-            if text.lower() in display.lower()
-        ]
-        
-        self.clear()
-        for display, value in filtered_data:
-            self.addItem(display, value)
-        
-        if filtered_data:
-            self.showPopup()
-        
-    def on_return_pressed(self):
-        """Handle return pressed to select the first item"""
-        if self.count() > 0:
-            self.setCurrentIndex(0)
-            self.hidePopup()
-
-    def getCurrentValue(self):
-        """Get the current selected value (not display text)"""
-        current_index = self.currentIndex()
-        if current_index >= 0:
-            return self.itemData(current_index)
-        return None
+from ui.searchable_combo import SearchableComboBox
 
 
 class UsersForm(AuditBaseForm):
@@ -660,13 +609,12 @@ class UsersForm(AuditBaseForm):
                         'user_id': user_id
                     }
             
-            self.teacher_combo.setData(teacher_options)
+            self.teacher_combo.setData(teacher_options, shared_name="user_teacher_options")
             self.teacher_combo.setCurrentText("None - Manual Entry")
             
         except Error as e:
             print(f"Error loading teachers: {e}")
-            self.teacher_combo.clear()
-            self.teacher_combo.addItem("None - Manual Entry")
+            self.teacher_combo.setData([("None - Manual Entry", None)])
 
     def on_role_change(self, selected_role):
         """Handle role change event"""
@@ -1482,13 +1430,17 @@ class UsersForm(AuditBaseForm):
             return
             
         # Set button states based on permissions
-        self.save_btn.setEnabled(has_permission(self.user_session, 'create_user'))
-        self.update_btn.setEnabled(has_permission(self.user_session, 'update_user'))
-        self.delete_btn.setEnabled(has_permission(self.user_session, 'delete_user'))
-        self.deactivate_btn.setEnabled(has_permission(self.user_session, 'deactivate_user'))
-        self.reactivate_btn.setEnabled(has_permission(self.user_session, 'reactivate_user'))
-        self.reset_pwd_btn.setEnabled(has_permission(self.user_session, 'reset_password'))
-        self.unlock_btn.setEnabled(has_permission(self.user_session, 'unlock_user'))
+        granted = has_permissions(self.user_session, [
+            'create_user', 'update_user', 'delete_user', 'deactivate_user',
+            'reactivate_user', 'reset_password', 'unlock_user'
+        ])
+        self.save_btn.setEnabled(granted['create_user'])
+        self.update_btn.setEnabled(granted['update_user'])
+        self.delete_btn.setEnabled(granted['delete_user'])
+        self.deactivate_btn.setEnabled(granted['deactivate_user'])
+        self.reactivate_btn.setEnabled(granted['reactivate_user'])
+        self.reset_pwd_btn.setEnabled(granted['reset_password'])
+        self.unlock_btn.setEnabled(granted['unlock_user'])
         
         # Set tooltips
         self.save_btn.setToolTip("Add new user" if self.save_btn.isEnabled() else "Permission required: create_user")
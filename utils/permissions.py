@@ -3,7 +3,10 @@ Role-based permission system for the school management system
 """
 
 # utils/permissions.py
-from models.models import get_db_connection
+import os
+import threading
+import time
+from models.models import get_db_connection, db_connection
 from mysql.connector import Error
 
 # Permission matrix - defines what each role can do
@@ -98,99 +101,144 @@ PERMISSIONS = {
     ]
 }
 
-# Add this fixed version to your utils/permissions.py
+# Per-user permission snapshots: user_id -> (cache_key, frozenset, expires_at)
+PERMISSION_CACHE_TTL = int(os.getenv('PERMISSION_CACHE_TTL', '300'))
+PERMISSION_RETRY_TTL = 30  # how long a DB-failure fallback snapshot is trusted
+_permission_snapshots = {}
+_snapshot_lock = threading.Lock()
 
-def has_permission(user_session, permission):
+
+def _session_identity(user_session):
+    """Extract (user_id, role, role_id) from a session dict"""
+    if not user_session or not isinstance(user_session, dict):
+        return None, '', None
+    role = (user_session.get('role') or '').strip().lower()
+    return user_session.get('user_id'), role, user_session.get('role_id')
+
+
+def _query_permission_set(user_id, role, role_id):
     """
-    Fixed version that works with both role_id and role name
-    Check if user has permission with three-tier fallback:
-    1. First: Check user-specific overrides (user_permissions table)
-    2. Second: Check role-based permissions (role_permissions table)
-    3. Third: Fallback to hardcoded PERMISSIONS dictionary
+    Load every permission the user holds, with the same three-tier sources
+    has_permission has always used:
+    1. User-specific overrides (user_permissions table, unexpired)
+    2. Role-based permissions (role_permissions table, by role_id or role name)
+    3. Hardcoded PERMISSIONS dictionary for the role name
+    Returns (permissions, expires_at) where expires_at is the earliest override expiry.
     """
+    permissions = set(PERMISSIONS.get(role, [])) if role else set()
+    earliest_expiry = None
 
-    if not user_session or not isinstance(user_session, dict):
-        print("No valid user session")
-        return False
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT permission, TIMESTAMPDIFF(SECOND, NOW(), expires_at)
+                FROM user_permissions
+                WHERE user_id = %s
+                AND (expires_at IS NULL OR expires_at > NOW())
+            """, (user_id,))
+            for permission, seconds_left in cursor.fetchall():
+                permissions.add(permission)
+                if seconds_left is not None:
+                    expiry = time.monotonic() + max(0, seconds_left)
+                    earliest_expiry = expiry if earliest_expiry is None else min(earliest_expiry, expiry)
 
-    user_id = user_session.get('user_id')
-    role = user_session.get('role', '').strip().lower()
-    role_id = user_session.get('role_id')
+            if not role_id and role:
+                cursor.execute("SELECT id FROM roles WHERE role_name = %s", (role,))
+                role_result = cursor.fetchone()
+                if role_result:
+                    role_id = role_result[0]
 
-    print(f"Permission check - user_id: {user_id}, role: {role}, role_id: {role_id}, permission: {permission}")
+            if role_id:
+                cursor.execute("SELECT permission FROM role_permissions WHERE role_id = %s", (role_id,))
+                permissions.update(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.close()
 
+    return frozenset(permissions), earliest_expiry
+
+
+def load_permission_snapshot(user_session, force=False):
+    """
+    Return the user's effective permissions as a frozenset, loading them from
+    the database only when there is no fresh snapshot. Call once at login to
+    preload; afterwards checks are pure in-memory set lookups.
+    """
+    user_id, role, role_id = _session_identity(user_session)
     if not user_id:
-        print("No user_id found")
-        return False
+        return frozenset()
+
+    cache_key = (role, role_id)
+    now = time.monotonic()
+    if not force:
+        cached = _permission_snapshots.get(user_id)
+        if cached and cached[0] == cache_key and cached[2] > now:
+            return cached[1]
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        permissions, override_expiry = _query_permission_set(user_id, role, role_id)
+        expires_at = now + PERMISSION_CACHE_TTL
+        if override_expiry is not None:
+            expires_at = min(expires_at, override_expiry)
+        print(f"Loaded {len(permissions)} permissions for user {user_id} ({role})")
+    except Exception as e:
+        print(f"Permission load error: {e}")
+        # If database fails, use hardcoded permissions and retry soon
+        permissions = frozenset(PERMISSIONS.get(role, [])) if role else frozenset()
+        expires_at = now + PERMISSION_RETRY_TTL
 
-        # 1. Check user-level override first
-        query = """
-            SELECT 1 FROM user_permissions 
-            WHERE user_id = %s AND permission = %s 
-            AND (expires_at IS NULL OR expires_at > NOW())
-        """
-        cursor.execute(query, (user_id, permission))
-        result = cursor.fetchone()
-        if result:
-            print(f"Permission granted via user override")
-            conn.close()
-            return True
+    with _snapshot_lock:
+        _permission_snapshots[user_id] = (cache_key, permissions, expires_at)
+    return permissions
 
-        # 2. Check role_permissions table using role_id (your main method)
-        if role_id:
-            query = """
-                SELECT 1 FROM role_permissions 
-                WHERE role_id = %s AND permission = %s
-            """
-            cursor.execute(query, (role_id, permission))
-            result = cursor.fetchone()
-            if result:
-                print(f"Permission granted via role_id {role_id}")
-                conn.close()
-                return True
-
-        # 3. If no role_id but we have role name, try to get role_id
-        if not role_id and role:
-            cursor.execute("SELECT id FROM roles WHERE role_name = %s", (role,))
-            role_result = cursor.fetchone()
-            if role_result:
-                role_id = role_result[0]
-                # Try the query again with the found role_id
-                query = """
-                    SELECT 1 FROM role_permissions 
-                    WHERE role_id = %s AND permission = %s
-                """
-                cursor.execute(query, (role_id, permission))
-                result = cursor.fetchone()
-                if result:
-                    print(f"Permission granted via role name {role} (ID: {role_id})")
-                    conn.close()
-                    return True
-
-        conn.close()
-
-        # 4. Fallback to hardcoded permissions if role name exists
-        if role:
-            role_permissions = PERMISSIONS.get(role, [])
-            has_hardcoded = permission in role_permissions
-            print(f"Hardcoded permission check for {role}: {has_hardcoded}")
-            return has_hardcoded
-
-        print(f"Permission denied - no valid role information")
+
+def invalidate_permission_cache(user_id=None):
+    """
+    Drop cached permission snapshots so the next check reloads them.
+    Pass a user_id after changing one user's overrides, or nothing after
+    changing role-level permissions.
+    """
+    with _snapshot_lock:
+        if user_id is None:
+            _permission_snapshots.clear()
+        else:
+            _permission_snapshots.pop(user_id, None)
+
+
+def has_permission(user_session, permission):
+    """
+    Check if user has permission.
+    Uses the per-user snapshot (user overrides + role_permissions + hardcoded
+    PERMISSIONS), so repeated checks do not touch the database.
+    """
+    if not user_session or not isinstance(user_session, dict):
+        print("No valid user session")
         return False
 
-    except Exception as e:
-        print(f"Permission check error: {e}")
-        # If database fails, try hardcoded permissions as fallback
-        if role:
-            role_permissions = PERMISSIONS.get(role.lower(), [])
-            return permission in role_permissions
+    if not user_session.get('user_id'):
+        print("No user_id found")
         return False
 
+    return permission in load_permission_snapshot(user_session)
+
+
+def has_permissions(user_session, permissions):
+    """
+    Batch permission check.
+
+    Args:
+        user_session: The logged-in user's session dict
+        permissions: Iterable of permission names
+
+    Returns:
+        dict: {permission: bool} for every requested permission
+    """
+    if not user_session or not isinstance(user_session, dict) or not user_session.get('user_id'):
+        return {permission: False for permission in permissions}
+
+    granted = load_permission_snapshot(user_session)
+    return {permission: permission in granted for permission in permissions}
+
 # Also add this debug version that shows exactly what's happening
 def debug_has_permission(user_session, permission):
     """Debug version with detailed output"""